@@ -0,0 +1,328 @@
+import argparse
+from core.amount import Amount
+from core.chain import REWARD_AMOUNT
+from core.block import HashedBlock
+from core.block_template import BlockTemplate
+from core.config import Config, DEFAULTS
+from core.key_pair import KeyPair
+from core.miner import BlockMiner, NONCE_PREFIX_BYTES, search_nonces
+from core.miner_coordinator import MiningJob, mining_worker
+from core.block import Block
+from core.block_config import BlockConfig, digests_meet_target
+from core.peer import generate_peer_id
+from core.serializable import Hash
+from core.timestamp import Timestamp
+from core.transaction.signed_transaction import SignedTransaction
+from core.transaction.transaction import Transaction
+from core.transaction.transaction_input import TransactionInput
+from core.transaction.transaction_output import TransactionOutput
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+MEMPOOL_SIZES = [0, 10, 1000, 10000]
+DIFFICULTIES = [8, 16, 24]
+UNSOLVABLE_DIFFICULTY = 255 # keeps a round hashing for its full length
+TIMING_REPEATS = 20
+TARGET_CHECK_BATCH = 1024
+BLOCK_MEMORY_TXNS = 10000
+
+def bench_config(tmp_dir: str, block_version: int) -> Config:
+    """A config that keeps every database in tmp_dir and never goes online."""
+    args = dict(DEFAULTS)
+    args.update({
+        "chain_db_path": os.path.join(tmp_dir, "chain.sqlite"),
+        "log_db_path": os.path.join(tmp_dir, "log.sqlite"),
+        "peer_db_path": os.path.join(tmp_dir, "peers.sqlite"),
+        "wallet_path": os.path.join(tmp_dir, "radcoin.wallet"),
+        "advertize_addr": "127.0.0.1",
+        "advertize_self": False,
+        "peer_id": generate_peer_id(),
+        "log_level": "ERROR",
+        "block_version": block_version,
+    })
+    return Config(args)
+
+def mine_block(miner: BlockMiner) -> HashedBlock:
+    """Mines the miner's template on the head until it finds a block, and adds it."""
+    while True:
+        head = miner.chain.get_head()
+        block = miner.mine_on(head, miner.chain.get_difficulty(head))
+        if block is not None:
+            miner.chain.add_block(block)
+            return block
+
+def fill_mempool(miner: BlockMiner, n_txns: int) -> None:
+    """
+    Fills the mempool with n_txns spends that are valid on the head, so the
+    template takes all of them in. A mined reward is split into n_txns
+    outputs by a transaction in the next block, then each output is spent
+    on its own. The spends go straight into storage, the template checks
+    them when it's updated.
+    """
+    if n_txns == 0:
+        return
+
+    kp = miner.key_pair
+    rewarded = mine_block(miner)
+    reward = list(filter(lambda t: t.is_reward(), rewarded.block.transactions))[0]
+
+    share = REWARD_AMOUNT.nanos // n_txns
+    amounts = [share] * (n_txns - 1) + [REWARD_AMOUNT.nanos - share * (n_txns - 1)]
+    split = SignedTransaction.sign(Transaction(
+        [TransactionInput(rewarded.mining_hash(), reward.txn_hash(), 0)],
+        list(map(lambda i: TransactionOutput(i, Amount(amounts[i]), kp.address()),
+            range(n_txns))),
+        Timestamp.now(),
+        kp.address()), kp)
+    miner.chain.add_outstanding_transaction(split)
+    split_block = mine_block(miner)
+
+    for i in range(n_txns):
+        txn = Transaction(
+            [TransactionInput(split_block.mining_hash(), split.txn_hash(), i)],
+            [TransactionOutput(0, Amount(amounts[i]), kp.address())],
+            Timestamp.now(),
+            kp.address())
+        miner.transaction_storage.add_transaction(SignedTransaction.sign(txn, kp))
+
+def seconds_per_call(f: Callable[[], Any], repeats: int = TIMING_REPEATS) -> float:
+    start = time.perf_counter()
+    for i in range(repeats):
+        f()
+    return (time.perf_counter() - start) / repeats
+
+def peak_alloc_bytes(f: Callable[[], Any]) -> int:
+    """Peak bytes allocated while f runs, as seen by tracemalloc."""
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        f()
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+def retained_alloc_bytes(f: Callable[[], Any]) -> int:
+    """Bytes still allocated after f runs while its result is kept alive."""
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        result = f()
+        retained = tracemalloc.get_traced_memory()[0] - base
+        del result
+        return retained
+    finally:
+        tracemalloc.stop()
+
+def bench_block_memory(n_txns: int) -> Dict[str, Any]:
+    """
+    What a parsed block of n_txns one-input, one-output transactions costs
+    to hold in memory. Transactions are signed up front, then the block is
+    parsed back from its JSON so that only the parsed objects are counted.
+    """
+    kp = KeyPair.new()
+    parent = Hash(os.urandom(32))
+    txns: List[SignedTransaction] = []
+    for i in range(n_txns):
+        txn = Transaction(
+            [TransactionInput(parent, Hash(os.urandom(32)), 0)],
+            [TransactionOutput(0, Amount(i + 1), kp.address())],
+            Timestamp.now(),
+            kp.address())
+        txns.append(SignedTransaction.sign(txn, kp))
+    obj = Block(1, parent, BlockConfig(DIFFICULTIES[0]), txns).serializable()
+    del txns
+
+    def parse_block() -> Block:
+        block = Block.from_dict(obj)
+        block.transactions
+        return block
+
+    retained = retained_alloc_bytes(parse_block)
+    return {
+        "txns": n_txns,
+        "bytes": retained,
+        "bytes_per_txn": retained / max(n_txns, 1),
+    }
+
+def uncached_block(block: Block) -> Block:
+    """A copy of block that hasn't worked out its digest yet."""
+    return Block(
+        block.block_num,
+        block.parent_mining_hash,
+        block.block_config,
+        block.transactions,
+        block.version,
+        block.merkle_root)
+
+def bench_mempool_size(n_txns: int, block_version: int) -> Dict[str, Any]:
+    tmp_dir = tempfile.mkdtemp(prefix="radcoin-bench-")
+    try:
+        cfg = bench_config(tmp_dir, block_version)
+        miner = BlockMiner(cfg)
+        fill_mempool(miner, n_txns)
+        head = miner.chain.get_head()
+        head_hash = head.mining_hash()
+
+        cold = BlockTemplate(
+            miner.transaction_storage,
+            miner.make_reward,
+            miner.l,
+            block_version,
+            miner.valid_for_mining)
+        start = time.perf_counter()
+        cold.update(head_hash, head.block_num(), DIFFICULTIES[0])
+        cold.digest()
+        template_cold = time.perf_counter() - start
+
+        template_warm = seconds_per_call(lambda: (
+            cold.update(head_hash, head.block_num(), DIFFICULTIES[0]),
+            cold.digest()))
+
+        # Blocks and hashed blocks cache their digests, so each measured call
+        # gets new ones to time the work rather than the cache.
+        block = cold.block()
+        entropy = os.urandom(32)
+        mining_hash = lambda: HashedBlock(block, entropy).mining_hash()
+        meets_difficulty = lambda: HashedBlock(
+            block, entropy).hash_meets_difficulty()
+        mining_digest = lambda: uncached_block(block).mining_digest()
+
+        midstate = hashlib.sha256(cold.digest().raw_sha256)
+        prefix = os.urandom(NONCE_PREFIX_BYTES)
+        target = block.block_config.target
+        digests = list(map(
+            lambda i: os.urandom(32), range(TARGET_CHECK_BATCH)))
+
+        mine_on: Dict[str, float] = {}
+        for difficulty in DIFFICULTIES + [UNSOLVABLE_DIFFICULTY]:
+            miner.mine_on(head, difficulty, head_hash)
+            mine_on[str(difficulty)] = miner.hashrate
+
+        return {
+            "mempool_size": n_txns,
+            "template_txns": cold.n_transactions(),
+            "template_build_s": template_cold,
+            "template_update_s": template_warm,
+            "mining_digest_s": seconds_per_call(mining_digest),
+            "mining_hash_s": seconds_per_call(mining_hash),
+            "hash_meets_difficulty_s": seconds_per_call(meets_difficulty),
+            "target_check_s_per_digest": seconds_per_call(
+                lambda: digests_meet_target(digests, target)) / len(digests),
+            "nonce_attempt_s": seconds_per_call(
+                lambda: search_nonces(midstate, prefix, 0, 1, target)),
+            "alloc_peak_bytes_per_attempt": {
+                "mining_digest": peak_alloc_bytes(mining_digest),
+                "mining_hash": peak_alloc_bytes(mining_hash),
+                "nonce_attempt": peak_alloc_bytes(
+                    lambda: search_nonces(midstate, prefix, 0, 1, target)),
+            },
+            "mine_on_hashes_per_s": mine_on,
+        }
+    finally:
+        shutil.rmtree(tmp_dir)
+
+def bench_procs(n_procs: int, seconds: float) -> Dict[str, Any]:
+    """Aggregate hashrate of n_procs coordinator workers on one job."""
+    job = MiningJob(n_procs)
+    workers: List[multiprocessing.Process] = []
+    for i in range(n_procs):
+        p = multiprocessing.Process(
+            target=mining_worker, args=(i, n_procs, job, 1.0), daemon=True)
+        p.start()
+        workers.append(p)
+
+    try:
+        job.publish(
+            os.urandom(32), os.urandom(NONCE_PREFIX_BYTES), UNSOLVABLE_DIFFICULTY)
+        time.sleep(0.1) # let every worker pick the job up
+        start_hashes = job.total_hashes()
+        start = time.perf_counter()
+        time.sleep(seconds)
+        n_hashes = job.total_hashes() - start_hashes
+        elapsed = time.perf_counter() - start
+    finally:
+        job.cancel()
+        for p in workers:
+            p.terminate()
+            p.join()
+
+    return {
+        "procs": n_procs,
+        "hashes_per_s": n_hashes / elapsed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser("Radcoin mining benchmarks")
+    parser.add_argument(
+        "--output",
+        help="Where to write the JSON results.",
+        default="./bench.json")
+
+    parser.add_argument(
+        "--max_procs",
+        help="Measure worker hashrate for 1..max_procs processes.",
+        type=int,
+        default=multiprocessing.cpu_count())
+
+    parser.add_argument(
+        "--mempool_sizes",
+        help="Comma separated numbers of pending transactions.",
+        default=",".join(map(str, MEMPOOL_SIZES)))
+
+    parser.add_argument(
+        "--block_version",
+        type=int,
+        default=DEFAULTS["block_version"])
+
+    parser.add_argument(
+        "--block_txns",
+        help="Transactions in the block whose memory use is measured.",
+        type=int,
+        default=BLOCK_MEMORY_TXNS)
+
+    parser.add_argument(
+        "--seconds",
+        help="How long to hash for each process count.",
+        type=float,
+        default=2.0)
+
+    args = parser.parse_args()
+    sizes = list(map(int, args.mempool_sizes.split(",")))
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "unix_millis": int(time.time() * 1000),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": multiprocessing.cpu_count(),
+            "block_version": args.block_version,
+        },
+        "mempool": [],
+        "procs": [],
+    }
+
+    print("Benchmarking memory of a {} txn block".format(args.block_txns))
+    results["block_memory"] = bench_block_memory(args.block_txns)
+
+    for n_txns in sizes:
+        print("Benchmarking mempool of {} txns".format(n_txns))
+        results["mempool"].append(bench_mempool_size(n_txns, args.block_version))
+
+    for n_procs in range(1, args.max_procs + 1):
+        print("Benchmarking {} mining processes".format(n_procs))
+        results["procs"].append(bench_procs(n_procs, args.seconds))
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print("Wrote", args.output)
+
+if __name__ == "__main__":
+    main()
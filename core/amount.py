@@ -1,11 +1,14 @@
-from core.serializable import Serializable, Ser
+from core.serializable import Immutable, Ser
 from typing import Dict
 
 NANOS_PER_UNIT = int(1e9)
 
-class Amount(Serializable):
+class Amount(Immutable):
+    __slots__ = ("nanos",)
+
     def __init__(self, amount_nanos: int) -> None:
         self.nanos = amount_nanos
+        self.freeze()
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, Amount):
@@ -19,13 +22,6 @@ class Amount(Serializable):
 
         return Amount(self.nanos + other.nanos)
 
-    def __iadd__(self, other: object) -> 'Amount':
-        if not isinstance(other, Amount):
-            raise TypeError("idiot")
-
-        self.nanos += other.nanos
-        return self
-
     def __str__(self) -> str:
         return "Amount<{}RC>".format(self.nanos / NANOS_PER_UNIT)
 
@@ -1,18 +1,33 @@
-from core.block_config import BlockConfig
+from core.block_config import BlockConfig, digest_meets_target
 from core.key_pair import Address
-from core.serializable import Hash, Serializable, Ser
+from core.merkle import merkle_root
+from core.serializable import Hash, Immutable, Ser
 from core.timestamp import Timestamp
 from core.transaction.signed_transaction import SignedTransaction
 import hashlib
-from typing import List, Optional
+import json
+from typing import Any, List, Optional
 
-class Block(Serializable):
+# Version 1 blocks are mined over the JSON of the whole block. Version 2
+# blocks are mined over a header that commits to the transactions with a
+# merkle root of their hashes, so the miner can change the transaction set
+# without rehashing all of it.
+BLOCK_VERSION_JSON = 1
+BLOCK_VERSION_MERKLE = 2
+BLOCK_VERSIONS = [BLOCK_VERSION_JSON, BLOCK_VERSION_MERKLE]
+
+class Block(Immutable):
     def __init__(
             self,
             block_num,
             parent_mining_hash: Optional[Hash],
             config: BlockConfig,
-            transactions: List[SignedTransaction]) -> None:
+            transactions: List[SignedTransaction],
+            version: int = BLOCK_VERSION_JSON,
+            merkle_root: Optional[Hash] = None) -> None:
+
+        if version not in BLOCK_VERSIONS:
+            raise ValueError("Unknown block version", version)
 
         if parent_mining_hash is None:
             if block_num != 0:
@@ -24,27 +39,124 @@ class Block(Serializable):
         self.block_num = block_num
         self.block_config = config
         self.parent_mining_hash = parent_mining_hash
-        self.transactions = transactions
+        self.version = version
+
+        # Blocks read from JSON keep their transactions as dicts until
+        # something needs them, so that the header can be checked first.
+        self._transactions: Optional[List[SignedTransaction]] = transactions
+        self._transaction_dicts: Optional[List[Ser]] = None
+
+        if version == BLOCK_VERSION_MERKLE and merkle_root is None:
+            self.merkle_root: Optional[Hash] = self.computed_merkle_root()
+        else:
+            self.merkle_root = merkle_root
+
+        self._mining_digest: Optional[Hash] = None
+        self.freeze()
 
     def __str__(self) -> str:
         return "Block<num={},parent={}>".format(
             self.block_num, self.parent_mining_hash)
 
-    def serializable(self) -> Ser:
-        txns = map(lambda t: t.serializable(), self.transactions)
-        
+    @property
+    def transactions(self) -> List[SignedTransaction]:
+        if self._transactions is None:
+            return self.memo("_transactions", list(map(
+                lambda o: SignedTransaction.from_dict(o),
+                self._transaction_dicts)))
+        return self._transactions
+
+    def transactions_are_parsed(self) -> bool:
+        return self._transactions is not None
+
+    def transactions_are_canonical(self) -> bool:
+        """
+        Whether the transactions, if they were read from JSON, serialize
+        back to exactly what was read. The block was hashed as read, so
+        anything else would change its hash once they're parsed.
+        """
+        if self._transaction_dicts is None:
+            return True
+
+        return self._transaction_dicts == list(
+            map(lambda t: t.serializable(), self.transactions))
+
+    def computed_merkle_root(self) -> Hash:
+        return merkle_root(map(lambda t: t.txn_hash(), self.transactions))
+
+    def transactions_match_commitment(self) -> bool:
+        """
+        For merkle blocks, whether the transactions are the ones the header's
+        merkle root commits to. Version 1 blocks hash their transactions
+        directly, so they always match.
+        """
+        if self.version == BLOCK_VERSION_JSON:
+            return True
+        else:
+            return self.merkle_root == self.computed_merkle_root()
+
+    def header_serializable(self) -> Ser:
         if self.parent_mining_hash is None:
             parent_hash = None
         else:
             parent_hash = self.parent_mining_hash.serializable()
 
-        return {
+        header = {
             "block_num": self.block_num,
             "parent_mined_hash": parent_hash,
-            "transactions": list(txns),
             "config": self.block_config.serializable(),
         }
 
+        if self.version != BLOCK_VERSION_JSON:
+            header["version"] = self.version
+            header["merkle_root"] = self.merkle_root.serializable()
+
+        return header
+
+    def serializable(self) -> Ser:
+        obj = self.header_serializable()
+        if self._transaction_dicts is not None:
+            obj["transactions"] = self._transaction_dicts
+        else:
+            obj["transactions"] = list(
+                map(lambda t: t.serializable(), self.transactions))
+        return obj
+
+    def mining_digest(self) -> Hash:
+        """The digest that mining entropy is appended to."""
+        if self._mining_digest is not None:
+            return self._mining_digest
+
+        if self.version == BLOCK_VERSION_JSON:
+            return self.memo("_mining_digest", self.sha256())
+        else:
+            ser = json.dumps(self.header_serializable(), sort_keys=True)
+            return self.memo("_mining_digest", Hash(
+                hashlib.sha256(ser.encode("utf-8")).digest()))
+
+    @staticmethod
+    def sha256_from_parts(
+            block_num: int,
+            parent_mining_hash: Optional[Hash],
+            config: BlockConfig,
+            serialized_transactions: List[bytes]) -> Hash:
+        """
+        Same as Block(...).sha256() for a version 1 block, but from
+        transactions that are already serialized. "transactions" sorts last,
+        so the block's JSON is the JSON of an empty block with the
+        transactions spliced into its list.
+        """
+        empty = Block(block_num, parent_mining_hash, config, []).serialize()
+        m = hashlib.sha256()
+        m.update(empty[:-len(b"[]}")])
+        m.update(b"[")
+        for i, txn in enumerate(serialized_transactions):
+            if i > 0:
+                m.update(b", ")
+            m.update(txn)
+        m.update(b"]}")
+        return Hash(m.digest())
+
     @staticmethod
     def from_dict(obj: Ser) -> 'Block':
         block_num = obj["block_num"]
@@ -52,11 +164,19 @@ class Block(Serializable):
             parent_hash = Hash.from_dict(obj["parent_mined_hash"])
         else:
             parent_hash = None
-        txns = list(map(lambda o: SignedTransaction.from_dict(o), obj["transactions"]))
         config = BlockConfig.from_dict(obj["config"])
-        return Block(block_num, parent_hash, config, txns)
+        version = obj.get("version", BLOCK_VERSION_JSON)
+        if version == BLOCK_VERSION_JSON:
+            root = None
+        else:
+            root = Hash.from_dict(obj["merkle_root"])
+
+        block = Block(block_num, parent_hash, config, [], version, root)
+        block.memo("_transactions", None)
+        block.memo("_transaction_dicts", list(obj["transactions"]))
+        return block
 
-class HashedBlock(Serializable):
+class HashedBlock(Immutable):
     def __init__(
             self,
             block: Block,
@@ -69,6 +189,9 @@ class HashedBlock(Serializable):
         else:
             self.mining_timestamp = mining_timestamp
 
+        self._mining_hash: Optional[Hash] = None
+        self.freeze()
+
     def __str__(self) -> str:
         return "HashedBlock<num={},hash={}>".format(
             self.block_num(), self.mining_hash())
@@ -93,13 +216,26 @@ class HashedBlock(Serializable):
         return HashedBlock(
             b, mining_entropy=b"", mining_timestamp=Timestamp(0))
 
-    def replace_mining_entropy(self, new_entropy: bytes) -> None:
-        self.mining_entropy = new_entropy
-        self.mining_timestamp = Timestamp.now()
+    def with_mining_entropy(self, new_entropy: bytes) -> 'HashedBlock':
+        """The same block with other entropy, mined now."""
+        return HashedBlock(self.block, new_entropy, Timestamp.now())
+
+    def mining_midstate(self) -> Any:
+        """
+        A sha256 state that has already consumed the block digest. Copy it and
+        feed it mining entropy to get a candidate mining hash without
+        re-serializing the block.
+        """
+        m = hashlib.sha256()
+        m.update(self.block.mining_digest().raw_sha256)
+        return m
 
     def mining_hash(self) -> Hash:
-        v = self.block.sha256().raw_sha256 + self.mining_entropy
-        return Hash(hashlib.sha256(v).digest())
+        if self._mining_hash is None:
+            m = self.mining_midstate()
+            m.update(self.mining_entropy)
+            return self.memo("_mining_hash", Hash(m.digest()))
+        return self._mining_hash
 
     def parent_mining_hash(self) -> Hash:
         return self.block.parent_mining_hash
@@ -108,19 +244,9 @@ class HashedBlock(Serializable):
         return self.block.block_num
 
     def hash_meets_difficulty(self) -> bool:
-        h = self.mining_hash().raw_sha256
-        zero_bytes = self.block.block_config.difficulty // 8
-        zero_bits = self.block.block_config.difficulty - (zero_bytes * 8)
-        one_bits = 8 - zero_bits
-
-        for i in range(0, zero_bytes):
-            if h[i] != 0:
-                return False
-
-        if h[zero_bytes] > ((2**one_bits) - 1):
-            return False
-        else:
-            return True
+        return digest_meets_target(
+            self.mining_hash().raw_sha256,
+            self.block.block_config.target)
 
     def serializable(self) -> Ser:
         return {
@@ -1,8 +1,45 @@
-from core.serializable import Serializable, Ser
+from core.serializable import Immutable, Ser
+from typing import Any, List, Sequence
 
-class BlockConfig(Serializable):
+HASH_BITS = 256
+WORD_BITS = 64
+
+def target_for_difficulty(difficulty: int) -> int:
+    """
+    A hash meets a difficulty if its leading `difficulty` bits are zero,
+    which is the same as being less than this target when read as a
+    big-endian integer.
+    """
+    return 1 << (HASH_BITS - difficulty)
+
+def digest_meets_target(digest: bytes, target: int) -> bool:
+    return int.from_bytes(digest, "big") < target
+
+def digests_meet_target(digests: Sequence[bytes], target: int) -> List[bool]:
+    return list(map(lambda d: int.from_bytes(d, "big") < target, digests))
+
+def leading_word_candidates(words: Any, target: int) -> Any:
+    """
+    Vectorized pre-check over the leading 64 bit words of many digests, e.g.
+    numpy.frombuffer(b"".join(d[:8] for d in digests), dtype=">u8").
+    Returns a boolean array of digests that may meet the target. For
+    difficulties up to 64 the answer is exact; above that a candidate has
+    to be confirmed with digest_meets_target.
+    """
+    low_bits = HASH_BITS - WORD_BITS
+    if target >> low_bits >= 2**WORD_BITS:
+        return words >= 0 # every word passes
+
+    if target & ((1 << low_bits) - 1) == 0:
+        return words < (target >> low_bits)
+    else:
+        return words <= (target >> low_bits)
+
+class BlockConfig(Immutable):
     def __init__(self, difficulty) -> None:
         self.difficulty = difficulty
+        self.target = target_for_difficulty(difficulty)
+        self.freeze()
 
     def serializable(self) -> Ser:
         return {
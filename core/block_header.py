@@ -0,0 +1,84 @@
+from core.block import Block, HashedBlock, BLOCK_VERSION_JSON
+from core.block_config import digest_meets_target
+from core.serializable import Hash, Serializable, Ser
+from core.timestamp import Timestamp
+import hashlib
+from typing import Optional
+
+class BlockHeader(Serializable):
+    """
+    A block without its transactions: enough to place it in the chain and
+    check its proof of work. mining_digest is the digest the mining entropy
+    was appended to. Merkle blocks' digests are checked against the header,
+    version 1 blocks' digests cover the transactions, so they can only be
+    checked once the block itself arrives.
+    """
+
+    def __init__(
+            self,
+            block: Block,
+            mining_digest: Hash,
+            mining_entropy: bytes,
+            mining_timestamp: Timestamp) -> None:
+
+        self.block = block
+        self.mining_digest = mining_digest
+        self.mining_entropy = mining_entropy
+        self.mining_timestamp = mining_timestamp
+
+    def __str__(self) -> str:
+        return "BlockHeader<num={},hash={}>".format(
+            self.block_num(), self.mining_hash())
+
+    @staticmethod
+    def from_block(hb: HashedBlock) -> 'BlockHeader':
+        header = Block.from_dict(dict(
+            hb.block.header_serializable(), transactions=[]))
+        return BlockHeader(
+            header,
+            hb.block.mining_digest(),
+            hb.mining_entropy,
+            hb.mining_timestamp)
+
+    def block_num(self) -> int:
+        return self.block.block_num
+
+    def parent_mining_hash(self) -> Optional[Hash]:
+        return self.block.parent_mining_hash
+
+    def difficulty(self) -> int:
+        return self.block.block_config.difficulty
+
+    def mining_hash(self) -> Hash:
+        m = hashlib.sha256()
+        m.update(self.mining_digest.raw_sha256)
+        m.update(self.mining_entropy)
+        return Hash(m.digest())
+
+    def hash_meets_difficulty(self) -> bool:
+        return digest_meets_target(
+            self.mining_hash().raw_sha256,
+            self.block.block_config.target)
+
+    def digest_matches_header(self) -> bool:
+        if self.block.version == BLOCK_VERSION_JSON:
+            return True
+        else:
+            return self.mining_digest == self.block.mining_digest()
+
+    def serializable(self) -> Ser:
+        return {
+            "header": self.block.header_serializable(),
+            "mining_digest": self.mining_digest.serializable(),
+            "mining_entropy": self.mining_entropy.hex(),
+            "mining_timestamp": self.mining_timestamp.serializable(),
+        }
+
+    @staticmethod
+    def from_dict(obj: Ser) -> 'BlockHeader':
+        block = Block.from_dict(dict(obj["header"], transactions=[]))
+        return BlockHeader(
+            block,
+            Hash.from_dict(obj["mining_digest"]),
+            bytes.fromhex(obj["mining_entropy"]),
+            Timestamp.from_dict(obj["mining_timestamp"]))
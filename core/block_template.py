@@ -0,0 +1,231 @@
+from core.block import Block, BLOCK_VERSION_JSON
+from core.block_config import BlockConfig
+from core.dblog import DBLogger
+from core.merkle import MerkleTree
+from core.serializable import Hash
+from core.storage.transaction_storage import TransactionStorage
+from core.transaction.signed_transaction import SignedTransaction
+from typing import Callable, Dict, List, Optional, Set
+
+class BlockTemplate(object):
+    """
+    The block a miner is working on, kept between mining rounds.
+
+    update() syncs the template with the head and the mempool. Transactions
+    that are already in the template are neither fetched nor parsed again,
+    their serialized bytes are kept for computing the block digest, and the
+    signed reward is only replaced when the parent changes. When nothing
+    changed the block and its digest are served from cache.
+
+    For merkle blocks the transaction hashes are kept in a MerkleTree, with
+    the reward as the first leaf, so each added or removed transaction only
+    costs a path of hashes. Removing a transaction moves the last one into
+    its slot, which is why the order is kept here rather than in the
+    mempool's order.
+
+    Pool transactions are only taken into the template if is_valid passes
+    them. It's given each round's new transactions as one batch, and the
+    whole template again whenever the parent changes, since a new head can
+    claim outputs that its transactions spend. Rejected transactions aren't
+    looked at again until then.
+    """
+
+    def __init__(
+            self,
+            transaction_storage: TransactionStorage,
+            make_reward: Callable[[], SignedTransaction],
+            l: DBLogger,
+            version: int = BLOCK_VERSION_JSON,
+            is_valid: Optional[Callable[
+                [List[SignedTransaction]], List[bool]]] = None) -> None:
+
+        self.transaction_storage = transaction_storage
+        self.make_reward = make_reward
+        self.l = l
+        self.version = version
+        self.is_valid = is_valid
+
+        self.block_num = 0
+        self.parent_mining_hash: Optional[Hash] = None
+        self.difficulty = -1
+
+        self._reward: Optional[SignedTransaction] = None
+        self._reward_bytes = b""
+
+        # Slot 0 is the reward, the mempool transactions follow.
+        self._order: List[bytes] = [b""]
+        self._slots: Dict[bytes, int] = {}
+        self._txns: Dict[bytes, SignedTransaction] = {}
+        self._txn_bytes: Dict[bytes, bytes] = {}
+        self._tree = MerkleTree()
+        self._rejected: Set[bytes] = set()
+
+        self._block: Optional[Block] = None
+        self._digest: Optional[Hash] = None
+
+    def update(
+            self,
+            parent_mining_hash: Hash,
+            parent_block_num: int,
+            difficulty: int) -> bool:
+        """Brings the template up to date. Returns whether it changed."""
+        parent_changed = parent_mining_hash != self.parent_mining_hash
+        changed = self._update_parent(
+            parent_mining_hash, parent_block_num, difficulty)
+        changed = self._update_transactions(parent_changed) or changed
+
+        if changed:
+            self._block = None
+            self._digest = None
+
+        return changed
+
+    def n_transactions(self) -> int:
+        return len(self._order)
+
+    def block(self) -> Block:
+        if self._block is None:
+            txns: List[SignedTransaction] = list(
+                map(lambda h: self._txns[h], self._order[1:]))
+
+            if self.version == BLOCK_VERSION_JSON:
+                txns.append(self._reward)
+                root = None
+            else:
+                txns.insert(0, self._reward)
+                root = self._tree.root()
+
+            self._block = Block(
+                self.block_num,
+                self.parent_mining_hash,
+                BlockConfig(self.difficulty),
+                txns,
+                self.version,
+                root)
+
+        return self._block
+
+    def digest(self) -> Hash:
+        """Same as block().mining_digest(), without serializing the block."""
+        if self._digest is None:
+            if self.version == BLOCK_VERSION_JSON:
+                serialized: List[bytes] = list(
+                    map(lambda h: self._txn_bytes[h], self._order[1:]))
+                serialized.append(self._reward_bytes)
+                self._digest = Block.sha256_from_parts(
+                    self.block_num,
+                    self.parent_mining_hash,
+                    BlockConfig(self.difficulty),
+                    serialized)
+            else:
+                self._digest = self.block().mining_digest()
+
+        return self._digest
+
+    def _update_parent(
+            self,
+            parent_mining_hash: Hash,
+            parent_block_num: int,
+            difficulty: int) -> bool:
+
+        if (parent_mining_hash == self.parent_mining_hash
+                and difficulty == self.difficulty):
+            return False
+
+        if parent_mining_hash != self.parent_mining_hash:
+            self._reward = self.make_reward()
+            self._reward_bytes = self._reward.serialize()
+            reward_hash = self._reward.txn_hash()
+
+            if self.version != BLOCK_VERSION_JSON:
+                if len(self._tree) == 0:
+                    self._tree.append(reward_hash)
+                else:
+                    self._tree.set(0, reward_hash)
+
+        self.parent_mining_hash = parent_mining_hash
+        self.block_num = parent_block_num + 1
+        self.difficulty = difficulty
+        return True
+
+    def _update_transactions(self, revalidate: bool) -> bool:
+        pending = self.transaction_storage.get_transaction_hashes()
+        pending_raw = set(map(lambda h: h.raw_sha256, pending))
+        changed = False
+
+        for raw_hash in list(self._slots.keys()):
+            if raw_hash not in pending_raw:
+                self._remove(raw_hash)
+                changed = True
+
+        if revalidate:
+            self._rejected.clear()
+            held = list(self._order[1:])
+            valid = self._check(list(map(lambda h: self._txns[h], held)))
+            for raw_hash, txn_is_valid in zip(held, valid):
+                if not txn_is_valid:
+                    self._remove(raw_hash)
+                    self._rejected.add(raw_hash)
+                    changed = True
+        else:
+            self._rejected &= pending_raw
+
+        new_hashes: List[Hash] = []
+        new_txns: List[SignedTransaction] = []
+        new_bytes: List[bytes] = []
+        for txn_hash in pending:
+            raw_hash = txn_hash.raw_sha256
+            if raw_hash in self._slots or raw_hash in self._rejected:
+                continue
+
+            txn = self.transaction_storage.get_transaction(txn_hash)
+            if txn is None:
+                continue # removed since we listed the hashes
+
+            new_hashes.append(txn_hash)
+            new_txns.append(txn)
+            new_bytes.append(txn.serialize())
+
+        valid = self._check(new_txns)
+        for txn_hash, txn, ser, txn_is_valid in zip(
+                new_hashes, new_txns, new_bytes, valid):
+            if txn_is_valid:
+                self._add(txn_hash, txn, ser)
+                changed = True
+            else:
+                self.l.warn("Txn is not valid for mining", txn)
+                self._rejected.add(txn_hash.raw_sha256)
+
+        if changed:
+            self.l.debug("Template now has {} txns".format(self.n_transactions()))
+
+        return changed
+
+    def _check(self, txns: List[SignedTransaction]) -> List[bool]:
+        if self.is_valid is None or len(txns) == 0:
+            return [True] * len(txns)
+        else:
+            return self.is_valid(txns)
+
+    def _add(self, txn_hash: Hash, txn: SignedTransaction, ser: bytes) -> None:
+        raw_hash = txn_hash.raw_sha256
+        self._slots[raw_hash] = len(self._order)
+        self._order.append(raw_hash)
+        self._txns[raw_hash] = txn
+        self._txn_bytes[raw_hash] = ser
+
+        if self.version != BLOCK_VERSION_JSON:
+            self._tree.append(txn_hash)
+
+    def _remove(self, raw_hash: bytes) -> None:
+        slot = self._slots.pop(raw_hash)
+        del self._txns[raw_hash]
+        del self._txn_bytes[raw_hash]
+
+        last = self._order.pop()
+        if last != raw_hash:
+            self._order[slot] = last
+            self._slots[last] = slot
+
+        if self.version != BLOCK_VERSION_JSON:
+            self._tree.remove(slot)
@@ -0,0 +1,122 @@
+from core.amount import Amount
+from core.block import HashedBlock
+from core.key_pair import Address
+from core.serializable import Hash, Serializable, Ser
+from core.storage.uxto_storage import UXTO, UXTOStorage
+from typing import Dict, List, Optional, Tuple
+
+class BlockUndo(Serializable):
+    """
+    What connecting a block did to the unclaimed outputs: the outputs it
+    created and the outputs its inputs claimed. Stored per main chain block
+    so it can be disconnected again without reading the rest of the chain.
+    """
+
+    def __init__(
+            self,
+            block_hash: Hash,
+            created: List[UXTO],
+            claimed: List[Tuple[Hash, int]]) -> None:
+
+        self.block_hash = block_hash
+        self.created = created
+        self.claimed = claimed
+
+    @staticmethod
+    def for_block(block: HashedBlock) -> 'BlockUndo':
+        block_hash = block.mining_hash()
+        created: List[UXTO] = []
+        claimed: List[Tuple[Hash, int]] = []
+        for txn in block.block.transactions:
+            txn_hash = txn.txn_hash()
+            for out in txn.transaction.outputs:
+                created.append(UXTO(
+                    txn_hash, out.to_addr, out.output_id, out.amount, block_hash))
+
+            for inp in txn.transaction.inputs:
+                claimed.append((inp.output_transaction_hash, inp.output_id))
+
+        return BlockUndo(block_hash, created, claimed)
+
+    def serializable(self) -> Ser:
+        return {
+            "block_hash": self.block_hash.serializable(),
+            "created": list(map(lambda u: {
+                "txn_hash": u.txn_hash.serializable(),
+                "claimer": u.claimer_address.serializable(),
+                "output_id": u.output_id,
+                "amount": u.amount.serializable(),
+            }, self.created)),
+            "claimed": list(map(lambda c: {
+                "txn_hash": c[0].serializable(),
+                "output_id": c[1],
+            }, self.claimed)),
+        }
+
+    @staticmethod
+    def from_dict(obj: Ser) -> 'BlockUndo':
+        block_hash = Hash.from_dict(obj["block_hash"])
+        created = list(map(lambda u: UXTO(
+            Hash.from_dict(u["txn_hash"]),
+            Address.from_dict(u["claimer"]),
+            u["output_id"],
+            Amount.from_dict(u["amount"]),
+            block_hash), obj["created"]))
+
+        claimed = list(map(lambda c: (
+            Hash.from_dict(c["txn_hash"]),
+            c["output_id"]), obj["claimed"]))
+
+        return BlockUndo(block_hash, created, claimed)
+
+class UXTOView(object):
+    """
+    The unclaimed outputs as they would be after connecting and
+    disconnecting some blocks, kept in memory on top of storage. Used to
+    validate a branch before any of it is written.
+    """
+
+    def __init__(self, storage: UXTOStorage) -> None:
+        self.storage = storage
+        self._unclaimed: Dict[Tuple[bytes, int], bool] = {}
+        self._created: Dict[Tuple[bytes, int], UXTO] = {}
+
+    def get_unclaimed(self, txn_hash: Hash, output_id: int) -> Optional[UXTO]:
+        key = (txn_hash.raw_sha256, output_id)
+        if key in self._created:
+            if self._unclaimed[key]:
+                return self._created[key]
+            else:
+                return None
+
+        uxto = self.storage.get_output(txn_hash, output_id)
+        if uxto is None:
+            return None
+        elif self._unclaimed.get(key, not uxto.claimed):
+            return uxto
+        else:
+            return None
+
+    def is_unclaimed(self, txn_hash: Hash, output_id: int) -> bool:
+        return self.get_unclaimed(txn_hash, output_id) is not None
+
+    def claim(self, txn_hash: Hash, output_id: int) -> None:
+        self._unclaimed[(txn_hash.raw_sha256, output_id)] = False
+
+    def connect(self, undo: BlockUndo) -> None:
+        for txn_hash, output_id in undo.claimed:
+            self.claim(txn_hash, output_id)
+
+        for u in undo.created:
+            key = (u.txn_hash.raw_sha256, u.output_id)
+            self._created[key] = u
+            self._unclaimed[key] = True
+
+    def disconnect(self, undo: BlockUndo) -> None:
+        for u in undo.created:
+            key = (u.txn_hash.raw_sha256, u.output_id)
+            self._created.pop(key, None)
+            self._unclaimed[key] = False
+
+        for txn_hash, output_id in undo.claimed:
+            self._unclaimed[(txn_hash.raw_sha256, output_id)] = True
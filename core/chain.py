@@ -1,19 +1,26 @@
 from core.amount import Amount
 from core.block import HashedBlock
+from core.block_header import BlockHeader
+from core.block_undo import BlockUndo, UXTOView
 from core.storage.chain_storage import BlockChainStorage
 from core.storage.transaction_storage import TransactionStorage
+from core.storage.unit_of_work import HeadMovedError
 from core.storage.uxto_storage import UXTOStorage 
 from core.config import Config
 from core.dblog import DBLogger
-from core import difficulty
-from core.difficulty import DEFAULT_DIFFICULTY, difficulty_adjustment
+from core.head_notifier import HeadNotifier
+from core.header_index import HeaderEntry, HeaderIndex, block_work
 from core.serializable import Hash
+from core.signature_verifier import SignatureVerifier
 from core.transaction.signed_transaction import SignedTransaction
 from core.transaction.transaction_output import TransactionOutput
-from typing import Dict, Iterator, Optional, List
+from core.validation_stats import ValidationStats, STAGE_HEADER, STAGE_POW
+from core.validation_stats import STAGE_CONTEXT, STAGE_TRANSACTIONS
+import time
+from typing import Dict, Iterator, Optional, List, Set, Tuple
 
-TUNING_SEGMENT_LENGTH = 64
 ABANDONMENT_DEPTH = 10
+
 REWARD_AMOUNT = Amount.units(100)
 
 class InvalidBlockError(Exception):
@@ -28,69 +35,161 @@ class BlockChain(object):
             storage: BlockChainStorage,
             transaction_storage: TransactionStorage,
             uxto_storage: UXTOStorage,
-            cfg: Config) -> None:
+            cfg: Config,
+            head_notifier: Optional[HeadNotifier] = None,
+            verifier: Optional[SignatureVerifier] = None) -> None:
 
         self.storage = storage
         self.transaction_storage = transaction_storage
         self.uxto_storage = uxto_storage
+        self.head_notifier = head_notifier
         self.l = DBLogger(self, cfg)
 
+        if verifier is None:
+            self.verifier = SignatureVerifier(cfg)
+        else:
+            self.verifier = verifier
+
         genesis = storage.get_genesis()
         if genesis is None:
             self.l.info("Storage didn't have genesis. Added.")
             storage.add_block(HashedBlock.genesis())
 
+        self.headers = HeaderIndex(storage, self.l)
+        self._unsaved_stats = ValidationStats()
+        self.prune_depth = cfg.prune_depth()
+
+        # The assume valid block and its ancestors, from a header chain
+        # whose proof of work was checked. Their signatures aren't checked.
+        self.assume_valid = cfg.assume_valid()
+        self._assumed_valid: Set[bytes] = set()
+        self._seconds_per_signature: Optional[float] = None
+
     def get_difficulty(self, head: Optional[HashedBlock] = None) -> int:
+        """
+        Difficulty of the children of head (default: the current head),
+        looked up in the header index's schedule.
+        """
         if head is None:
-            h = self.get_head()
-        else:
-            h = head
-
-        if (h.block_num() + 1) < TUNING_SEGMENT_LENGTH:
-            return difficulty.DEFAULT_DIFFICULTY
-        elif (h.block_num() + 1) % TUNING_SEGMENT_LENGTH == 0:
-            diff = self.tuning_segment_difficulty(
-                    h.block.block_config.difficulty, h.block_num())
-            self.l.info("Head ({}) is at end of segment, retune to {}".format(
-                h.block_num(), diff))
-            return diff
-        else:
-            return h.block.block_config.difficulty
+            self.headers.refresh()
+            return self.headers.head().next_difficulty
+
+        entry = self.headers.get(head.mining_hash())
+        if entry is None:
+            self.headers.refresh()
+            entry = self.headers.get(head.mining_hash())
+
+        return entry.next_difficulty
 
     def get_head(self) -> HashedBlock:
         return self.storage.get_head()
 
-    def add_block(self, block: HashedBlock) -> None:
+    def add_block(
+            self,
+            block: HashedBlock,
+            signatures: Optional[List[bool]] = None) -> None:
+        """
+        Stores a valid block, and makes it the head if its branch has more
+        cumulative work than the current head's. Raises InvalidBlockError if
+        the block is invalid or its branch claims outputs it can't.
+        `signatures` are the already checked signatures of its transactions.
+        """
+        try:
+            self._add_block(block, signatures)
+        finally:
+            self._save_validation_stats()
+
+    def _add_block(
+            self,
+            block: HashedBlock,
+            signatures: Optional[List[bool]]) -> None:
         if self.storage.has_hash(block.mining_hash()):
             self.l.debug("Already have block", block)
             return
-        elif self.block_is_valid(block):
-            self.l.debug("Store block", block)
-            self.storage.add_block(block)
-            for txn in block.block.transactions:
-                for out in txn.transaction.outputs:
-                    self.l.debug("Add UXTO", txn.txn_hash(), out.output_id)
-                    self.uxto_storage.add_output(txn.txn_hash(), out.to_addr, out.output_id)
-
-                for inp in txn.transaction.inputs:
-                    out = self.get_transaction_output(
-                        inp.output_block_hash,
-                        inp.output_transaction_hash,
-                        inp.output_id)
-
-                    self.l.debug("Claim UXTO",
-                        inp.output_transaction_hash,
-                        inp.output_id)
+        elif self.block_is_valid(block, signatures):
+            while True:
+                self.headers.refresh()
+                parent = self.headers.get(block.parent_mining_hash())
+                work = parent.cumulative_work + block_work(
+                    block.block.block_config.difficulty)
+
+                if work <= self.headers.head().cumulative_work:
+                    self.l.debug("Store block off the main chain", block)
+                    self.storage.add_block(block)
+                    break
+
+                try:
+                    self._switch_head(block, parent)
+                    break
+                except HeadMovedError:
+                    self.l.info("Head moved while switching to", block)
 
-                    self.uxto_storage.mark_claimed(
-                        inp.output_transaction_hash,
-                        inp.output_id)
-
-            self._cleanup_outstanding_transactions(block)
             self._abandon_blocks()
         else:
             raise InvalidBlockError("Block is invalid")
 
+    def add_blocks(self, blocks: List[HashedBlock]) -> None:
+        """
+        Adds blocks in order, parents first, checking the signatures of all
+        of them as one batch.
+        """
+        blocks = list(filter(
+            lambda b: not self.storage.has_hash(b.mining_hash()), blocks))
+
+        # Blocks whose hash doesn't even meet their own difficulty are left
+        # out of the batch, add_block rejects them before parsing anything.
+        # So are blocks whose signatures are assumed valid.
+        in_batch = list(map(
+            lambda b: b.hash_meets_difficulty() and not self.is_assumed_valid(b),
+            blocks))
+        txns: List[SignedTransaction] = []
+        for block, batched in zip(blocks, in_batch):
+            if batched:
+                txns.extend(block.block.transactions)
+        signatures = self.verifier.verify(txns)
+
+        start = 0
+        try:
+            for block, batched in zip(blocks, in_batch):
+                if batched:
+                    stop = start + len(block.block.transactions)
+                    self._add_block(block, signatures[start:stop])
+                    start = stop
+                else:
+                    self._add_block(block, None)
+        finally:
+            self._save_validation_stats()
+
+    def validation_stats(self) -> ValidationStats:
+        """What validation has seen so far, in every process using the storage."""
+        return self.storage.get_validation_stats()
+
+    def _save_validation_stats(self) -> None:
+        if not self._unsaved_stats.is_empty():
+            self.storage.add_validation_stats(self._unsaved_stats)
+            self._unsaved_stats = ValidationStats()
+
+    def add_outstanding_transactions(
+            self, txns: List[SignedTransaction]) -> List[SignedTransaction]:
+        """
+        Adds the valid transactions we don't have yet to the pool, checking
+        their signatures as one batch. Returns the invalid ones.
+        """
+        txns = list(filter(
+            lambda t: not self.transaction_storage.has_transaction(t.txn_hash()),
+            txns))
+        signatures = self.verifier.verify(txns)
+
+        invalid: List[SignedTransaction] = []
+        for txn, signature_is_valid in zip(txns, signatures):
+            if self.transaction_is_valid(txn, signature_is_valid):
+                self.l.debug("Store transaction", txn)
+                self.transaction_storage.add_transaction(txn)
+            else:
+                invalid.append(txn)
+
+        return invalid
+
     def add_outstanding_transaction(self, txn: SignedTransaction) -> None:
         if self.transaction_storage.has_transaction(txn.txn_hash()):
             self.l.debug("Already have txn", txn)
@@ -101,30 +200,87 @@ class BlockChain(object):
         else:
             raise InvalidTransactionError("Transaction is invalid")
 
+    def add_header_chain(self, headers: List[BlockHeader]) -> None:
+        """
+        Takes note of a header chain whose links and proof of work were
+        checked. If the assume valid block is in it, it and the headers
+        before it have their signatures assumed valid.
+        """
+        if self.assume_valid is None:
+            return
+
+        hashes = list(map(lambda h: h.mining_hash().raw_sha256, headers))
+        if self.assume_valid.raw_sha256 not in hashes:
+            return
+
+        last = hashes.index(self.assume_valid.raw_sha256)
+        self.l.info("Assuming the signatures of blocks {} to {} are valid".format(
+            headers[0].block_num(), headers[last].block_num()))
+        self._assumed_valid.update(hashes[:last + 1])
+
+    def is_assumed_valid(self, block: HashedBlock) -> bool:
+        return block.mining_hash().raw_sha256 in self._assumed_valid
+
     @staticmethod
     def genesis_is_valid(block: HashedBlock, l: DBLogger) -> bool:
         return block.mining_hash() == HashedBlock.genesis().mining_hash()
 
-    def block_is_valid(self, block: HashedBlock) -> bool:
-        if self.storage.has_hash(block.parent_mining_hash()):
-            parent = self.storage.get_by_hash(block.parent_mining_hash())
-        else:
+    def block_is_valid(
+            self,
+            block: HashedBlock,
+            signatures: Optional[List[bool]] = None) -> bool:
+        """
+        Runs the validation stages cheapest first and stops at the first
+        one that fails, so a block with a bad header never has its
+        transactions parsed. Each stage's time and outcome are counted
+        towards validation_stats. Claimed outputs depend on the branch, they're
+        checked when the block is connected to the main chain.
+        """
+        parent = self.headers.get(block.parent_mining_hash())
+        if parent is None:
+            self.headers.refresh()
+            parent = self.headers.get(block.parent_mining_hash())
+
+        stages = [
+            (STAGE_HEADER, lambda: self._header_is_valid(block, parent)),
+            (STAGE_POW, lambda: self._pow_is_valid(block, parent)),
+            (STAGE_CONTEXT, lambda: self._context_is_valid(block)),
+            (STAGE_TRANSACTIONS,
+                lambda: self._transactions_are_valid(block, signatures)),
+        ]
+
+        for stage, is_valid in stages:
+            start = time.perf_counter()
+            passed = is_valid()
+            self._unsaved_stats.record(
+                stage, passed, time.perf_counter() - start)
+
+            if not passed:
+                return False
+
+        return True
+
+    def _header_is_valid(
+            self, block: HashedBlock, parent: Optional[HeaderEntry]) -> bool:
+        if parent is None:
             self.l.warn("Parent with hash {} not known".format(
                 block.parent_mining_hash().hex()))
             return False
 
-        if self.block_should_be_abandoned(block):
-            self.l.warn("Block should be abandoned", block)
+        if block.block_num() != parent.block_num + 1:
+            self.l.warn("Block number isn't parent+1")
             return False
 
-        difficulty = self.get_difficulty(parent)
-        if block.block.block_config.difficulty != difficulty:
+        return True
+
+    def _pow_is_valid(self, block: HashedBlock, parent: HeaderEntry) -> bool:
+        if block.block.block_config.difficulty != parent.next_difficulty:
             self.l.warn(
                 "Unexpected difficulty {} for block {} ({}), expected {}".format(
                     block.block.block_config.difficulty,
                     block.block_num(),
                     block.mining_hash().hex(),
-                    difficulty))
+                    parent.next_difficulty))
             return False
 
         if not block.hash_meets_difficulty():
@@ -132,62 +288,119 @@ class BlockChain(object):
                 "Block hash doesn't meet the set difficulty")
             return False
 
-        if block.block_num() != parent.block_num() + 1:
-            self.l.warn("Block number isn't parent+1")
+        return True
+
+    def _context_is_valid(self, block: HashedBlock) -> bool:
+        if self.block_should_be_abandoned(block):
+            self.l.warn("Block should be abandoned", block)
+            return False
+
+        return True
+
+    def _transactions_are_valid(
+            self,
+            block: HashedBlock,
+            signatures: Optional[List[bool]]) -> bool:
+
+        try:
+            canonical = block.block.transactions_are_canonical()
+        except (KeyError, TypeError, ValueError) as e:
+            self.l.warn("Block transactions don't parse", block, exc=e)
+            return False
+
+        if not canonical:
+            self.l.warn("Block transactions aren't in canonical form", block)
+            return False
+
+        if not block.block.transactions_match_commitment():
+            self.l.warn("Block transactions don't match its merkle root")
             return False
 
         n_rewards = 0
         for transaction in block.block.transactions:
-            if not self.transaction_is_valid(transaction):
-                self.l.warn("Transaction is invalid")
-                return False
-
             if transaction.is_reward():
                 n_rewards += 1
+                if not self.reward_is_valid(transaction):
+                    self.l.warn("Reward is invalid")
+                    return False
 
         if n_rewards != 1:
             self.l.warn(
-                "Invalid number of rewards ({}) in transaction w/ sig{}".format(
-                    n_rewards,
-                    transaction.signature))
+                "Invalid number of rewards ({}) in block {}".format(
+                    n_rewards, block))
             return False
 
+        if self.is_assumed_valid(block):
+            if self._seconds_per_signature is None:
+                self._seconds_per_signature = self.verifier.seconds_per_signature()
+            self._unsaved_stats.record_assumed_valid(
+                len(block.block.transactions), self._seconds_per_signature)
+            self._assumed_valid.discard(block.mining_hash().raw_sha256)
+            return True
+
+        if signatures is None:
+            signatures = self.verifier.verify(block.block.transactions)
+
+        for transaction, signature_is_valid in zip(
+                block.block.transactions, signatures):
+            if not signature_is_valid:
+                self.l.warn(
+                    "Transaction signature is invalid (sig {})".format(
+                        transaction.signature))
+                return False
+
         return True
 
-    def transaction_is_valid(self, signed: SignedTransaction) -> bool:
-        if signed.is_reward():
-            return self.reward_is_valid(signed)
+    def transaction_is_valid(
+            self,
+            signed: SignedTransaction,
+            signature_is_valid: Optional[bool] = None) -> bool:
+        """
+        Checks the transaction against the main chain. Pass
+        signature_is_valid if the signature was already checked.
+        """
+        if signature_is_valid is None:
+            signature_is_valid = self.verifier.verify_one(signed)
 
-        if not signed.signature_is_valid():
+        if not signature_is_valid:
             self.l.warn(
                 "Transaction signature is invalid (sig {})".format(
                     signed.signature))
             return False
 
+        if signed.is_reward():
+            return self.reward_is_valid(signed)
+
+        return self.claims_are_valid(signed, UXTOView(self.uxto_storage))
+
+    def claims_are_valid(self, signed: SignedTransaction, view: UXTOView) -> bool:
+        """
+        Whether the transaction's inputs are unclaimed outputs in the view
+        that belong to its claimer and add up to its outputs.
+        """
         output_sum = Amount(0)
         for output in signed.transaction.outputs:
             output_sum += output.amount
 
-        claimed_prev_outputs: List[TransactionOutput] = []
         claimed_sum = Amount(0)
+        seen: List[Tuple[bytes, int]] = []
         for inp in signed.transaction.inputs:
-            out = self.get_transaction_output(
-                inp.output_block_hash,
-                inp.output_transaction_hash,
-                inp.output_id)
-            
-            if out is None:
-                self.l.warn("Output was unknown", out)
+            key = (inp.output_transaction_hash.raw_sha256, inp.output_id)
+            out = view.get_unclaimed(inp.output_transaction_hash, inp.output_id)
+            if out is None or key in seen:
+                self.l.warn("Output unknown or already claimed",
+                    inp.output_transaction_hash, inp.output_id)
                 return False
+            seen.append(key)
 
-            if self.uxto_storage.output_is_claimed(
-                    inp.output_transaction_hash, inp.output_id):
-                self.l.warn("Output already claimed", out)
+            if out.block_hash != inp.output_block_hash:
+                self.l.warn("Output isn't in block {}".format(
+                    inp.output_block_hash.hex()))
                 return False
 
             claimed_sum += out.amount
 
-            if out.to_addr != signed.transaction.claimer:
+            if out.claimer_address != signed.transaction.claimer:
                 self.l.warn(
                     "Output {} can't be claimed by address {}".format(
                         out, signed.transaction.claimer))
@@ -201,12 +414,7 @@ class BlockChain(object):
         return True
 
     def reward_is_valid(self, reward: SignedTransaction) -> bool:
-        if not reward.signature_is_valid():
-            self.l.warn(
-                "Reward signature is invalid (sig {})".format(
-                    reward.signature))
-            return False
-
+        """Checks everything but the signature, which callers check."""
         if len(reward.transaction.outputs) != 1:
             self.l.warn("Reward has n_outputs != 1", reward)
             return False
@@ -226,100 +434,154 @@ class BlockChain(object):
         block_hash: Hash,
         txn_hash: Hash,
         output_id: int) -> Optional[TransactionOutput]:
+        """Looks a main chain output up in the outpoint table."""
 
-        block = self.storage.get_by_hash(block_hash)
+        uxto = self.uxto_storage.get_output(txn_hash, output_id)
 
-        if block is None:
-            self.l.warn(
-                "Don't have block hash {} when getting txn output".format(
-                    block_hash.hex()))
+        if uxto is None or uxto.block_hash != block_hash:
+            self.l.warn("No output {} {} in block {}".format(
+                txn_hash.hex(), output_id, block_hash.hex()))
             return None
 
-        for signed in block.block.transactions:
-            if signed.txn_hash() != txn_hash:
-                continue 
-
-            for output in signed.transaction.outputs:
-                if output.output_id == output_id:
-                    return output
-
-        self.l.warn("No output with ID", output_id)
-        return None
+        return TransactionOutput(output_id, uxto.amount, uxto.claimer_address)
 
-    def tuning_segment_difficulty(self, current_difficulty: int, height: int) -> int:
-        self.l.debug("Calculating tuning segment difficulty using height", height)
+    def block_should_be_abandoned(self, block: HashedBlock) -> bool:
+        """
+        Either the block is in the master chain or it's within 10 blocks of
+        the current head.
+        """
+        return not (self.block_is_in_master_chain(block)
+                or (self.headers.height() - block.block_num() < ABANDONMENT_DEPTH))
 
-        seg_stop = ((height // TUNING_SEGMENT_LENGTH) + 1) * TUNING_SEGMENT_LENGTH
-        seg_start = seg_stop - TUNING_SEGMENT_LENGTH
+    def block_is_in_master_chain(self, block: HashedBlock) -> bool:
+        """
+        Whether the block is an ancestor of the current head, according to
+        the header index.
+        """
+        self.headers.refresh()
+        return self.headers.is_in_main_chain(block.mining_hash())
 
-        if seg_start == 0:
-            self.l.debug("Omitting genesis block from tuning calculation")
-            seg_start = 1
+    def _switch_head(self, block: HashedBlock, parent: HeaderEntry) -> None:
+        """
+        Stores block as the new head. The blocks between the old head and
+        the fork point are disconnected using their undo records and the new
+        branch is validated against the outputs that leaves, all in memory,
+        so this only touches as many blocks as the reorg is deep. The block,
+        the output changes and the pool changes are committed as one unit
+        of work.
+        """
+        old_head = self.headers.head()
+        disconnect_hashes, connect_hashes = self._reorg_path(parent)
+        if len(disconnect_hashes) > 0:
+            self.l.info("Reorg: disconnecting {} blocks, connecting {}".format(
+                len(disconnect_hashes), len(connect_hashes) + 1))
+
+        work = self.storage.unit_of_work()
+        work.add_block(block)
+        view = UXTOView(self.uxto_storage)
+
+        disconnected: List[HashedBlock] = []
+        for block_hash in disconnect_hashes:
+            undo = self.storage.get_undo(block_hash)
+            if undo is None:
+                raise Exception(
+                    "No undo record for block {}".format(block_hash.hex()))
+            view.disconnect(undo)
+            work.disconnect(undo)
+            disconnected.append(self.storage.get_by_hash(block_hash))
+
+        connected = list(map(self.storage.get_by_hash, connect_hashes))
+        connected.append(block)
+        for b in connected:
+            for txn in b.block.transactions:
+                if txn.is_reward():
+                    continue
+                elif not self.claims_are_valid(txn, view):
+                    self.l.warn("Abandon block with invalid claims", b)
+                    self.storage.abandon_block(b.mining_hash())
+                    raise InvalidBlockError("Block {} makes invalid claims".format(
+                        b.mining_hash().hex()))
 
-        self.l.debug("Getting segment [{}, {})".format(seg_start, seg_stop))
+                for inp in txn.transaction.inputs:
+                    view.claim(inp.output_transaction_hash, inp.output_id)
 
-        segment = self.storage.get_range(seg_start, seg_stop)
-        times = map(lambda b: b.mining_timestamp, segment)
-        adjustment = difficulty_adjustment(times, self.l)
-        new_difficulty = current_difficulty + adjustment
-        self.l.debug("Tuning difficulty:", new_difficulty)
+            undo = BlockUndo.for_block(b)
+            view.connect(undo)
+            work.connect(undo)
+            work.remove_transactions(
+                list(map(lambda t: t.txn_hash(), b.block.transactions)))
 
-        if new_difficulty < 0:
-            self.l.warn("Attempted to set new difficulty to {}, clamping to 0".format(new_difficulty))
-            new_difficulty = 0
-        elif new_difficulty > 255:
-            self.l.warn("Attempted to set new difficulty to {}, clamping to 255".format(new_difficulty))
-            new_difficulty = 255
+        work.add_transactions(self._returned_transactions(disconnected, view))
+        work.move_head(Hash(old_head.mining_hash), block.mining_hash())
+        work.commit()
+        self.headers.refresh()
 
-        return new_difficulty
+        if self.head_notifier is not None:
+            self.head_notifier.notify()
 
-    def block_should_be_abandoned(self, block: HashedBlock) -> bool:
+    def _reorg_path(self, parent: HeaderEntry) -> Tuple[List[Hash], List[Hash]]:
         """
-        Either the block is in the master chain or it's within 10 blocks of
-        the current head.
+        Hashes of the main chain blocks to disconnect, head first, and of the
+        stored blocks to connect before a child of parent, oldest first.
         """
-        return not (self.block_is_in_master_chain(block)
-                or (self.get_head().block_num() - block.block_num() < ABANDONMENT_DEPTH))
-        
-    def block_is_in_master_chain(self, block: HashedBlock) -> bool:
+        connect: List[Hash] = []
+        cur = parent
+        while not cur.in_main_chain:
+            connect.append(Hash(cur.mining_hash))
+            cur = self.headers.get(Hash(cur.parent_hash))
+        connect.reverse()
+
+        disconnect: List[Hash] = []
+        for block_num in range(self.headers.height(), cur.block_num, -1):
+            disconnect.append(self.headers.main_chain_hash(block_num))
+
+        return disconnect, connect
+
+    def _returned_transactions(
+            self,
+            disconnected: List[HashedBlock],
+            view: UXTOView) -> List[SignedTransaction]:
         """
-        Use BFS to see if the current head can be reached from the block in 
-        question.
+        The disconnected blocks' transactions that are still valid on the
+        new branch, which go back in the pool.
         """
-        head = self.get_head()
-        crawl_queue: List[HashedBlock] = [block]
-
-        while len(crawl_queue) > 0:
-            cur = crawl_queue.pop(0)
-            if cur == head:
-                return True
+        txns: List[SignedTransaction] = []
+        for block in disconnected:
+            txns.extend(filter(lambda t: not t.is_reward(), block.block.transactions))
+
+        returned: List[SignedTransaction] = []
+        for txn, signature_is_valid in zip(txns, self.verifier.verify(txns)):
+            if signature_is_valid and self.claims_are_valid(txn, view):
+                self.l.debug("Adding disconnected transaction back to pool", txn)
+                for inp in txn.transaction.inputs:
+                    view.claim(inp.output_transaction_hash, inp.output_id)
+                returned.append(txn)
             else:
-                crawl_queue.extend(
-                        self.storage.get_by_parent_hash(cur.mining_hash()))
+                self.l.debug("Disconnected transaction no longer valid", txn)
 
-        return False
+        return returned
 
-    def _cleanup_outstanding_transactions(self, block: HashedBlock) -> None:
-        self.l.debug("Cleaning up outstanding transactions in block", block)
-        for txn in block.block.transactions:
-            if self.transaction_storage.has_transaction(txn.txn_hash()):
-                self.l.debug("Removing outstanding transaction", txn)
-                self.transaction_storage.remove_transaction(txn.txn_hash())
-            else:
-                self.l.debug("Transaction wasn't oustanding", txn)
+    def is_pruned(self) -> bool:
+        return self.prune_depth > 0
+
+    def prune_height(self) -> int:
+        """
+        Blocks numbered below this are more than prune_depth below the head,
+        pruned nodes drop their bodies.
+        """
+        self.headers.refresh()
+        return self.headers.height() - self.prune_depth
 
     def _abandon_blocks(self):
-        head = self.get_head()
-        abandon_height = head.block_num() - ABANDONMENT_DEPTH
+        self.headers.refresh()
+        abandon_height = self.headers.height() - ABANDONMENT_DEPTH
+        if len(self.headers.at_height(abandon_height)) < 2:
+            return # nothing but the main chain block at that height
+
         abandon_candidates = self.storage.get_by_block_num(abandon_height)
+        # Blocks off the main chain were never connected, or returned their
+        # transactions to the pool when they were disconnected.
         for block in abandon_candidates:
             if self.block_should_be_abandoned(block):
                 self.l.debug("Abandon block", block)
-                self.storage.abandon_block(block)
-
-                for txn in block.block.transactions:
-                    if self.transaction_is_valid(txn):
-                        self.l.debug("Adding abandoned transaction back to pool", txn)
-                        self.transaction_storage.add_transaction(txn)
-                    else:
-                        self.l.debug("Abandoned transaction no longer valid")
+                self.storage.abandon_block(block.mining_hash())
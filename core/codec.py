@@ -0,0 +1,238 @@
+from core.amount import Amount
+from core.block import Block, HashedBlock
+from core.block_config import BlockConfig
+from core.key_pair import Address
+from core.serializable import Hash
+from core.signature import Signature
+from core.timestamp import Timestamp
+from core.transaction.signed_transaction import SignedTransaction
+from core.transaction.transaction import Transaction
+from core.transaction.transaction_input import TransactionInput
+from core.transaction.transaction_output import TransactionOutput
+import struct
+from typing import List, Optional
+
+# Storage encoding for blocks and transactions. Everything is still hashed
+# and signed over its canonical JSON, this is only how it's kept on disk
+# and optionally sent to peers. An encoded value starts with the codec
+# version, which can't be mistaken for the "{" JSON starts with, so both
+# can be read from the same table.
+#
+# Integers are signed 64 bit, byte strings are prefixed with a 16 bit
+# length and lists with a 32 bit count, all big-endian. A value that
+# wouldn't come back as the same JSON, like an integer that's out of range
+# or was a float in the JSON, raises CodecError, and is stored as JSON.
+CODEC_VERSION = 1
+CODEC_VERSIONS = [CODEC_VERSION]
+JSON_PREFIX = b"{"
+
+# Content type of a response that's a list of encoded blocks.
+BLOCK_LIST_CONTENT_TYPE = "application/x-radcoin-blocks"
+
+INT = struct.Struct(">q")
+LENGTH = struct.Struct(">H")
+COUNT = struct.Struct(">I")
+
+class CodecError(Exception):
+    pass
+
+class Writer(object):
+    def __init__(self) -> None:
+        self.parts: List[bytes] = [bytes([CODEC_VERSION])]
+
+    def int(self, value: int) -> None:
+        if type(value) is not int:
+            raise CodecError("Not an integer", value)
+        try:
+            self.parts.append(INT.pack(value))
+        except struct.error as e:
+            raise CodecError("Integer out of range", value) from e
+
+    def bytes(self, value: bytes) -> None:
+        if len(value) > 0xffff:
+            raise CodecError("Byte string too long", len(value))
+        self.parts.append(LENGTH.pack(len(value)))
+        self.parts.append(value)
+
+    def optional_bytes(self, value: Optional[bytes]) -> None:
+        if value is None:
+            self.parts.append(b"\0")
+        else:
+            self.parts.append(b"\1")
+            self.bytes(value)
+
+    def count(self, n: int) -> None:
+        self.parts.append(COUNT.pack(n))
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.parts)
+
+class Reader(object):
+    def __init__(self, data: bytes) -> None:
+        if len(data) == 0 or data[0] not in CODEC_VERSIONS:
+            raise CodecError("Unknown codec version")
+        self.data = data
+        self.offset = 1
+
+    def int(self) -> int:
+        value = INT.unpack_from(self.data, self.offset)[0]
+        self.offset += INT.size
+        return value
+
+    def bytes(self) -> bytes:
+        n = LENGTH.unpack_from(self.data, self.offset)[0]
+        start = self.offset + LENGTH.size
+        self.offset = start + n
+        return self.data[start:self.offset]
+
+    def optional_bytes(self) -> Optional[bytes]:
+        present = self.data[self.offset]
+        self.offset += 1
+        if present:
+            return self.bytes()
+        else:
+            return None
+
+    def count(self) -> int:
+        n = COUNT.unpack_from(self.data, self.offset)[0]
+        self.offset += COUNT.size
+        return n
+
+def write_transaction(w: Writer, txn: SignedTransaction) -> None:
+    t = txn.transaction
+    w.count(len(t.inputs))
+    for inp in t.inputs:
+        w.bytes(inp.output_block_hash.raw_sha256)
+        w.bytes(inp.output_transaction_hash.raw_sha256)
+        w.int(inp.output_id)
+
+    w.count(len(t.outputs))
+    for out in t.outputs:
+        w.int(out.output_id)
+        w.int(out.amount.nanos)
+        w.bytes(bytes.fromhex(out.to_addr.hex()))
+
+    w.int(t.timestamp.unix_millis)
+    w.bytes(bytes.fromhex(t.claimer.hex()))
+    w.bytes(txn.signature.ed25519_signature)
+
+def read_transaction(r: Reader) -> SignedTransaction:
+    inputs: List[TransactionInput] = []
+    for _ in range(r.count()):
+        block_hash = Hash(r.bytes())
+        txn_hash = Hash(r.bytes())
+        inputs.append(TransactionInput(block_hash, txn_hash, r.int()))
+
+    outputs: List[TransactionOutput] = []
+    for _ in range(r.count()):
+        output_id = r.int()
+        amount = Amount(r.int())
+        outputs.append(TransactionOutput(
+            output_id, amount, Address.from_hex(r.bytes())))
+
+    timestamp = Timestamp(r.int())
+    claimer = Address.from_hex(r.bytes())
+    signature = Signature(r.bytes())
+    return SignedTransaction(
+        Transaction(inputs, outputs, timestamp, claimer), signature)
+
+def encode_transaction(txn: SignedTransaction) -> bytes:
+    w = Writer()
+    write_transaction(w, txn)
+    return w.getvalue()
+
+def decode_transaction(data: bytes) -> SignedTransaction:
+    if data.startswith(JSON_PREFIX):
+        return SignedTransaction.deserialize(data)
+
+    try:
+        return read_transaction(Reader(data))
+    except (struct.error, IndexError) as e:
+        raise CodecError("Truncated transaction") from e
+
+def encode_block(hb: HashedBlock) -> bytes:
+    b = hb.block
+    w = Writer()
+    w.int(b.version)
+    w.int(b.block_num)
+    if b.parent_mining_hash is None:
+        w.optional_bytes(None)
+    else:
+        w.optional_bytes(b.parent_mining_hash.raw_sha256)
+    w.int(b.block_config.difficulty)
+    if b.merkle_root is None:
+        w.optional_bytes(None)
+    else:
+        w.optional_bytes(b.merkle_root.raw_sha256)
+
+    if not b.transactions_are_canonical():
+        raise CodecError("Transactions aren't in canonical form")
+    w.count(len(b.transactions))
+    for txn in b.transactions:
+        write_transaction(w, txn)
+
+    w.bytes(hb.mining_entropy)
+    w.int(hb.mining_timestamp.unix_millis)
+    return w.getvalue()
+
+def decode_block(data: bytes) -> HashedBlock:
+    if data.startswith(JSON_PREFIX):
+        return HashedBlock.deserialize(data)
+
+    try:
+        return read_block(Reader(data))
+    except (struct.error, IndexError) as e:
+        raise CodecError("Truncated block") from e
+
+def read_block(r: Reader) -> HashedBlock:
+    version = r.int()
+    block_num = r.int()
+    parent = r.optional_bytes()
+    config = BlockConfig(r.int())
+    root = r.optional_bytes()
+    txns = list(map(lambda _: read_transaction(r), range(r.count())))
+
+    block = Block(
+        block_num,
+        None if parent is None else Hash(parent),
+        config,
+        txns,
+        version,
+        None if root is None else Hash(root))
+    entropy = r.bytes()
+    return HashedBlock(block, entropy, Timestamp(r.int()))
+
+def stored_block(hb: HashedBlock) -> bytes:
+    """The block encoded for storage, as JSON if the codec can't take it."""
+    try:
+        return encode_block(hb)
+    except CodecError:
+        return hb.serialize()
+
+def stored_transaction(txn: SignedTransaction) -> bytes:
+    try:
+        return encode_transaction(txn)
+    except CodecError:
+        return txn.serialize()
+
+def pack_list(encoded: List[bytes]) -> bytes:
+    """Encoded values, each prefixed with its length, after their count."""
+    parts = [COUNT.pack(len(encoded))]
+    for e in encoded:
+        parts.append(COUNT.pack(len(e)))
+        parts.append(e)
+    return b"".join(parts)
+
+def unpack_list(data: bytes) -> List[bytes]:
+    try:
+        n = COUNT.unpack_from(data, 0)[0]
+        offset = COUNT.size
+        encoded: List[bytes] = []
+        for _ in range(n):
+            size = COUNT.unpack_from(data, offset)[0]
+            offset += COUNT.size
+            encoded.append(data[offset:offset + size])
+            offset += size
+    except struct.error as e:
+        raise CodecError("Truncated list") from e
+    return encoded
@@ -1,8 +1,14 @@
 import json
 import os
 from typing import Any, Dict, Optional
+from core.block import BLOCK_VERSIONS
 from core.network import util
 from core.peer import generate_peer_id
+from core.serializable import Hash
+
+# Pruned nodes keep the bodies of at least this many blocks below the head,
+# so they can still reorg and serve recent blocks.
+MIN_PRUNE_DEPTH = 64
 
 DEFAULTS = {
     "chain_db_path": "./chain.sqlite",
@@ -12,6 +18,13 @@ DEFAULTS = {
     "gateway_port": 8989,
     "miner_procs": 1, # number of processes to run
     "miner_throttle": 1.0, # attempt to use no more than this fraction of each CPU
+    "block_version": 1, # format of mined blocks, 2 commits to a merkle root
+    "verify_procs": 0, # processes the sync client checks signatures on, 0 for one per CPU
+    "assume_valid": None, # hex hash of a block whose ancestors' signatures aren't checked
+    "prune_depth": 0, # keep the bodies of this many blocks below the head, 0 keeps all
+    "split_storage": False, # keep outputs and pool in their own files, see --migrate_storage
+    "uxto_db_path": "./uxto.sqlite", # only used with split_storage
+    "mempool_db_path": "./mempool.sqlite", # only used with split_storage
     "advertize_self": True, # set this to false if you can't run a server
     "listen_port": 8989,
     "log_level": "INFO", # see core.dblog
@@ -37,18 +50,55 @@ class Config(object):
         self._peer_sample_size = int(args["peer_sample_size"])
         self._poll_delay = int(args["poll_delay"])
         self._wallet_path = args["wallet_path"]
+        self._verify_procs = int(args["verify_procs"])
+
+        if args.get("assume_valid") is None:
+            self._assume_valid: Optional[Hash] = None
+        else:
+            self._assume_valid = Hash.fromhex(args["assume_valid"])
+
+        self._split_storage = bool(args.get("split_storage", False))
+        self._uxto_db_path = args.get("uxto_db_path", DEFAULTS["uxto_db_path"])
+        self._mempool_db_path = args.get(
+            "mempool_db_path", DEFAULTS["mempool_db_path"])
+
+        self._prune_depth = int(args.get("prune_depth", 0))
+        if 0 < self._prune_depth < MIN_PRUNE_DEPTH:
+            raise ValueError("Prune depth should be 0 or at least", MIN_PRUNE_DEPTH)
 
         if 0 < args["miner_throttle"] <= 1:
             self._miner_throttle = args["miner_throttle"]
         else:
             raise ValueError("Miner throttle should be between 0 and 1")
 
+        if args["block_version"] in BLOCK_VERSIONS:
+            self._block_version = args["block_version"]
+        else:
+            raise ValueError("Block version should be one of", BLOCK_VERSIONS)
+
     def log_level(self) -> str:
         return self._log_level
 
     def chain_db_path(self) -> str:
         return self._chain_db_path
 
+    def split_storage(self) -> bool:
+        return self._split_storage
+
+    def uxto_db_path(self) -> str:
+        """The file the outputs are in, the chain's unless storage is split."""
+        if self._split_storage:
+            return self._uxto_db_path
+        else:
+            return self._chain_db_path
+
+    def mempool_db_path(self) -> str:
+        """The file the pool is in, the chain's unless storage is split."""
+        if self._split_storage:
+            return self._mempool_db_path
+        else:
+            return self._chain_db_path
+
     def log_db_path(self) -> str:
         return self._log_db_path
 
@@ -79,6 +129,18 @@ class Config(object):
     def miner_throttle(self) -> float:
         return self._miner_throttle
 
+    def block_version(self) -> int:
+        return self._block_version
+
+    def verify_procs(self) -> int:
+        return self._verify_procs
+
+    def assume_valid(self) -> Optional[Hash]:
+        return self._assume_valid
+
+    def prune_depth(self) -> int:
+        return self._prune_depth
+
     def peer_sample_size(self) -> int:
         return self._peer_sample_size
 
@@ -1,7 +1,7 @@
 import arrow
 from core.config import Config
+from core.storage import sqlite_db
 import os
-import sqlite3
 import traceback
 from typing import Any, Dict, List, Optional, Tuple, Union
 
@@ -40,7 +40,7 @@ class DBLogger(object):
         else:
             raise TypeError("Bad source type", type(source))
 
-        self._conn = sqlite3.connect(cfg.log_db_path())
+        self._conn = sqlite_db.connect(cfg.log_db_path())
         self.log_level = cfg.log_level()
         with self._conn:
             c = self._conn.cursor()
@@ -1,9 +1,11 @@
 from core.dblog import DBLogger
 from core.timestamp import Timestamp
 import math
-from typing import Iterator
+from typing import Callable, Iterator, List
 
 DEFAULT_DIFFICULTY = 18
+TUNING_SEGMENT_LENGTH = 64
+MAX_DIFFICULTY = 255
 BLOCK_TIME_TARGET = 1 * 60 * 1000 # 1 minute
 
 def difficulty_adjustment(block_times: Iterator[Timestamp], l: DBLogger) -> int:
@@ -37,3 +39,33 @@ def difficulty_adjustment(block_times: Iterator[Timestamp], l: DBLogger) -> int:
     adjustment = int(round(log_target - log_mean))
     l.debug("Recommended adjustment:", adjustment)
     return adjustment
+
+def next_difficulty(
+        block_num: int,
+        difficulty: int,
+        segment_times: Callable[[], List[Timestamp]],
+        l: DBLogger) -> int:
+    """
+    Difficulty of the children of a block. It only changes after the last
+    block of a tuning segment, which is when segment_times is called for
+    the mining times of that segment's blocks, genesis excluded.
+    """
+    if (block_num + 1) < TUNING_SEGMENT_LENGTH:
+        return DEFAULT_DIFFICULTY
+    elif (block_num + 1) % TUNING_SEGMENT_LENGTH != 0:
+        return difficulty
+
+    new_difficulty = difficulty + difficulty_adjustment(
+        iter(segment_times()), l)
+
+    if new_difficulty < 0:
+        l.warn("Attempted to set new difficulty to {}, clamping to 0".format(new_difficulty))
+        new_difficulty = 0
+    elif new_difficulty > MAX_DIFFICULTY:
+        l.warn("Attempted to set new difficulty to {}, clamping to {}".format(
+            new_difficulty, MAX_DIFFICULTY))
+        new_difficulty = MAX_DIFFICULTY
+
+    l.debug("Block {} ends a segment, retune to {}".format(
+        block_num, new_difficulty))
+    return new_difficulty
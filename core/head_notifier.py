@@ -0,0 +1,34 @@
+import ctypes
+import multiprocessing
+
+class HeadNotifier(object):
+    """
+    Tells processes on this host that the chain has a new head.
+
+    It's a sequence number in shared memory plus a condition to sleep on.
+    Whichever process stores a block that becomes the head bumps the
+    sequence, and miners waiting on it wake up right away instead of
+    finding out at their next poll. Create it before starting the server,
+    client and miner processes and hand it to each of them.
+    """
+
+    def __init__(self) -> None:
+        self._cond = multiprocessing.Condition()
+        self._seq = multiprocessing.Value(ctypes.c_uint64, 0, lock=False)
+
+    def sequence(self) -> int:
+        return self._seq.value
+
+    def notify(self) -> None:
+        with self._cond:
+            self._seq.value += 1
+            self._cond.notify_all()
+
+    def wait(self, seen: int, timeout: float) -> int:
+        """
+        Sleeps until the sequence moves past `seen` or the timeout runs out.
+        Returns the current sequence.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq.value != seen, timeout)
+            return self._seq.value
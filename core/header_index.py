@@ -0,0 +1,171 @@
+from core.dblog import DBLogger
+from core.difficulty import TUNING_SEGMENT_LENGTH, next_difficulty
+from core.serializable import Hash
+from core.timestamp import Timestamp
+from typing import Dict, List, Optional
+
+def block_work(difficulty: int) -> int:
+    """Expected number of hashes it took to mine a block."""
+    return 2**difficulty
+
+class HeaderEntry(object):
+    """
+    What the index keeps per block. row_id is the header's position in
+    storage, which always comes after its parent's.
+    """
+
+    def __init__(
+            self,
+            row_id: int,
+            mining_hash: bytes,
+            parent_hash: Optional[bytes],
+            block_num: int,
+            difficulty: int,
+            unix_millis: int) -> None:
+
+        self.row_id = row_id
+        self.mining_hash = mining_hash
+        self.parent_hash = parent_hash
+        self.block_num = block_num
+        self.difficulty = difficulty
+        self.unix_millis = unix_millis
+        self.cumulative_work = 0
+        self.next_difficulty = 0 # of this block's children
+        self.in_main_chain = False
+
+    def __str__(self) -> str:
+        return "HeaderEntry<num={},hash={}>".format(
+            self.block_num, self.mining_hash.hex())
+
+class HeaderIndex(object):
+    """
+    In-memory index of every stored block header, keyed by mining hash.
+
+    The headers are loaded from storage's compact header table when the
+    index is created. refresh() picks up headers that any process stored
+    since, and follows the stored head, flagging the chain from the head
+    back to genesis as the main chain. Moving to a new head only touches
+    the blocks between it and the fork point. No block bodies are read.
+
+    Each entry also carries the difficulty its children must have, worked
+    out from its ancestors' headers when it's added. That only takes any
+    work at the end of a tuning segment, so the whole difficulty schedule
+    is rebuilt from the headers whenever the index is created.
+    """
+
+    def __init__(self, storage, l: DBLogger) -> None:
+        self.storage = storage
+        self.l = l
+        self._entries: Dict[bytes, HeaderEntry] = {}
+        self._by_height: Dict[int, List[bytes]] = {}
+        self._main_chain: List[bytes] = [] # mining hash by height
+        self._last_row_id = 0
+        self.refresh()
+
+    def refresh(self) -> None:
+        for entry in self.storage.get_headers_since(self._last_row_id):
+            self._add(entry)
+
+        head_hash = self.storage.get_head_hash().raw_sha256
+        if self.head_hash() != head_hash:
+            self._set_head(head_hash)
+
+    def get(self, mining_hash: Hash) -> Optional[HeaderEntry]:
+        return self._entries.get(mining_hash.raw_sha256)
+
+    def has(self, mining_hash: Hash) -> bool:
+        return mining_hash.raw_sha256 in self._entries
+
+    def head(self) -> HeaderEntry:
+        return self._entries[self._main_chain[-1]]
+
+    def head_hash(self) -> Optional[bytes]:
+        if len(self._main_chain) == 0:
+            return None
+        else:
+            return self._main_chain[-1]
+
+    def height(self) -> int:
+        return len(self._main_chain) - 1
+
+    def at_height(self, block_num: int) -> List[HeaderEntry]:
+        hashes = self._by_height.get(block_num, [])
+        return list(map(lambda h: self._entries[h], hashes))
+
+    def main_chain_hash(self, block_num: int) -> Optional[Hash]:
+        if 0 <= block_num < len(self._main_chain):
+            return Hash(self._main_chain[block_num])
+        else:
+            return None
+
+    def is_in_main_chain(self, mining_hash: Hash) -> bool:
+        entry = self.get(mining_hash)
+        return entry is not None and entry.in_main_chain
+
+    def is_ancestor(self, ancestor: Hash, descendant: Hash) -> bool:
+        """Whether `ancestor` is `descendant` or one of its ancestors."""
+        a = self.get(ancestor)
+        cur = self.get(descendant)
+        if a is None or cur is None or a.block_num > cur.block_num:
+            return False
+
+        if a.in_main_chain and cur.in_main_chain:
+            return True
+
+        while cur.block_num > a.block_num and not cur.in_main_chain:
+            cur = self._entries[cur.parent_hash]
+
+        if cur.in_main_chain:
+            return a.in_main_chain
+        else:
+            return cur.mining_hash == a.mining_hash
+
+    def _add(self, entry: HeaderEntry) -> None:
+        if entry.parent_hash is None:
+            parent_work = 0
+        else:
+            parent_work = self._entries[entry.parent_hash].cumulative_work
+
+        entry.cumulative_work = parent_work + block_work(entry.difficulty)
+        entry.next_difficulty = next_difficulty(
+            entry.block_num,
+            entry.difficulty,
+            lambda: self._segment_times(entry),
+            self.l)
+        self._entries[entry.mining_hash] = entry
+        self._by_height.setdefault(entry.block_num, []).append(entry.mining_hash)
+        self._last_row_id = max(self._last_row_id, entry.row_id)
+
+    def _set_head(self, head_hash: bytes) -> None:
+        new_head = self._entries[head_hash]
+        height = new_head.block_num
+
+        for stale in self._main_chain[height + 1:]:
+            self._entries[stale].in_main_chain = False
+        del self._main_chain[height + 1:]
+        self._main_chain.extend([b""] * (height + 1 - len(self._main_chain)))
+
+        cur: Optional[HeaderEntry] = new_head
+        while cur is not None and not cur.in_main_chain:
+            replaced = self._main_chain[cur.block_num]
+            if replaced:
+                self._entries[replaced].in_main_chain = False
+            self._main_chain[cur.block_num] = cur.mining_hash
+            cur.in_main_chain = True
+
+            if cur.parent_hash is None:
+                cur = None
+            else:
+                cur = self._entries[cur.parent_hash]
+
+    def _segment_times(self, last: HeaderEntry) -> List[Timestamp]:
+        """Mining times of the segment ending at last, leaving out genesis."""
+        start = max(1, last.block_num + 1 - TUNING_SEGMENT_LENGTH)
+        times: List[Timestamp] = []
+        cur = last
+        while cur.block_num >= start:
+            times.append(Timestamp(cur.unix_millis))
+            cur = self._entries[cur.parent_hash]
+
+        times.reverse()
+        return times
@@ -1,14 +1,16 @@
-from core.serializable import Serializable, Ser
+from core.serializable import Immutable, Ser
 from core.signature import Signature
 import nacl.encoding
 import nacl.exceptions
 import nacl.signing
 from typing import Dict
 
-class Address(Serializable):
+class Address(Immutable):
     def __init__(self, verify_key: nacl.signing.VerifyKey) -> None:
         super().__init__()
         self._verify_key = verify_key
+        self._raw_key = verify_key.encode(encoder=nacl.encoding.RawEncoder())
+        self.freeze()
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, Address):
@@ -16,6 +18,9 @@ class Address(Serializable):
         else:
             return False
 
+    def __hash__(self) -> int:
+        return hash(self._raw_key)
+
     @staticmethod
     def from_hex(hex_verify_key: bytes) -> 'Address':
         key = nacl.signing.VerifyKey(
@@ -23,7 +28,7 @@ class Address(Serializable):
         return Address(key)
 
     def hex(self) -> str:
-        return self._verify_key.encode(encoder=nacl.encoding.RawEncoder()).hex()
+        return self._raw_key.hex()
 
     @staticmethod
     def from_dict(obj: Ser) -> 'Address':
@@ -43,8 +48,7 @@ class Address(Serializable):
 
     def serializable(self) -> Ser:
         return {
-            "edd25519_pub_key": self._verify_key.encode(
-                encoder=nacl.encoding.RawEncoder()).hex(),
+            "edd25519_pub_key": self.hex(),
         }
 
 class KeyPair(object):
@@ -0,0 +1,97 @@
+from core.serializable import Hash
+import hashlib
+from typing import Iterable, List
+
+NODE_PREFIX = b"\x01" # keeps inner nodes from being passed off as leaves
+EMPTY_ROOT = Hash(hashlib.sha256(b"").digest())
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+def merkle_root(leaves: Iterable[Hash]) -> Hash:
+    """
+    Root of a binary tree over the leaves. A node without a sibling is
+    carried up to the next level unchanged.
+    """
+    level = list(map(lambda h: h.raw_sha256, leaves))
+    if len(level) == 0:
+        return EMPTY_ROOT
+
+    while len(level) > 1:
+        parents: List[bytes] = []
+        for i in range(0, len(level) - 1, 2):
+            parents.append(node_hash(level[i], level[i + 1]))
+        if len(level) % 2 == 1:
+            parents.append(level[-1])
+        level = parents
+
+    return Hash(level[0])
+
+class MerkleTree(object):
+    """
+    A merkle tree that keeps every level, so setting, appending or removing
+    a leaf only rehashes the path from that leaf to the root. The root is
+    always equal to merkle_root(leaves).
+    """
+
+    def __init__(self, leaves: Iterable[Hash] = ()) -> None:
+        self._levels: List[List[bytes]] = [[]]
+        for leaf in leaves:
+            self.append(leaf)
+
+    def __len__(self) -> int:
+        return len(self._levels[0])
+
+    def root(self) -> Hash:
+        if len(self) == 0:
+            return EMPTY_ROOT
+        else:
+            return Hash(self._levels[-1][0])
+
+    def leaf(self, index: int) -> Hash:
+        return Hash(self._levels[0][index])
+
+    def append(self, leaf: Hash) -> None:
+        self._levels[0].append(leaf.raw_sha256)
+        self._update_path(len(self) - 1)
+
+    def set(self, index: int, leaf: Hash) -> None:
+        self._levels[0][index] = leaf.raw_sha256
+        self._update_path(index)
+
+    def remove(self, index: int) -> None:
+        """Removes a leaf by moving the last leaf into its place."""
+        leaves = self._levels[0]
+        leaves[index] = leaves[-1]
+        leaves.pop()
+
+        if len(leaves) > 0:
+            self._update_path(len(leaves) - 1)
+        if index < len(leaves):
+            self._update_path(index)
+
+    def _update_path(self, index: int) -> None:
+        level = 0
+        while len(self._levels[level]) > 1:
+            nodes = self._levels[level]
+            if level + 1 == len(self._levels):
+                self._levels.append([])
+            parents = self._levels[level + 1]
+
+            parent_index = index // 2
+            left = 2 * parent_index
+            if left + 1 < len(nodes):
+                value = node_hash(nodes[left], nodes[left + 1])
+            else:
+                value = nodes[left]
+
+            if parent_index < len(parents):
+                parents[parent_index] = value
+            else:
+                parents.append(value)
+            del parents[(len(nodes) + 1) // 2:]
+
+            index = parent_index
+            level += 1
+
+        del self._levels[level + 1:]
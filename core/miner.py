@@ -1,35 +1,131 @@
 from core.amount import Amount
 from core.block import Block, HashedBlock
 from core.block_config import BlockConfig
+from core.block_template import BlockTemplate
 from core.chain import BlockChain, REWARD_AMOUNT
 from core.config import Config
 from core.dblog import DBLogger
 from core.difficulty import DEFAULT_DIFFICULTY
+from core.head_notifier import HeadNotifier
 from core.key_pair import KeyPair
-from core.network.client import ChainClient
+from core.serializable import Hash
 from core.storage.sqlite_chain import SqliteBlockChainStorage
 from core.storage.sqlite_transaction import SqliteTransactionStorage
 from core.storage.sqlite_uxto import SqliteUXTOStorage
 from core.timestamp import Timestamp
 from core.transaction.transaction import Transaction
 from core.transaction.signed_transaction import SignedTransaction
+import hashlib
 import os
 import time
-from typing import List, Optional
+from typing import Any, List, Optional, Tuple
+
+MINING_ROUND_SECONDS = 1.0
+NONCE_PREFIX_BYTES = 24 # random per round, so rounds never repeat work
+NONCE_COUNTER_BYTES = 8
+NONCE_BATCH_SIZE = 4096 # hashes between clock checks
+MAX_GOVERNOR_CREDIT = 0.05 # seconds of unused CPU a governor may bank
+
+def search_nonces(
+        midstate: Any,
+        prefix: bytes,
+        start: int,
+        count: int,
+        target: int) -> Tuple[Optional[bytes], int]:
+    """
+    Try `count` counter nonces starting at `start` against a mining midstate
+    (see HashedBlock.mining_midstate) and a difficulty target (see
+    BlockConfig.target). Returns the winning mining entropy, if any, and the
+    number of hashes computed.
+    """
+    from_bytes = int.from_bytes
+    for nonce in range(start, start + count):
+        entropy = prefix + nonce.to_bytes(NONCE_COUNTER_BYTES, "big")
+        m = midstate.copy()
+        m.update(entropy)
+        if from_bytes(m.digest(), "big") < target:
+            return entropy, nonce - start + 1
+
+    return None, count
+
+class DutyCycleGovernor(object):
+    """
+    Holds a mining process to a fraction of one CPU (cfg.miner_throttle()).
+
+    Mining is done in short slices. After each slice the governor compares
+    the CPU time the process used against the wall time that has passed and
+    sleeps off the difference, so that over time cpu / wall stays at the
+    throttle. Sleeping too long or too short carries over to the next slice,
+    but only a little unused time can be banked, so an idle miner doesn't
+    get to run flat out afterwards.
+    """
+
+    def __init__(self, throttle: float) -> None:
+        self.throttle = throttle
+        self.n_hashes = 0
+        self.cpu_seconds = 0.0
+        self.wall_seconds = 0.0
+        self._debt = 0.0
+        self.resume()
+
+    def resume(self) -> None:
+        """Start timing slices again after time spent not mining."""
+        self._slice_cpu = time.process_time()
+        self._slice_wall = time.time()
+
+    def slice_done(self, n_hashes: int) -> None:
+        cpu = time.process_time() - self._slice_cpu
+        wall = time.time() - self._slice_wall
+
+        if self.throttle < 1.0:
+            self._debt += cpu / self.throttle - wall
+            self._debt = max(self._debt, -MAX_GOVERNOR_CREDIT)
+
+            if self._debt > 0:
+                sleep_start = time.time()
+                time.sleep(self._debt)
+                slept = time.time() - sleep_start
+                self._debt -= slept
+                wall += slept
+
+        self.n_hashes += n_hashes
+        self.cpu_seconds += cpu
+        self.wall_seconds += wall
+        self.resume()
+
+    def hashrate(self) -> float:
+        """Achieved hashes per second of wall time, sleeps included."""
+        if self.wall_seconds > 0:
+            return self.n_hashes / self.wall_seconds
+        else:
+            return 0.0
+
+    def duty_cycle(self) -> float:
+        """Fraction of wall time this process actually spent on the CPU."""
+        if self.wall_seconds > 0:
+            return self.cpu_seconds / self.wall_seconds
+        else:
+            return 0.0
 
 class BlockMiner(object):
-    def __init__(self, cfg: Config, key_pair: Optional[KeyPair] = None) -> None:
+    def __init__(
+            self,
+            cfg: Config,
+            key_pair: Optional[KeyPair] = None,
+            head_notifier: Optional[HeadNotifier] = None) -> None:
         self.l = DBLogger(self, cfg)
         self.l.info("Init")
         self.cfg = cfg
 
-        self.client = ChainClient(cfg)
-
         if key_pair is None:
             self.key_pair = KeyPair.new()
         else:
             self.key_pair = key_pair
 
+        self.hashrate = 0.0
+        self.governor = DutyCycleGovernor(cfg.miner_throttle())
+        self.head_notifier = head_notifier
+
         self.storage = SqliteBlockChainStorage(cfg)
         self.transaction_storage = SqliteTransactionStorage(cfg)
         self.uxto_storage = SqliteUXTOStorage(cfg)
@@ -37,61 +133,101 @@ class BlockMiner(object):
             self.storage,
             self.transaction_storage,
             self.uxto_storage,
-            cfg)
+            cfg,
+            head_notifier)
+
+        self.template = BlockTemplate(
+            self.transaction_storage,
+            self.make_reward,
+            self.l,
+            cfg.block_version(),
+            self.valid_for_mining)
 
     def mine_forever(self) -> None:
         self.l.info("Miner running")
+        head_hash: Optional[Hash] = None
 
         while True:
-            head = self.chain.get_head()
-            self.l.debug("Mining on block {}".format(head.block_num()))
-            new_block = self.mine_on(head, self.chain.get_difficulty())
+            if self.storage.get_head_hash() != head_hash:
+                head = self.chain.get_head()
+                head_hash = head.mining_hash()
+                difficulty = self.chain.get_difficulty(head)
+                self.l.debug("Mining on block {}".format(head.block_num()))
+
+            new_block = self.mine_on(head, difficulty, head_hash)
 
             if new_block:
                 self.l.info("Found block {} {}".format(
                     new_block.block_num(), new_block.mining_hash().hex()))
                 self.chain.add_block(new_block)
-            elif head != self.chain.get_head():
+            elif head_hash != self.storage.get_head_hash():
                 self.l.info("Preempted! Mining on new block", head)
 
-    def mine_on(self, parent: HashedBlock, difficulty: int) -> Optional[HashedBlock]:
-        reward = self.make_reward()
-        config = BlockConfig(difficulty)
-
-        txns = self.transaction_storage.get_all_transactions()
-        txns.append(reward)
-
-        self.l.debug("Mining on {} txns".format(len(txns)))
-
-        block = Block(
-            parent.block_num()+1,
-            parent.mining_hash(),
-            config,
-            txns)
-
-        hb = HashedBlock(block)
-
+    def block_template(
+            self,
+            parent: HashedBlock,
+            difficulty: int,
+            parent_hash: Optional[Hash] = None) -> BlockTemplate:
+        """
+        Brings the miner's template up to date with the parent and the
+        mempool. Pass parent_hash if it's known to save hashing the parent.
+        """
+        if parent_hash is None:
+            parent_hash = parent.mining_hash()
+
+        self.template.update(parent_hash, parent.block_num(), difficulty)
+        return self.template
+
+    def mine_on(
+            self,
+            parent: HashedBlock,
+            difficulty: int,
+            parent_hash: Optional[Hash] = None) -> Optional[HashedBlock]:
+        template = self.block_template(parent, difficulty, parent_hash)
+        block = template.block()
+        midstate = hashlib.sha256(template.digest().raw_sha256)
+        target = block.block_config.target
+        prefix = os.urandom(NONCE_PREFIX_BYTES)
+        nonce = 0
+        entropy: Optional[bytes] = None
+        n_hashes = 0
+        head_seq = self._head_sequence()
+
+        self.governor.resume()
         start = time.time()
-        while time.time() - start < 1.0:
-            hb.replace_mining_entropy(os.urandom(32))
-            if hb.hash_meets_difficulty():
-                return hb
-
-        return None
-
-    def transactions(self) -> List[SignedTransaction]:
-        candidate_txns = self.transaction_storage.get_all_transactions()
-        mine_txns: List[SignedTransaction] = []
+        while entropy is None and time.time() - start < MINING_ROUND_SECONDS:
+            if self._head_sequence() != head_seq:
+                self.l.debug("Head changed, abandoning round")
+                break
+
+            entropy, n = search_nonces(
+                midstate, prefix, nonce, NONCE_BATCH_SIZE, target)
+            nonce += n
+            n_hashes += n
+            self.governor.slice_done(n)
+
+        elapsed = time.time() - start
+        self.hashrate = n_hashes / elapsed if elapsed > 0 else 0.0
+        self.l.debug("Hashed {} nonces at {:.0f} H/s, duty cycle {:.2f}".format(
+            n_hashes, self.hashrate, self.governor.duty_cycle()))
+
+        if entropy is None:
+            return None
+        else:
+            return HashedBlock(block, entropy, Timestamp.now())
 
-        for txn in candidate_txns:
-            if self.chain.transaction_is_valid(txn):
-                self.l.debug("Txn is is valid for mining", txn)
-                mine_txns.append(txn)
-            else:
-                self.l.warn("Txn is not valid for mining", txn)
+    def _head_sequence(self) -> int:
+        if self.head_notifier is None:
+            return 0
+        else:
+            return self.head_notifier.sequence()
 
-        mine_txns.append(self.make_reward())
-        return mine_txns
+    def valid_for_mining(self, txns: List[SignedTransaction]) -> List[bool]:
+        """Whether each pool transaction can go in a block on the head."""
+        signatures = self.chain.verifier.verify(txns)
+        return list(map(
+            lambda t: self.chain.transaction_is_valid(t[0], t[1]),
+            zip(txns, signatures)))
 
     def make_reward(self) -> SignedTransaction:
         reward = Transaction.reward(REWARD_AMOUNT, self.key_pair.address())
@@ -105,5 +241,5 @@ class BlockMiner(object):
             [])
         hb = HashedBlock(b)
         while not hb.hash_meets_difficulty():
-            hb.replace_mining_entropy(os.urandom(32))
+            hb = hb.with_mining_entropy(os.urandom(32))
         return hb
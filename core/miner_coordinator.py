@@ -0,0 +1,276 @@
+from core.block import HashedBlock
+from core.block_config import target_for_difficulty
+from core.config import Config
+from core.dblog import DBLogger
+from core.head_notifier import HeadNotifier
+from core.key_pair import KeyPair
+from core.miner import (
+    BlockMiner,
+    DutyCycleGovernor,
+    NONCE_COUNTER_BYTES,
+    NONCE_PREFIX_BYTES,
+    search_nonces)
+from core.serializable import Hash
+from core.timestamp import Timestamp
+import ctypes
+import hashlib
+import multiprocessing
+import os
+import time
+from typing import List, Optional, Tuple
+
+HASH_BYTES = 32
+WORKER_BATCH_SIZE = 1024 # hashes between preemption checks
+WORKER_IDLE_SLEEP = 0.001 # seconds
+HEAD_POLL_SECONDS = 0.05 # without a HeadNotifier
+SOLUTION_POLL_SECONDS = 0.01
+TEMPLATE_REFRESH_SECONDS = 1.0 # pick up new mempool transactions this often
+
+def nonce_range(worker_id: int, n_workers: int) -> Tuple[int, int]:
+    """The [start, stop) slice of the nonce counter owned by a worker."""
+    span = 2**(8 * NONCE_COUNTER_BYTES) // n_workers
+    return worker_id * span, (worker_id + 1) * span
+
+class MiningJob(object):
+    """
+    The current block template as seen by the workers, kept in shared memory.
+
+    A job is the block digest (see HashedBlock.mining_midstate), the nonce
+    prefix and the difficulty. Publishing a new one bumps job_id, which every
+    worker checks between batches, so stale work is dropped within one batch.
+    """
+
+    def __init__(self, n_workers: int) -> None:
+        self.lock = multiprocessing.Lock()
+        self.job_id = multiprocessing.Value(ctypes.c_uint64, 0, lock=False)
+        self.digest = multiprocessing.Array(ctypes.c_char, HASH_BYTES, lock=False)
+        self.prefix = multiprocessing.Array(
+            ctypes.c_char, NONCE_PREFIX_BYTES, lock=False)
+        self.difficulty = multiprocessing.Value(ctypes.c_int, 0, lock=False)
+
+        self.solution_job_id = multiprocessing.Value(
+            ctypes.c_uint64, 0, lock=False)
+        self.solution = multiprocessing.Array(
+            ctypes.c_char, NONCE_PREFIX_BYTES + NONCE_COUNTER_BYTES, lock=False)
+
+        self.hash_counts = multiprocessing.Array(
+            ctypes.c_uint64, n_workers, lock=False)
+        self.cpu_seconds = multiprocessing.Array(
+            ctypes.c_double, n_workers, lock=False)
+
+    def publish(self, digest: bytes, prefix: bytes, difficulty: int) -> int:
+        with self.lock:
+            self.digest.raw = digest
+            self.prefix.raw = prefix
+            self.difficulty.value = difficulty
+            self.job_id.value += 1
+            return self.job_id.value
+
+    def cancel(self) -> None:
+        with self.lock:
+            self.job_id.value += 1
+            self.difficulty.value = -1
+
+    def current_id(self) -> int:
+        return self.job_id.value
+
+    def read(self) -> Tuple[int, bytes, bytes, int]:
+        with self.lock:
+            return (
+                self.job_id.value,
+                self.digest.raw,
+                self.prefix.raw,
+                self.difficulty.value)
+
+    def submit_solution(self, job_id: int, entropy: bytes) -> None:
+        """Record a solution and cancel the job so the other workers stop."""
+        with self.lock:
+            if job_id == self.job_id.value:
+                self.solution.raw = entropy
+                self.solution_job_id.value = job_id
+                self.job_id.value += 1
+                self.difficulty.value = -1
+
+    def solution_for(self, job_id: int) -> Optional[bytes]:
+        with self.lock:
+            if self.solution_job_id.value == job_id:
+                return self.solution.raw
+            else:
+                return None
+
+    def total_hashes(self) -> int:
+        return sum(self.hash_counts)
+
+    def total_cpu_seconds(self) -> float:
+        return sum(self.cpu_seconds)
+
+def mining_worker(
+        worker_id: int,
+        n_workers: int,
+        job: MiningJob,
+        throttle: float) -> None:
+    """
+    Body of a worker process. Hashes its own slice of the nonce space for
+    whatever job is current, and goes idle once the job is solved or
+    cancelled.
+    """
+    start, stop = nonce_range(worker_id, n_workers)
+    governor = DutyCycleGovernor(throttle)
+    seen_id = 0
+
+    while True:
+        job_id, digest, prefix, difficulty = job.read()
+        if job_id == seen_id or difficulty < 0:
+            time.sleep(WORKER_IDLE_SLEEP)
+            continue
+
+        seen_id = job_id
+        midstate = hashlib.sha256()
+        midstate.update(digest)
+        target = target_for_difficulty(difficulty)
+        nonce = start
+        governor.resume()
+
+        while nonce < stop and job.current_id() == job_id:
+            batch = min(WORKER_BATCH_SIZE, stop - nonce)
+            entropy, n = search_nonces(midstate, prefix, nonce, batch, target)
+            nonce += n
+            job.hash_counts[worker_id] += n
+            governor.slice_done(n)
+            job.cpu_seconds[worker_id] = governor.cpu_seconds
+
+            if entropy is not None:
+                job.submit_solution(job_id, entropy)
+                break
+
+class MinerCoordinator(object):
+    """
+    Mines with cfg.miner_procs() worker processes on a single block template.
+
+    The coordinator owns the chain and the reward key pair, builds the
+    template and hands each worker a disjoint slice of the nonce counter
+    through a MiningJob. When a worker finds a solution, or the head moves,
+    the job is replaced and every worker drops what it was doing.
+    """
+
+    def __init__(
+            self,
+            cfg: Config,
+            key_pair: Optional[KeyPair] = None,
+            head_notifier: Optional[HeadNotifier] = None) -> None:
+        self.l = DBLogger(self, cfg)
+        self.l.info("Init")
+        self.cfg = cfg
+        self.n_workers = cfg.miner_procs()
+
+        self.miner = BlockMiner(cfg, key_pair, head_notifier)
+        self.chain = self.miner.chain
+        self.head_notifier = head_notifier
+        self.job = MiningJob(self.n_workers)
+        self.workers: List[multiprocessing.Process] = []
+        self.hashrate = 0.0
+        self.duty_cycle = 0.0
+
+        self._head: Optional[HashedBlock] = None
+        self._head_hash: Optional[Hash] = None
+        self._difficulty = 0
+
+    def start_workers(self) -> None:
+        for i in range(self.n_workers):
+            p = multiprocessing.Process(
+                target=mining_worker,
+                args=(i, self.n_workers, self.job, self.cfg.miner_throttle()),
+                daemon=True)
+            p.start()
+            self.workers.append(p)
+
+        self.l.info("Started {} mining workers".format(self.n_workers))
+
+    def stop_workers(self) -> None:
+        self.job.cancel()
+        for p in self.workers:
+            p.terminate()
+            p.join()
+        self.workers = []
+
+    def mine_forever(self) -> None:
+        self.start_workers()
+        self.l.info("Miner running")
+
+        try:
+            while True:
+                new_block = self.mine_round()
+
+                if new_block:
+                    self.l.info("Found block {} {}".format(
+                        new_block.block_num(), new_block.mining_hash().hex()))
+                    self.chain.add_block(new_block)
+        finally:
+            self.stop_workers()
+
+    def mine_round(self) -> Optional[HashedBlock]:
+        """
+        Publish a template on the current head and wait until it's solved,
+        the head changes or the template is due for a refresh.
+        """
+        head_hash = self.chain.storage.get_head_hash()
+        if head_hash != self._head_hash:
+            self._head = self.chain.get_head()
+            self._head_hash = head_hash
+            self._difficulty = self.chain.get_difficulty(self._head)
+
+        template = self.miner.block_template(
+            self._head, self._difficulty, head_hash)
+        block = template.block()
+
+        job_id = self.job.publish(
+            template.digest().raw_sha256,
+            os.urandom(NONCE_PREFIX_BYTES),
+            self._difficulty)
+        self.l.debug("Published job {} on block {}".format(
+            job_id, self._head.block_num()))
+
+        start = time.time()
+        start_hashes = self.job.total_hashes()
+        start_cpu = self.job.total_cpu_seconds()
+        entropy: Optional[bytes] = None
+        head_seq = self._head_sequence()
+
+        while time.time() - start < TEMPLATE_REFRESH_SECONDS:
+            if self.head_notifier is None:
+                time.sleep(HEAD_POLL_SECONDS)
+                head_changed = True
+            else:
+                seq = self.head_notifier.wait(head_seq, SOLUTION_POLL_SECONDS)
+                head_changed = seq != head_seq
+                head_seq = seq
+
+            entropy = self.job.solution_for(job_id)
+            if entropy is not None:
+                break
+
+            if head_changed and self.chain.storage.get_head_hash() != head_hash:
+                self.l.info("Preempted! Mining on new block")
+                self.job.cancel()
+                break
+
+        elapsed = time.time() - start
+        n_hashes = self.job.total_hashes() - start_hashes
+        cpu = self.job.total_cpu_seconds() - start_cpu
+        if elapsed > 0:
+            self.hashrate = n_hashes / elapsed
+            self.duty_cycle = cpu / (elapsed * self.n_workers)
+        self.l.debug(
+            "{} workers hashed {} nonces at {:.0f} H/s, duty cycle {:.2f}".format(
+                self.n_workers, n_hashes, self.hashrate, self.duty_cycle))
+
+        if entropy is None:
+            return None
+        else:
+            return HashedBlock(block, entropy, Timestamp.now())
+
+    def _head_sequence(self) -> int:
+        if self.head_notifier is None:
+            return 0
+        else:
+            return self.head_notifier.sequence()
@@ -1,9 +1,16 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from core.block import HashedBlock
-from core.chain import BlockChain
+from core.block_header import BlockHeader
+from core.chain import BlockChain, InvalidBlockError
+from core.codec import BLOCK_LIST_CONTENT_TYPE, CodecError, decode_block, unpack_list
 from core.config import Config
 from core.dblog import DBLogger
+from core.head_notifier import HeadNotifier
+from core.network.header_chain import HeaderChain
 from core.network.peer_list import Peer, PeerList
 from core.serializable import Hash
+from core.signature_verifier import SignatureVerifier
 from core.storage.sqlite_chain import SqliteBlockChainStorage
 from core.storage.sqlite_transaction import SqliteTransactionStorage
 from core.storage.sqlite_uxto import SqliteUXTOStorage
@@ -12,10 +19,80 @@ import json
 import random
 import requests
 import time
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+SYNC_WINDOW_SIZE = 64 # blocks whose signatures are checked as one batch
+
+# Peers this far ahead of us are synced headers first, with their blocks
+# downloaded a window at a time from several peers.
+HEADERS_FIRST_MIN_LAG = 2 * SYNC_WINDOW_SIZE
+HEADERS_PER_REQUEST = 512
+MAX_BODY_PEERS = 8
+WINDOWS_IN_FLIGHT_PER_PEER = 2
+LOCATOR_DENSE_LENGTH = 10 # most recent blocks, then every 2**n-th back
+
+def fetch_blocks(peer: Peer, block_hashes: List[Hash]) -> Optional[List[HashedBlock]]:
+    """
+    Blocks by hash from peer, in the binary codec if the peer has it. Runs
+    on the download threads, so it leaves logging to the caller.
+    """
+    payload = {
+        "hex_hashes": ",".join(map(lambda h: h.hex(), block_hashes)),
+        "encoding": "binary",
+    }
+    try:
+        r = requests.get(peer.http_url("/blocks"), params=payload)
+        if r.headers.get("Content-Type") == BLOCK_LIST_CONTENT_TYPE:
+            return list(map(decode_block, unpack_list(r.content)))
+
+        obj = json.loads(r.content)
+        return list(map(HashedBlock.from_dict, obj["blocks"]))
+    except requests.exceptions.ConnectionError:
+        return None
+    except (CodecError, KeyError, TypeError, ValueError):
+        return None
+
+class SyncProgress(object):
+    """How many of a known number of blocks are in, and how fast."""
+
+    def __init__(self, total: int) -> None:
+        self.total = total
+        self.done = 0
+        self.start = time.time()
+
+    def advance(self, n: int) -> None:
+        self.done += n
+
+    def rate(self) -> float:
+        elapsed = time.time() - self.start
+        if elapsed <= 0:
+            return 0.0
+        return self.done / elapsed
+
+    def eta_seconds(self) -> Optional[float]:
+        rate = self.rate()
+        if rate == 0:
+            return None
+        return (self.total - self.done) / rate
+
+    def __str__(self) -> str:
+        eta = self.eta_seconds()
+        if eta is None:
+            eta_str = "unknown"
+        else:
+            eta_str = "{:.0f}s".format(eta)
+        return "{}/{} blocks ({:.1f}%), {:.1f} blocks/s, ETA {}".format(
+            self.done,
+            self.total,
+            100.0 * self.done / max(self.total, 1),
+            self.rate(),
+            eta_str)
 
 class ChainClient(object):
-    def __init__(self, cfg: Config) -> None:
+    def __init__(
+            self,
+            cfg: Config,
+            head_notifier: Optional[HeadNotifier] = None) -> None:
         self.l = DBLogger(self, cfg)
         self.l.info("Init")
         self.peer_list = PeerList(cfg)
@@ -28,7 +105,9 @@ class ChainClient(object):
             SqliteBlockChainStorage(cfg),
             SqliteTransactionStorage(cfg),
             SqliteUXTOStorage(cfg),
-            cfg)
+            cfg,
+            head_notifier,
+            SignatureVerifier(cfg, use_pool=True))
         self.cfg = cfg
 
     def poll_forever(self) -> None:
@@ -72,13 +151,8 @@ class ChainClient(object):
             self.l.info("Peer not responding", peer)
             return
 
-        for txn in transactions:
-            if not self.chain.transaction_storage.has_transaction(txn.sha256()):
-                if self.chain.transaction_is_valid(txn):
-                    self.l.info("New transaction", txn)
-                    self.chain.add_outstanding_transaction(txn)
-                else:
-                    self.l.warn("Peer sent us an invalid transaction", peer, txn)
+        for txn in self.chain.add_outstanding_transactions(transactions):
+            self.l.warn("Peer sent us an invalid transaction", peer, txn)
 
         peer_head = self.request_head(peer)
         if not peer_head:
@@ -93,6 +167,12 @@ class ChainClient(object):
             self.l.warn("Peer returned a different genesis block than expected", peer, peer_head)
             return
 
+        if peer_head.block_num() - self.chain.storage.get_height() >= HEADERS_FIRST_MIN_LAG:
+            self.l.info("Peer {} is at {}, syncing headers first".format(
+                peer, peer_head.block_num()))
+            self.sync_headers_first(peer, [peer] + peers)
+            return
+
         parent = self.request_block(peer_head.parent_mining_hash(), peer)
 
         if parent is None:
@@ -106,22 +186,216 @@ class ChainClient(object):
                 self.l.debug("Wat. Peer didn't have parent:", peer_head.parent_mining_hash())
                 return
 
+        # Blocks are added a window at a time so that their signatures are
+        # checked together.
         to_request = [parent]
+        window: List[HashedBlock] = []
         while len(to_request) > 0:
             parent = to_request.pop(0)
             successors = self.request_successors(parent.mining_hash(), peer)
 
             if successors is None:
                 self.l.debug("Peer is not responding", peer)
-                return
+                break
 
             for succ in successors: # ( ͡° ͜ʖ ͡°)
                 self.l.info("New block:", succ)
                 to_request.append(succ)
-                self.chain.add_block(succ)
+                window.append(succ)
+
+            if len(window) >= SYNC_WINDOW_SIZE:
+                self.chain.add_blocks(window)
+                window = []
+
+        self.chain.add_blocks(window)
+
+    def sync_headers_first(self, peer: Peer, body_peers: List[Peer]) -> None:
+        """
+        Downloads and checks peer's header chain, then downloads the blocks
+        in windows spread over body_peers and adds them in order.
+        """
+        headers = self.request_header_chain(peer)
+        if headers is None or len(headers.headers) == 0:
+            return
+
+        self.l.info("Got {} headers from peer {}, up to {}".format(
+            len(headers.headers), peer, headers.height()))
+        self.chain.add_header_chain(headers.headers)
+
+        # Pruned peers can only serve the blocks above what they pruned.
+        first_block_num = headers.headers[0].block_num()
+        body_peers = list(filter(
+            lambda p: self._has_blocks_from(p, first_block_num),
+            dict.fromkeys(filter(lambda p: p != self.self_peer, body_peers))))
+        body_peers = body_peers[:MAX_BODY_PEERS]
+        if len(body_peers) == 0:
+            self.l.warn("No peer has the blocks from {} on".format(first_block_num))
+            return
+
+        windows = [headers.headers[i:i + SYNC_WINDOW_SIZE]
+                   for i in range(0, len(headers.headers), SYNC_WINDOW_SIZE)]
+
+        try:
+            self._fetch_and_add_windows(peer, windows, body_peers)
+        finally:
+            if self.chain.assume_valid is not None:
+                saved = self.chain.validation_stats().assume_valid
+                self.l.info(
+                    "Assume valid has skipped {} signatures in {} blocks, "
+                    "about {:.1f}s of checking".format(
+                        saved.signatures_skipped,
+                        saved.blocks,
+                        saved.seconds_saved))
+
+    def _fetch_and_add_windows(
+            self,
+            peer: Peer,
+            windows: List[List[BlockHeader]],
+            body_peers: List[Peer]) -> None:
+        """
+        Downloads the windows' blocks from body_peers, a few windows ahead,
+        and adds them in order. Stops at the first window that can't be
+        downloaded or has an invalid block.
+        """
+        progress = SyncProgress(sum(map(len, windows)))
+        in_flight = WINDOWS_IN_FLIGHT_PER_PEER * len(body_peers)
+
+        with ThreadPoolExecutor(len(body_peers)) as pool:
+            pending: Deque[Tuple[List[BlockHeader], Any]] = deque()
+            next_window = 0
+            while next_window < len(windows) or len(pending) > 0:
+                while next_window < len(windows) and len(pending) < in_flight:
+                    window = windows[next_window]
+                    body_peer = body_peers[next_window % len(body_peers)]
+                    pending.append((window, pool.submit(
+                        fetch_blocks,
+                        body_peer,
+                        list(map(lambda h: h.mining_hash(), window)))))
+                    next_window += 1
+
+                window, future = pending.popleft()
+                blocks = self._window_blocks(window, future.result(), peer)
+                if blocks is None:
+                    self.l.warn("Couldn't get blocks {} to {}, stopping sync".format(
+                        window[0].block_num(), window[-1].block_num()))
+                    for _, f in pending:
+                        f.cancel()
+                    return
+
+                try:
+                    self.chain.add_blocks(blocks)
+                except InvalidBlockError as e:
+                    self.l.warn("Peer's chain has an invalid block, stopping sync", peer, exc=e)
+                    for _, f in pending:
+                        f.cancel()
+                    return
+
+                progress.advance(len(blocks))
+                self.l.info("Sync progress: {}".format(progress))
+
+    def _has_blocks_from(self, peer: Peer, block_num: int) -> bool:
+        obj = self._peer_get(peer, "/chain", {})
+        if obj is None:
+            return False
+        return obj.get("pruned_height", 0) < block_num
+
+    def request_header_chain(self, peer: Peer) -> Optional[HeaderChain]:
+        """
+        Peer's main chain headers past the last block we share with it,
+        checked as they arrive. None if the peer doesn't respond or sends
+        a header that doesn't check out.
+        """
+        self.chain.headers.refresh()
+        locator = self.locator()
+        headers: Optional[HeaderChain] = None
+        while True:
+            batch = self.request_headers(locator, peer)
+            if batch is None:
+                return None
+
+            if headers is None:
+                if len(batch) == 0:
+                    return None
+                parent = batch[0].parent_mining_hash()
+                fork_point = None
+                if parent is not None:
+                    fork_point = self.chain.headers.get(parent)
+                if fork_point is None:
+                    self.l.warn("Peer's headers don't connect to our chain", peer)
+                    return None
+                headers = HeaderChain(self.chain.headers, fork_point, self.l)
+
+            for header in batch:
+                if not headers.extend(header):
+                    self.l.warn("Invalid header from peer", peer, header)
+                    return None
+
+            if len(batch) < HEADERS_PER_REQUEST:
+                return headers
+
+            self.l.info("Got headers up to {} from peer {}".format(
+                headers.height(), peer))
+            locator = [headers.tip_hash()]
+
+    def locator(self) -> List[Hash]:
+        """
+        Main chain hashes, newest first: the last few blocks, then ever
+        sparser back to genesis.
+        """
+        hashes: List[Hash] = []
+        block_num = self.chain.headers.height()
+        step = 1
+        while block_num > 0:
+            hashes.append(self.chain.headers.main_chain_hash(block_num))
+            if len(hashes) >= LOCATOR_DENSE_LENGTH:
+                step *= 2
+            block_num -= step
+        hashes.append(self.chain.headers.main_chain_hash(0))
+        return hashes
+
+    def _window_blocks(
+            self,
+            window: List[BlockHeader],
+            blocks: Optional[List[HashedBlock]],
+            fallback_peer: Peer) -> Optional[List[HashedBlock]]:
+        """
+        The window's blocks if they match its headers, asking fallback_peer
+        again if they don't.
+        """
+        hashes = list(map(lambda h: h.mining_hash(), window))
+        if blocks is None or list(map(lambda b: b.mining_hash(), blocks)) != hashes:
+            self.l.debug("Window's blocks don't match headers, retrying", fallback_peer)
+            blocks = self.request_blocks(hashes, fallback_peer)
+
+        if blocks is None or list(map(lambda b: b.mining_hash(), blocks)) != hashes:
+            return None
+        return blocks
+
+    def request_headers(self, locator: List[Hash], peer: Peer) -> Optional[List[BlockHeader]]:
+        payload = {
+            "locator": ",".join(map(lambda h: h.hex(), locator)),
+            "count": HEADERS_PER_REQUEST,
+        }
+        obj = self._peer_get(peer, "/headers", payload)
+
+        if obj is None or "headers" not in obj:
+            self.l.debug("No headers from peer", peer)
+            return None
+
+        try:
+            return list(map(BlockHeader.from_dict, obj["headers"]))
+        except (KeyError, ValueError) as e:
+            self.l.debug("Invalid header from peer {}".format(peer), exc=e)
+            return None
+
+    def request_blocks(self, block_hashes: List[Hash], peer: Peer) -> Optional[List[HashedBlock]]:
+        blocks = fetch_blocks(peer, block_hashes)
+        if blocks is None:
+            self.l.debug("No blocks from peer", peer)
+        return blocks
 
     def request_block(self, block_hash: Hash, peer: Peer) -> Optional[HashedBlock]:
-        obj = self._peer_get(peer, "/block", {"hex_hash": block_hash.hex()})
+        obj = self._peer_get(peer, "/blocks", {"hex_hash": block_hash.hex()})
         if obj is None:
             self.l.debug("No HTTP response from peer {}".format(peer))
             return None
@@ -145,7 +419,7 @@ class ChainClient(object):
             self.l.debug("Can't get head block from peer", peer)
             return None
 
-        obj = self._peer_get(peer, "/block", {"hex_hash": head_hash.hex()})
+        obj = self._peer_get(peer, "/blocks", {"hex_hash": head_hash.hex()})
 
         try:
             h = HashedBlock.from_dict(obj)
@@ -0,0 +1,85 @@
+from core.block_header import BlockHeader
+from core.dblog import DBLogger
+from core.difficulty import TUNING_SEGMENT_LENGTH, next_difficulty
+from core.header_index import HeaderEntry, HeaderIndex
+from core.serializable import Hash
+from core.timestamp import Timestamp
+from typing import Dict, List
+
+class HeaderChain(object):
+    """
+    A peer's chain of headers past a block we already have, checked as it
+    is extended: each header follows the one before it, has the difficulty
+    the schedule gives it, and its hash meets that difficulty.
+    """
+
+    def __init__(
+            self,
+            index: HeaderIndex,
+            fork_point: HeaderEntry,
+            l: DBLogger) -> None:
+
+        self.l = l
+        self.fork_point = fork_point
+        self.headers: List[BlockHeader] = []
+
+        self._tip_hash = fork_point.mining_hash
+        self._tip_num = fork_point.block_num
+        self._next_difficulty = fork_point.next_difficulty
+
+        # Mining times by block number, back far enough for a whole tuning
+        # segment to end past the fork point.
+        self._times: Dict[int, int] = {}
+        cur = fork_point
+        for _ in range(TUNING_SEGMENT_LENGTH):
+            if cur.parent_hash is None:
+                break
+            self._times[cur.block_num] = cur.unix_millis
+            cur = index.get(Hash(cur.parent_hash))
+
+    def tip_hash(self) -> Hash:
+        return Hash(self._tip_hash)
+
+    def height(self) -> int:
+        return self._tip_num
+
+    def extend(self, header: BlockHeader) -> bool:
+        """Appends the header if it's valid, returns whether it was."""
+        parent = header.parent_mining_hash()
+        if parent is None or parent.raw_sha256 != self._tip_hash:
+            self.l.debug("Header doesn't follow the tip", header)
+            return False
+
+        if header.block_num() != self._tip_num + 1:
+            self.l.debug("Header has the wrong block number", header)
+            return False
+
+        if header.difficulty() != self._next_difficulty:
+            self.l.debug("Header has the wrong difficulty", header)
+            return False
+
+        if not header.digest_matches_header():
+            self.l.debug("Header doesn't match its mining digest", header)
+            return False
+
+        if not header.hash_meets_difficulty():
+            self.l.debug("Header's hash doesn't meet its difficulty", header)
+            return False
+
+        block_num = header.block_num()
+        self.headers.append(header)
+        self._tip_hash = header.mining_hash().raw_sha256
+        self._tip_num = block_num
+        self._times[block_num] = header.mining_timestamp.unix_millis
+        self._times.pop(block_num - TUNING_SEGMENT_LENGTH, None)
+        self._next_difficulty = next_difficulty(
+            block_num,
+            header.difficulty(),
+            lambda: self._segment_times(block_num),
+            self.l)
+        return True
+
+    def _segment_times(self, last: int) -> List[Timestamp]:
+        start = max(1, last + 1 - TUNING_SEGMENT_LENGTH)
+        return list(map(
+            lambda n: Timestamp(self._times[n]), range(start, last + 1)))
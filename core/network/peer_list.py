@@ -2,8 +2,8 @@ from core.config import Config
 from core.dblog import DBLogger
 from core.network import util
 from core.peer import Peer
+from core.storage import sqlite_db
 import random
-import sqlite3
 import time
 import requests
 from typing import List
@@ -42,7 +42,7 @@ MARK_PEER_INACTIVE_SQL = "UPDATE peers SET active=0 WHERE peer_id=:peer_id"
 class PeerList(object):
     def __init__(self, cfg: Config) -> None:
         self.l = DBLogger(self, cfg)
-        self._conn = sqlite3.connect(cfg.peer_db_path())
+        self._conn = sqlite_db.connect(cfg.peer_db_path())
 
         self._conn.execute(CREATE_TABLE_SQL)
         self._conn.commit()
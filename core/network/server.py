@@ -1,7 +1,10 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 from core.block import HashedBlock
 from core.chain import BlockChain
+from core.codec import BLOCK_LIST_CONTENT_TYPE, pack_list
 from core.config import Config
 from core.dblog import DBLogger
+from core.head_notifier import HeadNotifier
 from core.network import util
 from core.network.peer_list import Peer, PeerList
 from core.serializable import Hash
@@ -10,19 +13,30 @@ from core.storage.sqlite_transaction import SqliteTransactionStorage
 from core.storage.sqlite_uxto import SqliteUXTOStorage
 from core.transaction.signed_transaction import SignedTransaction
 import json
-from tornado import web
-from typing import List
+from tornado import ioloop, web
+from typing import List, Optional
+
+MAX_HEADERS_PER_REQUEST = 512
+MAX_BLOCKS_PER_REQUEST = 128
+MAINTENANCE_INTERVAL_MS = 1000
+PRUNE_BATCH_SIZE = 64 # blocks pruned per maintenance step
+RECLAIM_PAGES = 256 # freed pages handed back per maintenance step
+REENCODE_BATCH_SIZE = 256
 
 class DefaultRequestHandler(web.RequestHandler):
     def get(self) -> None:
         d = {
             "available_rpcs": [
                 {"route": "/blocks",
-                 "params": ["hex_hash", "parent_hex_hash", "block_num"],
+                 "params": ["hex_hash", "hex_hashes", "parent_hex_hash", "block_num", "encoding"],
                  "methods": ["get", "post"]},
+                {"route": "/headers",
+                 "params": ["locator", "count"],
+                 "methods": ["get"]},
                 {"route": "/outstanding_transactions", "methods": ["get", "post"]},
                 {"route": "/peers", "methods": ["get", "post"]},
                 {"route": "/chain", "methods": ["get"]},
+                {"route": "/validation_stats", "methods": ["get"]},
             ]
         }
         self.write(d)
@@ -38,11 +52,16 @@ class BlockRequestHandler(web.RequestHandler):
 
     def get(self) -> None:
         requested_hash = self.get_query_argument("hex_hash", None)
+        requested_hashes = self.get_query_argument("hex_hashes", None)
         requested_block_num = self.get_query_argument("block_num", None)
         parent_hash = self.get_query_argument("parent_hex_hash", None)
 
         if requested_hash is not None:
             self.get_by_hash(Hash.fromhex(requested_hash))
+        elif requested_hashes is not None:
+            self.get_by_hashes(
+                list(map(Hash.fromhex, requested_hashes.split(","))),
+                self.get_query_argument("encoding", "json") == "binary")
         elif requested_block_num is not None:
             self.get_by_block_num(int(requested_block_num))
         elif parent_hash is not None:
@@ -77,10 +96,45 @@ class BlockRequestHandler(web.RequestHandler):
         if block:
             self.set_status(200)
             self.write(block.serializable())
+        elif self.chain.storage.has_hash(mining_hash):
+            self.set_status(404)
+            self.write(util.error_response("block body was pruned"))
         else:
             self.set_status(404)
             self.write(util.error_response("no block with given hash"))
 
+    def get_by_hashes(self, mining_hashes: List[Hash], binary: bool) -> None:
+        if len(mining_hashes) > MAX_BLOCKS_PER_REQUEST:
+            self.set_status(400)
+            self.write(util.error_response(
+                "at most {} hashes".format(MAX_BLOCKS_PER_REQUEST)))
+            return
+
+        if binary:
+            # Blocks go out as stored, without being decoded. The client
+            # decodes stored JSON just as well.
+            encoded = []
+            for mining_hash in mining_hashes:
+                e = self.chain.storage.get_encoded_by_hash(mining_hash)
+                if e is None:
+                    break
+                encoded.append(e)
+
+            self.set_status(200)
+            self.set_header("Content-Type", BLOCK_LIST_CONTENT_TYPE)
+            self.write(pack_list(encoded))
+            return
+
+        ser_blocks = []
+        for mining_hash in mining_hashes:
+            block = self.chain.storage.get_by_hash(mining_hash)
+            if block is None:
+                break
+            ser_blocks.append(block.serializable())
+
+        self.set_status(200)
+        self.write({"blocks": ser_blocks})
+
     def get_by_block_num(self, block_num: int) -> None:
         blocks = self.chain.storage.get_by_block_num(block_num)
         ser_blocks = list(map(lambda b: b.serializable(), blocks))
@@ -111,9 +165,8 @@ class TransactionRequestHandler(web.RequestHandler):
         ser = self.request.body.decode('utf-8')
         txn = SignedTransaction.deserialize(ser)
 
-        if self.chain.transaction_is_valid(txn):
+        if len(self.chain.add_outstanding_transactions([txn])) == 0:
             self.l.info("New transaction", txn)
-            self.chain.add_outstanding_transaction(txn)
             self.set_status(200)
             self.write(util.generic_ok_response())
         else:
@@ -165,12 +218,62 @@ class ChainRequestHandler(web.RequestHandler):
         resp = {
             "height": h.block_num(),
             "head_hash": h.mining_hash().serializable(),
+            "pruned": self.chain.is_pruned(),
+            "pruned_height": self.chain.storage.get_pruned_height(),
         }
         self.set_status(200)
         self.write(resp)
 
+class HeaderRequestHandler(web.RequestHandler):
+    """
+    Main chain headers following the first block of the locator that's in
+    our main chain, or following genesis if none of them are.
+    """
+
+    def initialize(self, chain: BlockChain, cfg: Config):
+        self.l = DBLogger(self, cfg)
+        self.chain = chain
+
+    def get(self) -> None:
+        locator = self.get_query_argument("locator", "")
+        count = min(
+            int(self.get_query_argument("count", MAX_HEADERS_PER_REQUEST)),
+            MAX_HEADERS_PER_REQUEST)
+
+        self.chain.headers.refresh()
+        start = 1
+        for hex_hash in filter(None, locator.split(",")):
+            entry = self.chain.headers.get(Hash.fromhex(hex_hash))
+            if entry is not None and entry.in_main_chain:
+                start = entry.block_num + 1
+                break
+
+        stop = min(start + count, self.chain.headers.height() + 1)
+        headers = []
+        for block_num in range(start, stop):
+            mining_hash = self.chain.headers.main_chain_hash(block_num)
+            header = self.chain.storage.get_header(mining_hash)
+            if header is None:
+                break
+            headers.append(header.serializable())
+
+        self.set_status(200)
+        self.write({"headers": headers})
+
+class ValidationStatsRequestHandler(web.RequestHandler):
+    def initialize(self, chain: BlockChain, cfg: Config):
+        self.l = DBLogger(self, cfg)
+        self.chain = chain
+
+    def get(self) -> None:
+        self.set_status(200)
+        self.write(self.chain.validation_stats().serializable())
+
 class ChainServer(object):
-    def __init__(self, cfg: Config) -> None:
+    def __init__(
+            self,
+            cfg: Config,
+            head_notifier: Optional[HeadNotifier] = None) -> None:
         self.l = DBLogger(self, cfg)
         self.peer_list = PeerList(cfg)
 
@@ -181,13 +284,24 @@ class ChainServer(object):
                 self.storage,
                 self.transaction_storage,
                 self.uxto_storage,
-                cfg)
+                cfg,
+                head_notifier)
 
         self.peer_info = Peer(
                 cfg.server_peer_id(),
                 cfg.server_advertize_addr(),
                 cfg.server_listen_port())
         self.advertize_self = cfg.advertize_self()
+        self.cfg = cfg
+
+        # Maintenance writes to the chain database, which can mean waiting
+        # on the sync client's write lock, so it runs on its own thread with
+        # its own connections rather than on the IO loop.
+        self._maintenance = ThreadPoolExecutor(1)
+        self._maintenance_step: Optional[Future] = None
+        self._maintenance_storage: Optional[SqliteBlockChainStorage] = None
+        self._maintenance_log: Optional[DBLogger] = None
+        self._reencoded = False
 
         self.app = web.Application([
             web.url(r"/", DefaultRequestHandler),
@@ -207,6 +321,14 @@ class ChainServer(object):
                 r"/chain",
                 ChainRequestHandler,
                 {"cfg": cfg, "chain": self.chain}),
+            web.url(
+                r"/headers",
+                HeaderRequestHandler,
+                {"cfg": cfg, "chain": self.chain}),
+            web.url(
+                r"/validation_stats",
+                ValidationStatsRequestHandler,
+                {"cfg": cfg, "chain": self.chain}),
         ])
 
     def listen(self) -> None:
@@ -217,3 +339,48 @@ class ChainServer(object):
             self.l.info("Not advertizing self as peer")
 
         self.app.listen(self.peer_info.port, address="0.0.0.0")
+
+        if self.chain.is_pruned():
+            self.l.info("Pruning block bodies more than {} blocks deep".format(
+                self.chain.prune_depth))
+        ioloop.PeriodicCallback(self.maintain, MAINTENANCE_INTERVAL_MS).start()
+
+    def maintain(self) -> None:
+        """
+        Starts a step of background upkeep on the maintenance thread, called
+        from the IO loop. Each step only does a little, and one isn't
+        started while the last is still running.
+        """
+        if self._maintenance_step is not None and not self._maintenance_step.done():
+            return
+
+        prune_height = self.chain.prune_height() if self.chain.is_pruned() else 0
+        self._maintenance_step = self._maintenance.submit(
+            self._maintain_storage, prune_height)
+        ioloop.IOLoop.current().add_future(
+            self._maintenance_step, self._maintenance_done)
+
+    def _maintain_storage(self, prune_height: int) -> None:
+        """One step of upkeep. Runs on the maintenance thread."""
+        if self._maintenance_storage is None:
+            self._maintenance_storage = SqliteBlockChainStorage(self.cfg)
+            self._maintenance_log = DBLogger(self, self.cfg)
+        storage = self._maintenance_storage
+        l = self._maintenance_log
+
+        if prune_height > 0:
+            pruned = storage.prune(prune_height, PRUNE_BATCH_SIZE)
+            if pruned > 0:
+                l.debug("Pruned {} block bodies".format(pruned))
+            storage.reclaim_space(RECLAIM_PAGES)
+
+        if not self._reencoded:
+            n = storage.reencode_blocks(REENCODE_BATCH_SIZE)
+            self._reencoded = n == 0
+            if self._reencoded:
+                l.info("All blocks are stored in the binary codec")
+
+    def _maintenance_done(self, step: Future) -> None:
+        e = step.exception()
+        if e is not None:
+            self.l.error("Maintenance step failed", exc=e)
@@ -5,6 +5,8 @@ from typing import Any, Dict
 Ser = Dict[str, Any] # would like to have Dict[str, Union['Ser', str]] here
 
 class Serializable(object):
+    __slots__ = ()
+
     def serializable(self) -> Ser:
         raise NotImplementedError("Implement this, dummy")
 
@@ -27,9 +29,52 @@ class Serializable(object):
         m.update(ser)
         return Hash(m.digest())
 
-class Hash(Serializable):
+class Immutable(Serializable):
+    """
+    A Serializable that can't be changed once it's built, so its canonical
+    JSON and hash are worked out the first time they're asked for and kept.
+    Subclasses call freeze() at the end of __init__, and keep anything else
+    they work out from themselves with memo().
+
+    Small value types that there are a lot of declare __slots__ so they
+    don't each carry a __dict__.
+    """
+
+    __slots__ = ("_frozen", "_serialized", "_sha256")
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if getattr(self, "_frozen", False):
+            raise AttributeError("{} is immutable".format(type(self).__name__), name)
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("{} is immutable".format(type(self).__name__), name)
+
+    def freeze(self) -> None:
+        object.__setattr__(self, "_serialized", None)
+        object.__setattr__(self, "_sha256", None)
+        object.__setattr__(self, "_frozen", True)
+
+    def memo(self, name: str, value: Any) -> Any:
+        object.__setattr__(self, name, value)
+        return value
+
+    def serialize(self) -> bytes:
+        if self._serialized is None:
+            return self.memo("_serialized", super().serialize())
+        return self._serialized
+
+    def sha256(self) -> 'Hash':
+        if self._sha256 is None:
+            return self.memo("_sha256", super().sha256())
+        return self._sha256
+
+class Hash(Immutable):
+    __slots__ = ("raw_sha256",)
+
     def __init__(self, raw_sha256: bytes) -> None:
         self.raw_sha256 = raw_sha256
+        self.freeze()
 
     @staticmethod
     def fromhex(hash_hex: str) -> 'Hash':
@@ -47,6 +92,9 @@ class Hash(Serializable):
         else:
             return False
 
+    def __hash__(self) -> int:
+        return hash(self.raw_sha256)
+
     def serializable(self) -> Ser:
         return {
             "sha256_hex": self.hex(),
@@ -1,9 +1,12 @@
-from core.serializable import Serializable, Ser
+from core.serializable import Immutable, Ser
 from typing import Dict
 
-class Signature(Serializable):
+class Signature(Immutable):
+    __slots__ = ("ed25519_signature",)
+
     def __init__(self, edd25519_signature: bytes) -> None:
         self.ed25519_signature = edd25519_signature
+        self.freeze()
 
     def serializable(self) -> Ser:
         return {
@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from core.config import Config
+from core.dblog import DBLogger
+from core.key_pair import Address, KeyPair
+from core.signature import Signature
+from core.transaction.signed_transaction import SignedTransaction
+import multiprocessing
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Below this many signatures the round trip to the pool costs more than
+# checking them here.
+PARALLEL_MIN_BATCH = 64
+
+# Verified (transaction hash, signature, public key) tuples to remember.
+SIGNATURE_CACHE_SIZE = 65536
+
+# (raw ed25519 public key, signed message, raw signature)
+SignatureCheck = Tuple[bytes, bytes, bytes]
+
+CacheKey = Tuple[bytes, bytes, bytes]
+
+# Signatures timed to estimate what a check costs before any were checked.
+CALIBRATION_SIGNATURES = 32
+
+def cache_key(txn: SignedTransaction) -> CacheKey:
+    return (
+        txn.txn_hash().raw_sha256,
+        txn.signature.ed25519_signature,
+        bytes.fromhex(txn.transaction.claimer.hex()))
+
+def signature_check(txn: SignedTransaction) -> SignatureCheck:
+    return (
+        bytes.fromhex(txn.transaction.claimer.hex()),
+        txn.transaction.serialize(),
+        txn.signature.ed25519_signature)
+
+def check_signatures(checks: List[SignatureCheck]) -> List[bool]:
+    """Runs in the pool's processes, so it only deals in bytes."""
+    return list(map(
+        lambda c: Address.from_hex(c[0]).signature_is_valid(
+            c[1], Signature(c[2])),
+        checks))
+
+class SignatureVerifier(object):
+    """
+    Checks transaction signatures in batches. A batch is serialized here,
+    split into one chunk per process and checked across a process pool,
+    which is started the first time a batch is big enough to need it.
+
+    Signatures that checked out are remembered in an LRU cache, so a
+    transaction seen in the pool and then in a block is only checked once.
+    Failures aren't cached.
+
+    Only a verifier made with use_pool starts processes, sized by
+    verify_procs. A node has one, in the process that syncs blocks, so that
+    the server and miner don't each start a pool as big as the machine;
+    the others check their smaller batches here.
+    """
+
+    def __init__(
+            self,
+            cfg: Config,
+            cache_size: int = SIGNATURE_CACHE_SIZE,
+            use_pool: bool = False) -> None:
+
+        self.l = DBLogger(self, cfg)
+        if not use_pool:
+            self.n_procs = 1
+        elif cfg.verify_procs() == 0:
+            self.n_procs = multiprocessing.cpu_count()
+        else:
+            self.n_procs = cfg.verify_procs()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._verified: Dict[CacheKey, None] = OrderedDict()
+
+        self.signatures_checked = 0
+        self.check_seconds = 0.0
+
+    def verify(self, txns: List[SignedTransaction]) -> List[bool]:
+        """Whether each transaction's signature is valid, in order."""
+        results: List[bool] = []
+        unchecked: List[int] = []
+        keys = list(map(cache_key, txns))
+        for i, key in enumerate(keys):
+            if key in self._verified:
+                self._verified.move_to_end(key)
+                results.append(True)
+            else:
+                unchecked.append(i)
+                results.append(False)
+
+        self.cache_hits += len(txns) - len(unchecked)
+        self.cache_misses += len(unchecked)
+        if len(unchecked) == 0:
+            return results
+
+        checked = self._check(list(map(lambda i: txns[i], unchecked)))
+        for i, is_valid in zip(unchecked, checked):
+            results[i] = is_valid
+            if is_valid:
+                self._remember(keys[i])
+
+        return results
+
+    def _remember(self, key: CacheKey) -> None:
+        self._verified[key] = None
+        if len(self._verified) > self.cache_size:
+            self._verified.popitem(last=False)
+
+    def seconds_per_signature(self) -> float:
+        """
+        Average wall clock time a signature took to check, pool included.
+        Times a few signatures of its own if none were checked yet.
+        """
+        if self.signatures_checked == 0:
+            kp = KeyPair.new()
+            message = b"calibration"
+            check = (
+                bytes.fromhex(kp.address().hex()),
+                message,
+                kp.sign(message).ed25519_signature)
+            start = time.perf_counter()
+            check_signatures([check] * CALIBRATION_SIGNATURES)
+            return (time.perf_counter() - start) / CALIBRATION_SIGNATURES
+
+        return self.check_seconds / self.signatures_checked
+
+    def _check(self, txns: List[SignedTransaction]) -> List[bool]:
+        start = time.perf_counter()
+        results = self._check_batch(list(map(signature_check, txns)))
+        self.check_seconds += time.perf_counter() - start
+        self.signatures_checked += len(txns)
+        return results
+
+    def _check_batch(self, checks: List[SignatureCheck]) -> List[bool]:
+        if self.n_procs < 2 or len(checks) < PARALLEL_MIN_BATCH:
+            return check_signatures(checks)
+
+        if self._pool is None:
+            self.l.debug("Starting {} verification processes".format(
+                self.n_procs))
+            self._pool = ProcessPoolExecutor(self.n_procs)
+
+        chunk_size = -(-len(checks) // self.n_procs)
+        chunks = [checks[i:i + chunk_size]
+                  for i in range(0, len(checks), chunk_size)]
+
+        results: List[bool] = []
+        for chunk_results in self._pool.map(check_signatures, chunks):
+            results.extend(chunk_results)
+        return results
+
+    def verify_one(self, txn: SignedTransaction) -> bool:
+        return self.verify([txn])[0]
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
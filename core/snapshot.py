@@ -0,0 +1,212 @@
+from core.amount import Amount
+from core.block import HashedBlock
+from core.block_header import BlockHeader
+from core.chain import BlockChain, REWARD_AMOUNT
+from core.key_pair import Address
+from core.network.header_chain import HeaderChain
+from core.serializable import Hash, Serializable, Ser
+from core.storage.uxto_storage import UXTO
+import hashlib
+from typing import Dict, List, Tuple
+import zlib
+
+# A snapshot file is the magic, then the sha256 of the compressed payload,
+# then the zlib compressed JSON payload.
+SNAPSHOT_MAGIC = b"RADSNAP1"
+CHECKSUM_LENGTH = 32
+
+class InvalidSnapshotError(Exception):
+    pass
+
+def uxto_set_hash(outputs: List[UXTO]) -> Hash:
+    """
+    Commits to a set of unclaimed outputs regardless of the order they
+    came in, so any node can work it out from its own outputs.
+    """
+    m = hashlib.sha256()
+    for u in sorted(outputs, key=lambda u: (u.txn_hash.raw_sha256, u.output_id)):
+        m.update(u.txn_hash.raw_sha256)
+        m.update(u.output_id.to_bytes(4, "big"))
+        m.update(u.amount.nanos.to_bytes(8, "big"))
+        m.update(bytes.fromhex(u.claimer_address.hex()))
+        m.update(u.block_hash.raw_sha256)
+    return Hash(m.digest())
+
+def output_to_list(u: UXTO) -> List[object]:
+    return [
+        u.txn_hash.hex(),
+        u.output_id,
+        u.amount.nanos,
+        u.claimer_address.hex(),
+        u.block_hash.hex(),
+    ]
+
+def output_from_list(obj: List[object]) -> UXTO:
+    return UXTO(
+        Hash.fromhex(obj[0]),
+        Address.from_hex(bytes.fromhex(obj[3])),
+        obj[1],
+        Amount(obj[2]),
+        Hash.fromhex(obj[4]))
+
+class UXTOSnapshot(Serializable):
+    """
+    The unclaimed outputs as of a main chain block, with the headers from
+    genesis up to it and the block itself, which becomes the head of the
+    node that loads it.
+    """
+
+    def __init__(
+            self,
+            headers: List[BlockHeader],
+            tip: HashedBlock,
+            outputs: List[UXTO]) -> None:
+
+        self.headers = headers
+        self.tip = tip
+        self.outputs = outputs
+
+    def __str__(self) -> str:
+        return "UXTOSnapshot<num={},hash={},outputs={}>".format(
+            self.tip.block_num(), self.tip.mining_hash(), len(self.outputs))
+
+    def uxto_hash(self) -> Hash:
+        return uxto_set_hash(self.outputs)
+
+    def serializable(self) -> Ser:
+        return {
+            "headers": list(map(lambda h: h.serializable(), self.headers)),
+            "tip": self.tip.serializable(),
+            "outputs": list(map(output_to_list, self.outputs)),
+            "uxto_hash": self.uxto_hash().serializable(),
+        }
+
+    @staticmethod
+    def from_dict(obj: Ser) -> 'UXTOSnapshot':
+        snapshot = UXTOSnapshot(
+            list(map(BlockHeader.from_dict, obj["headers"])),
+            HashedBlock.from_dict(obj["tip"]),
+            list(map(output_from_list, obj["outputs"])))
+
+        if snapshot.uxto_hash() != Hash.from_dict(obj["uxto_hash"]):
+            raise InvalidSnapshotError("Outputs don't match the snapshot's hash")
+        return snapshot
+
+    def write(self, path: str) -> None:
+        payload = zlib.compress(self.serialize())
+        with open(path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(hashlib.sha256(payload).digest())
+            f.write(payload)
+
+    @staticmethod
+    def read(path: str) -> 'UXTOSnapshot':
+        with open(path, "rb") as f:
+            data = f.read()
+
+        if not data.startswith(SNAPSHOT_MAGIC):
+            raise InvalidSnapshotError("Not a snapshot file")
+
+        checksum = data[len(SNAPSHOT_MAGIC):len(SNAPSHOT_MAGIC) + CHECKSUM_LENGTH]
+        payload = data[len(SNAPSHOT_MAGIC) + CHECKSUM_LENGTH:]
+        if hashlib.sha256(payload).digest() != checksum:
+            raise InvalidSnapshotError("Snapshot checksum mismatch")
+
+        try:
+            return UXTOSnapshot.deserialize(zlib.decompress(payload))
+        except (KeyError, ValueError, TypeError, zlib.error) as e:
+            raise InvalidSnapshotError("Snapshot doesn't parse") from e
+
+def unclaimed_outputs_at(chain: BlockChain, block_hash: Hash) -> List[UXTO]:
+    """
+    The unclaimed outputs as of a main chain block, found by undoing the
+    blocks above it on top of the current outputs.
+    """
+    chain.headers.refresh()
+    entry = chain.headers.get(block_hash)
+    if entry is None or not entry.in_main_chain:
+        raise ValueError("Block isn't in the main chain", block_hash)
+
+    outputs: Dict[Tuple[bytes, int], UXTO] = {}
+    for u in chain.uxto_storage.all_unclaimed_outputs():
+        outputs[(u.txn_hash.raw_sha256, u.output_id)] = u
+
+    for block_num in range(chain.headers.height(), entry.block_num, -1):
+        undo = chain.storage.get_undo(chain.headers.main_chain_hash(block_num))
+        if undo is None:
+            raise ValueError("No undo record for block", block_num)
+
+        for u in undo.created:
+            outputs.pop((u.txn_hash.raw_sha256, u.output_id), None)
+
+        for txn_hash, output_id in undo.claimed:
+            u = chain.uxto_storage.get_output(txn_hash, output_id)
+            u.claimed = False
+            outputs[(txn_hash.raw_sha256, output_id)] = u
+
+    return list(outputs.values())
+
+def take_snapshot(chain: BlockChain, block_num: int) -> UXTOSnapshot:
+    """Snapshot of the main chain as of block_num."""
+    chain.headers.refresh()
+    if not 0 < block_num <= chain.headers.height():
+        raise ValueError("No main chain block", block_num)
+
+    hashes = list(map(chain.headers.main_chain_hash, range(1, block_num + 1)))
+    tip = chain.storage.get_by_hash(hashes[-1])
+    if tip is None:
+        raise ValueError("Block {} was pruned".format(block_num))
+
+    return UXTOSnapshot(
+        list(map(chain.storage.get_header, hashes)),
+        tip,
+        unclaimed_outputs_at(chain, tip.mining_hash()))
+
+def snapshot_matches_chain(chain: BlockChain, snapshot: UXTOSnapshot) -> bool:
+    """Whether the chain has the snapshot's block and the same outputs at it."""
+    tip_hash = snapshot.tip.mining_hash()
+    if not chain.headers.is_in_main_chain(tip_hash):
+        chain.headers.refresh()
+        if not chain.headers.is_in_main_chain(tip_hash):
+            return False
+
+    return uxto_set_hash(unclaimed_outputs_at(chain, tip_hash)) == snapshot.uxto_hash()
+
+def load_snapshot(chain: BlockChain, snapshot: UXTOSnapshot) -> None:
+    """
+    Checks a snapshot and stores it in a chain that has nothing but
+    genesis. The header chain has to link up from genesis with the right
+    difficulties and proof of work, the tip has to be its last block, and
+    the outputs have to belong to its blocks and add up to their rewards.
+    Raises InvalidSnapshotError if any of that doesn't hold.
+    """
+    if len(snapshot.headers) == 0:
+        raise InvalidSnapshotError("Snapshot has no headers")
+
+    genesis = chain.headers.get(HashedBlock.genesis().mining_hash())
+    header_chain = HeaderChain(chain.headers, genesis, chain.l)
+    for header in snapshot.headers:
+        if not header_chain.extend(header):
+            raise InvalidSnapshotError("Invalid header", header.block_num())
+
+    if snapshot.tip.mining_hash() != header_chain.tip_hash():
+        raise InvalidSnapshotError("Tip isn't the last header's block")
+
+    if not (snapshot.tip.block.transactions_are_canonical() and
+            snapshot.tip.block.transactions_match_commitment()):
+        raise InvalidSnapshotError("Tip's transactions don't match its hash")
+
+    block_hashes = set(map(lambda h: h.mining_hash().raw_sha256, snapshot.headers))
+    total = Amount(0)
+    for u in snapshot.outputs:
+        if u.block_hash.raw_sha256 not in block_hashes:
+            raise InvalidSnapshotError("Output from a block outside the snapshot")
+        total += u.amount
+
+    # Every block has one reward and transactions don't create any value.
+    if total.nanos != REWARD_AMOUNT.nanos * len(snapshot.headers):
+        raise InvalidSnapshotError("Outputs don't add up to the rewards")
+
+    chain.l.info("Loading snapshot", snapshot)
+    chain.storage.import_snapshot(snapshot.headers, snapshot.tip, snapshot.outputs)
+    chain.headers.refresh()
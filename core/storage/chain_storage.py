@@ -1,5 +1,11 @@
 from core.block import HashedBlock
+from core.block_header import BlockHeader
+from core.block_undo import BlockUndo
+from core.header_index import HeaderEntry
 from core.serializable import Hash
+from core.storage.unit_of_work import UnitOfWork
+from core.storage.uxto_storage import UXTO
+from core.validation_stats import ValidationStats
 from typing import List, Optional
 
 class BlockChainStorage(object):
@@ -7,6 +13,17 @@ class BlockChainStorage(object):
         pass
 
     def add_block(self, block: HashedBlock) -> None:
+        """
+        Stores a block. It only becomes the head if there was none yet,
+        otherwise the head only moves through a unit of work.
+        """
+        raise NotImplementedError()
+
+    def unit_of_work(self) -> UnitOfWork:
+        """A unit of work that commits to this storage."""
+        raise NotImplementedError()
+
+    def get_undo(self, block_hash: Hash) -> Optional[BlockUndo]:
         raise NotImplementedError()
 
     def mark_transmitted(self, mining_hash: Hash) -> None:
@@ -15,12 +32,23 @@ class BlockChainStorage(object):
     def get_by_hash(self, block_hash: Hash) -> HashedBlock:
         raise NotImplementedError()
 
+    def get_encoded_by_hash(self, block_hash: Hash) -> Optional[bytes]:
+        """The block as stored, for core.codec.decode_block."""
+        raise NotImplementedError()
+
+    def get_header(self, block_hash: Hash) -> Optional[BlockHeader]:
+        """The block's header, whether or not its body was pruned."""
+        raise NotImplementedError()
+
     def get_height(self) -> int:
         raise NotImplementedError()
 
     def get_head(self) -> HashedBlock:
         raise NotImplementedError()
 
+    def get_head_hash(self) -> Hash:
+        raise NotImplementedError()
+
     def has_hash(self, block_hash: Hash) -> bool:
         raise NotImplementedError()
 
@@ -39,5 +67,53 @@ class BlockChainStorage(object):
     def get_all_non_genesis_in_order(self) -> List[HashedBlock]:
         raise NotImplementedError()
 
+    def get_headers_since(self, row_id: int) -> List[HeaderEntry]:
+        raise NotImplementedError()
+
     def abandon_block(self, block_hash: Hash) -> None:
         raise NotImplementedError()
+
+    def import_snapshot(
+            self,
+            headers: List[BlockHeader],
+            tip: HashedBlock,
+            outputs: List[UXTO]) -> None:
+        """
+        Stores a snapshot's header chain, its tip block as the head and its
+        unclaimed outputs, all at once. Only storage that has nothing but
+        genesis can take a snapshot. Blocks below the tip are stored as
+        if they were pruned.
+        """
+        raise NotImplementedError()
+
+    def prune(self, below_block_num: int, limit: int) -> int:
+        """
+        Drops the bodies and undo records of up to limit blocks numbered
+        below below_block_num, oldest first, keeping their headers. Returns
+        how many were pruned.
+        """
+        raise NotImplementedError()
+
+    def get_pruned_height(self) -> int:
+        """Highest block number whose body was pruned, 0 if none were."""
+        raise NotImplementedError()
+
+    def reclaim_space(self, max_pages: int) -> None:
+        """Returns up to max_pages freed pages to the file system."""
+        raise NotImplementedError()
+
+    def add_validation_stats(self, stats: ValidationStats) -> None:
+        """Adds stats to the stored totals."""
+        raise NotImplementedError()
+
+    def get_validation_stats(self) -> ValidationStats:
+        """The totals of every process that validated blocks into this storage."""
+        raise NotImplementedError()
+
+    def reencode_blocks(self, limit: int) -> int:
+        """
+        Rewrites up to limit blocks that are still stored as JSON in the
+        storage codec. Returns how many were looked at, 0 once there are
+        none left.
+        """
+        raise NotImplementedError()
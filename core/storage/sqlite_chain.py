@@ -1,9 +1,18 @@
 from core.block import HashedBlock
+from core.block_header import BlockHeader
+from core.block_undo import BlockUndo
+from core.codec import CodecError, decode_block, encode_block, stored_block
 from core.storage.chain_storage import BlockChainStorage
+from core.storage import sqlite_db, sqlite_transaction, sqlite_uxto
+from core.storage.unit_of_work import HeadMovedError, UnitOfWork
+from core.storage.uxto_storage import UXTO
 from core.config import Config
 from core.dblog import DBLogger
+from core.header_index import HeaderEntry
 from core.serializable import Hash
-from typing import List, Optional
+from core.validation_stats import VALIDATION_STAGES, ValidationStats
+from itertools import chain
+from typing import Any, Dict, List, Optional, Tuple, Union
 import sqlite3
 
 CREATE_TABLE_SQL = """
@@ -28,6 +37,160 @@ CREATE INDEX IF NOT EXISTS block_num_index ON blocks(block_num)"""
 CREATE_HEAD_INDEX_SQL = """
 CREATE INDEX IF NOT EXISTS head_index ON blocks(is_head)"""
 
+# Just enough of every block to index the chain without reading bodies.
+# Rows are only ever appended, and a block's row comes after its parent's.
+CREATE_HEADERS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS headers (
+    hash BLOB UNIQUE,
+    parent_hash BLOB,
+    block_num INTEGER,
+    difficulty INTEGER,
+    unix_millis INTEGER
+)"""
+
+ADD_HEADER_SQL = """
+INSERT INTO headers VALUES (
+    :hash, :parent_hash, :block_num, :difficulty, :unix_millis
+)"""
+
+COUNT_HEADERS_SQL = "SELECT COUNT(*) FROM headers"
+
+GET_HEADERS_SINCE_SQL = """
+SELECT rowid, hash, parent_hash, block_num, difficulty, unix_millis
+FROM headers
+WHERE rowid > ?
+ORDER BY rowid ASC"""
+
+GET_ALL_IN_INSERTION_ORDER_SQL = "SELECT serialized FROM blocks ORDER BY rowid"
+
+# One row per block connected to the main chain, removed on disconnect.
+CREATE_UNDO_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS undo (
+    hash BLOB UNIQUE,
+    serialized BLOB
+)"""
+
+ADD_UNDO_SQL = "INSERT INTO undo VALUES (:hash, :serialized)"
+GET_UNDO_SQL = "SELECT serialized FROM undo WHERE hash = ?"
+REMOVE_UNDO_SQL = "DELETE FROM undo WHERE hash = ?"
+
+# The header of every stored block in the form peers sync headers in, so
+# serving headers never decodes a body. Written with the block.
+CREATE_BLOCK_HEADERS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS block_headers (
+    hash BLOB UNIQUE,
+    serialized BLOB
+)"""
+
+ADD_BLOCK_HEADER_SQL = """
+INSERT OR IGNORE INTO block_headers VALUES (:hash, :serialized)"""
+
+GET_BLOCK_HEADER_SQL = "SELECT serialized FROM block_headers WHERE hash = ?"
+
+GET_BODIES_WITHOUT_HEADER_SQL = """
+SELECT blocks.serialized
+FROM blocks
+LEFT JOIN block_headers ON blocks.hash = block_headers.hash
+WHERE block_headers.hash IS NULL
+AND blocks.serialized IS NOT NULL"""
+
+# Blocks whose bodies were pruned keep their row in blocks, with a NULL
+# body, and their header here in the form peers sync headers in.
+CREATE_PRUNED_HEADERS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS pruned_headers (
+    hash BLOB UNIQUE,
+    block_num INTEGER,
+    serialized BLOB
+)"""
+
+CREATE_PRUNED_BLOCK_NUM_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS pruned_block_num_index ON pruned_headers(block_num)"""
+
+ADD_PRUNED_HEADER_SQL = """
+INSERT OR IGNORE INTO pruned_headers VALUES (:hash, :block_num, :serialized)"""
+
+GET_PRUNED_HEADER_SQL = "SELECT serialized FROM pruned_headers WHERE hash = ?"
+GET_PRUNED_HEIGHT_SQL = "SELECT MAX(block_num) FROM pruned_headers"
+
+GET_PRUNABLE_SQL = """
+SELECT hash
+FROM blocks
+WHERE block_num >= :lower
+AND block_num < :upper
+AND block_num > 0
+AND serialized IS NOT NULL
+ORDER BY block_num ASC
+LIMIT :limit"""
+
+PRUNE_BODY_SQL = "UPDATE blocks SET serialized = NULL WHERE hash = ?"
+
+# A pruned block's header moves from block_headers, where it was stored
+# with the body, to pruned_headers.
+MOVE_TO_PRUNED_HEADERS_SQL = """
+INSERT OR IGNORE INTO pruned_headers
+SELECT blocks.hash, blocks.block_num, block_headers.serialized
+FROM blocks
+JOIN block_headers ON blocks.hash = block_headers.hash
+WHERE blocks.hash = ?"""
+
+REMOVE_BLOCK_HEADER_SQL = "DELETE FROM block_headers WHERE hash = ?"
+
+# Running totals of core.validation_stats, one row per stage. The sync
+# client and the server each validate blocks, so their counts are added
+# up here for the server to report.
+CREATE_VALIDATION_STATS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS validation_stats (
+    stage TEXT UNIQUE,
+    checked INTEGER,
+    rejected INTEGER,
+    seconds REAL
+)"""
+
+ADD_VALIDATION_STAGE_SQL = """
+INSERT OR IGNORE INTO validation_stats VALUES (?, 0, 0, 0.0)"""
+
+ADD_VALIDATION_STATS_SQL = """
+UPDATE validation_stats
+SET checked = checked + :checked,
+    rejected = rejected + :rejected,
+    seconds = seconds + :seconds
+WHERE stage = :stage"""
+
+GET_VALIDATION_STATS_SQL = """
+SELECT stage, checked, rejected, seconds FROM validation_stats"""
+
+# The one row of assume valid totals, from whichever process synced.
+CREATE_ASSUME_VALID_STATS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS assume_valid_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    blocks INTEGER,
+    signatures_skipped INTEGER,
+    seconds_saved REAL
+)"""
+
+ADD_ASSUME_VALID_ROW_SQL = """
+INSERT OR IGNORE INTO assume_valid_stats VALUES (0, 0, 0, 0.0)"""
+
+ADD_ASSUME_VALID_STATS_SQL = """
+UPDATE assume_valid_stats
+SET blocks = blocks + :blocks,
+    signatures_skipped = signatures_skipped + :signatures_skipped,
+    seconds_saved = seconds_saved + :seconds_saved"""
+
+GET_ASSUME_VALID_STATS_SQL = """
+SELECT blocks, signatures_skipped, seconds_saved FROM assume_valid_stats"""
+
+# Bodies still stored as JSON, from before the binary codec.
+GET_JSON_BODIES_SQL = """
+SELECT rowid, serialized
+FROM blocks
+WHERE rowid > :after
+AND substr(serialized, 1, 1) = X'7B'
+ORDER BY rowid ASC
+LIMIT :limit"""
+
+SET_BODY_SQL = "UPDATE blocks SET serialized = :serialized WHERE rowid = :rowid"
+
 ADD_BLOCK_SQL = """
 INSERT INTO blocks VALUES (
     :hash, :parent_hash, :block_num, :is_head, 0, :serialized
@@ -42,6 +205,7 @@ SELECT serialized
 FROM blocks
 WHERE parent_hash = ?
 AND abandoned = 0
+AND serialized IS NOT NULL
 """
 
 GET_BY_NUM_SQL = """
@@ -49,6 +213,7 @@ SELECT serialized
 FROM blocks
 WHERE block_num = ?
 AND abandoned = 0
+AND serialized IS NOT NULL
 """
 
 GET_RANGE_SQL = """
@@ -57,6 +222,7 @@ FROM blocks
 WHERE block_num >= :lower
 AND block_num < :upper
 AND abandoned = 0
+AND serialized IS NOT NULL
 """
 
 GET_ALL_NON_GENESIS_IN_ORDER_SQL = """
@@ -64,18 +230,242 @@ SELECT serialized
 FROM blocks
 WHERE block_num > 0
 AND abandoned = 0
+AND serialized IS NOT NULL
 ORDER BY block_num ASC"""
 
 GET_HEIGHT_SQL = "SELECT MAX(block_num) FROM blocks"
 GET_HEAD_SQL = "SELECT serialized FROM blocks WHERE is_head=1"
+GET_HEAD_HASH_SQL = "SELECT hash FROM blocks WHERE is_head=1"
 
 CLEAR_HEAD_SQL = "UPDATE blocks SET is_head=0 WHERE is_head=1"
+SET_HEAD_SQL = "UPDATE blocks SET is_head=1 WHERE hash = ?"
+
+# With split_storage the outputs and the pool are in their own files,
+# attached to the chain's connection under these names. Each has its own
+# writer, so pool and block writes don't wait on each other, and a commit
+# that touches several of them takes all their locks.
+UXTO_SCHEMA = "uxto"
+MEMPOOL_SCHEMA = "mempool"
+SPLIT_SCHEMAS = [UXTO_SCHEMA, MEMPOOL_SCHEMA]
+
+# The tables that move to each schema when storage is split.
+SPLIT_TABLES = [(UXTO_SCHEMA, "outpoints"), (MEMPOOL_SCHEMA, "transactions")]
+
+# Each split file records the head it was last brought up to. A commit
+# over several WAL files is atomic in each file but not across them, so
+# after a crash one of them can be behind the chain, and this says where
+# to replay it from.
+CREATE_HEAD_MARKER_SQL = """
+CREATE TABLE IF NOT EXISTS {}.head_marker (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    hash BLOB
+)"""
+
+SET_HEAD_MARKER_SQL = "INSERT OR REPLACE INTO {}.head_marker VALUES (0, ?)"
+GET_HEAD_MARKER_SQL = "SELECT hash FROM {}.head_marker"
+
+GET_UNSPLIT_TABLES_SQL = """
+SELECT name FROM main.sqlite_master
+WHERE type = 'table'
+AND name IN ('outpoints', 'transactions')"""
+
+GET_HEADER_LINK_SQL = "SELECT parent_hash, block_num FROM headers WHERE hash = ?"
+
+def block_args(block: HashedBlock, is_head: bool) -> Dict[str, Any]:
+    if block.parent_mining_hash() is None:
+        parent_hash = None
+    else:
+        parent_hash = block.parent_mining_hash().raw_sha256
+
+    return {
+        "hash": block.mining_hash().raw_sha256,
+        "parent_hash": parent_hash,
+        "block_num": block.block_num(),
+        "is_head": is_head,
+        "serialized": stored_block(block),
+    }
+
+def block_header_args(block: HashedBlock) -> Dict[str, Any]:
+    return {
+        "hash": block.mining_hash().raw_sha256,
+        "serialized": BlockHeader.from_block(block).serialize(),
+    }
+
+def header_args(block: Union[HashedBlock, BlockHeader]) -> Dict[str, Any]:
+    if block.parent_mining_hash() is None:
+        parent_hash = None
+    else:
+        parent_hash = block.parent_mining_hash().raw_sha256
+
+    return {
+        "hash": block.mining_hash().raw_sha256,
+        "parent_hash": parent_hash,
+        "block_num": block.block_num(),
+        "difficulty": block.block.block_config.difficulty,
+        "unix_millis": block.mining_timestamp.unix_millis,
+    }
+
+def set_head_markers(c: sqlite3.Cursor, head_hash: bytes) -> None:
+    for schema in SPLIT_SCHEMAS:
+        c.execute(SET_HEAD_MARKER_SQL.format(schema), (head_hash,))
+
+def attach_split_files(cfg: Config, conn: sqlite3.Connection) -> None:
+    """
+    Attaches the outputs and pool files to conn, creating their tables.
+    The files are set up through their own connections first so that they
+    are in WAL mode before anything writes to them.
+    """
+    uxto_conn = sqlite_db.connect(cfg.uxto_db_path())
+    with uxto_conn:
+        sqlite_uxto.create_tables(uxto_conn)
+
+    mempool_conn = sqlite_db.connect(cfg.mempool_db_path())
+    with mempool_conn:
+        sqlite_transaction.create_tables(mempool_conn)
+
+    sqlite_db.attach(conn, cfg.uxto_db_path(), UXTO_SCHEMA)
+    sqlite_db.attach(conn, cfg.mempool_db_path(), MEMPOOL_SCHEMA)
+    with conn:
+        for schema in SPLIT_SCHEMAS:
+            conn.execute(CREATE_HEAD_MARKER_SQL.format(schema))
+
+def migrate_to_split_storage(cfg: Config) -> None:
+    """
+    Moves the outputs and the pool out of the chain database into their
+    own files, for a config with split_storage set. The rows are copied and
+    committed before they're dropped from the chain database, so if this
+    is interrupted it can just be run again.
+    """
+    if not cfg.split_storage():
+        raise ValueError("Set split_storage in the config before migrating")
+
+    conn = sqlite_db.connect(cfg.chain_db_path())
+    unsplit = set(map(lambda r: r[0], conn.execute(GET_UNSPLIT_TABLES_SQL)))
+    if len(unsplit) == 0:
+        raise ValueError("Chain database has already been split")
+
+    # A table that's gone from the chain database was copied and committed
+    # by an earlier run.
+    tables = list(filter(lambda t: t[1] in unsplit, SPLIT_TABLES))
+
+    attach_split_files(cfg, conn)
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        for schema, table in tables:
+            c.execute("DELETE FROM {}.{}".format(schema, table))
+            c.execute("INSERT INTO {0}.{1} SELECT * FROM main.{1}".format(
+                schema, table))
+
+        c.execute(GET_HEAD_HASH_SQL)
+        head = c.fetchone()
+        if head is not None:
+            set_head_markers(c, head[0])
+    except:
+        conn.rollback()
+        raise
+
+    conn.commit()
+
+    # DROP TABLE doesn't open a transaction by itself, so both drops are
+    # put in one to leave either both tables or neither.
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        for schema, table in tables:
+            c.execute("DROP TABLE main.{}".format(table))
+    except:
+        conn.rollback()
+        raise
+
+    conn.commit()
+
+class SqliteUnitOfWork(UnitOfWork):
+    """
+    Commits over the chain storage's connection, which can reach the block,
+    outpoint and transaction tables since they share a database file, or
+    with split storage since the other files are attached to it. Each table
+    gets one executemany per kind of change.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, split: bool) -> None:
+        super().__init__()
+        self._conn = conn
+        self._split = split
+
+    def commit(self) -> None:
+        c = self._conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            if self.old_head is not None:
+                c.execute(GET_HEAD_HASH_SQL)
+                if c.fetchone()[0] != self.old_head.raw_sha256:
+                    raise HeadMovedError(
+                        "Head is no longer {}".format(self.old_head.hex()))
+
+            c.executemany(
+                ADD_BLOCK_SQL, map(lambda b: block_args(b, False), self.blocks))
+            c.executemany(ADD_HEADER_SQL, map(header_args, self.blocks))
+            c.executemany(
+                ADD_BLOCK_HEADER_SQL, map(block_header_args, self.blocks))
+
+            disconnected_outputs = chain.from_iterable(
+                map(lambda u: u.created, self.disconnected))
+            c.executemany(sqlite_uxto.REMOVE_OUTPUT_SQL, map(
+                lambda u: sqlite_uxto.outpoint_args(u.txn_hash, u.output_id),
+                disconnected_outputs))
+
+            disconnected_claims = chain.from_iterable(
+                map(lambda u: u.claimed, self.disconnected))
+            c.executemany(sqlite_uxto.MARK_UNCLAIMED_SQL, map(
+                lambda o: sqlite_uxto.outpoint_args(o[0], o[1]),
+                disconnected_claims))
+
+            connected_outputs = chain.from_iterable(
+                map(lambda u: u.created, self.connected))
+            c.executemany(
+                sqlite_uxto.ADD_OUTPUT_SQL,
+                map(sqlite_uxto.output_args, connected_outputs))
+
+            connected_claims = chain.from_iterable(
+                map(lambda u: u.claimed, self.connected))
+            c.executemany(sqlite_uxto.MARK_CLAIMED_SQL, map(
+                lambda o: sqlite_uxto.outpoint_args(o[0], o[1]),
+                connected_claims))
+
+            c.executemany(REMOVE_UNDO_SQL, map(
+                lambda u: (u.block_hash.raw_sha256,), self.disconnected))
+            c.executemany(ADD_UNDO_SQL, map(lambda u: {
+                "hash": u.block_hash.raw_sha256,
+                "serialized": u.serialize(),
+            }, self.connected))
+
+            c.executemany(
+                sqlite_transaction.REMOVE_TRANSACTION_SQL,
+                map(lambda h: {"txn_hash": h.raw_sha256},
+                    self.removed_transactions))
+            c.executemany(
+                sqlite_transaction.ADD_TRANSACTION_IF_NEW_SQL,
+                map(sqlite_transaction.transaction_args,
+                    self.added_transactions))
+
+            if self.new_head is not None:
+                c.execute(CLEAR_HEAD_SQL)
+                c.execute(SET_HEAD_SQL, (self.new_head.raw_sha256,))
+                if self._split:
+                    set_head_markers(c, self.new_head.raw_sha256)
+        except:
+            self._conn.rollback()
+            raise
+
+        self._conn.commit()
 
 class SqliteBlockChainStorage(BlockChainStorage):
     def __init__(self, cfg: Config) -> None:
         super().__init__()
         self.l = DBLogger(self, cfg)
-        self._conn = sqlite3.connect(cfg.chain_db_path())
+        self._conn = sqlite_db.connect(cfg.chain_db_path())
+        self._split = cfg.split_storage()
+
         with self._conn:
             cursor = self._conn.cursor()
             cursor.execute(CREATE_TABLE_SQL)
@@ -83,36 +473,56 @@ class SqliteBlockChainStorage(BlockChainStorage):
             cursor.execute(CREATE_PARENT_HASH_INDEX_SQL)
             cursor.execute(CREATE_BLOCK_NUM_INDEX_SQL)
             cursor.execute(CREATE_HEAD_INDEX_SQL)
+            cursor.execute(CREATE_HEADERS_TABLE_SQL)
+            cursor.execute(CREATE_UNDO_TABLE_SQL)
+            cursor.execute(CREATE_PRUNED_HEADERS_TABLE_SQL)
+            cursor.execute(CREATE_PRUNED_BLOCK_NUM_INDEX_SQL)
+            cursor.execute(CREATE_BLOCK_HEADERS_TABLE_SQL)
+            cursor.execute(CREATE_VALIDATION_STATS_TABLE_SQL)
+            cursor.executemany(
+                ADD_VALIDATION_STAGE_SQL, map(lambda s: (s,), VALIDATION_STAGES))
+            cursor.execute(CREATE_ASSUME_VALID_STATS_TABLE_SQL)
+            cursor.execute(ADD_ASSUME_VALID_ROW_SQL)
+            if not self._split:
+                sqlite_uxto.create_tables(self._conn)
+                sqlite_transaction.create_tables(self._conn)
+
+        self._backfill_headers()
+        self._backfill_block_headers()
+        self._reencoded_rowid = 0
+
+        if self._split:
+            if len(self._conn.execute(GET_UNSPLIT_TABLES_SQL).fetchall()) > 0:
+                raise Exception(
+                    "Outputs and pool are still in the chain database, "
+                    "run with --migrate_storage first")
+            attach_split_files(cfg, self._conn)
+            self._catch_up_split_files()
 
     def add_block(self, block: HashedBlock) -> None:
         c = self._conn.cursor()
 
         c.execute(GET_HEIGHT_SQL)
-        height = c.fetchone()[0]
+        is_head = c.fetchone()[0] is None
 
-        if height is None:
-            height = -1
+        c.execute(ADD_BLOCK_SQL, block_args(block, is_head))
+        c.execute(ADD_HEADER_SQL, header_args(block))
+        c.execute(ADD_BLOCK_HEADER_SQL, block_header_args(block))
+        if is_head and self._split:
+            set_head_markers(c, block.mining_hash().raw_sha256)
+        self._conn.commit()
 
-        if block.block_num() > height:
-            is_head = True
-            c.execute(CLEAR_HEAD_SQL)
-        else:
-            is_head = False
+    def unit_of_work(self) -> SqliteUnitOfWork:
+        return SqliteUnitOfWork(self._conn, self._split)
 
-        if block.parent_mining_hash() is None:
-            parent_hash = None
+    def get_undo(self, block_hash: Hash) -> Optional[BlockUndo]:
+        c = self._conn.cursor()
+        c.execute(GET_UNDO_SQL, (block_hash.raw_sha256,))
+        res = c.fetchone()
+        if res:
+            return BlockUndo.deserialize(res[0])
         else:
-            parent_hash = block.parent_mining_hash().raw_sha256
-
-        args = {
-            "hash": block.mining_hash().raw_sha256,
-            "parent_hash": parent_hash,
-            "block_num": block.block_num(),
-            "is_head": is_head,
-            "serialized": block.serialize(),
-        }
-        c.execute(ADD_BLOCK_SQL, args)
-        self._conn.commit()
+            return None
 
     def abandon_block(self, block_hash: Hash) -> None:
         args = {
@@ -135,7 +545,19 @@ class SqliteBlockChainStorage(BlockChainStorage):
         elif len(res) > 1:
             raise Exception("Multiple heads")
         else:
-            return HashedBlock.deserialize(res[0][0])
+            return decode_block(res[0][0])
+
+    def get_head_hash(self) -> Hash:
+        c = self._conn.cursor()
+        c.execute(GET_HEAD_HASH_SQL)
+        res = c.fetchall()
+
+        if len(res) == 0:
+            raise Exception("No head")
+        elif len(res) > 1:
+            raise Exception("Multiple heads")
+        else:
+            return Hash(res[0][0])
 
     def get_height(self) -> int:
         c = self._conn.cursor()
@@ -144,11 +566,34 @@ class SqliteBlockChainStorage(BlockChainStorage):
         return res[0]
 
     def get_by_hash(self, block_hash: Hash) -> Optional[HashedBlock]:
+        c = self._conn.cursor()
+        c.execute(GET_BY_HASH_SQL, (block_hash.raw_sha256,))
+        res = c.fetchone()
+        if res and res[0] is not None:
+            return decode_block(res[0])
+        else:
+            return None
+
+    def get_encoded_by_hash(self, block_hash: Hash) -> Optional[bytes]:
         c = self._conn.cursor()
         c.execute(GET_BY_HASH_SQL, (block_hash.raw_sha256,))
         res = c.fetchone()
         if res:
-            return HashedBlock.deserialize(res[0])
+            return res[0]
+        else:
+            return None
+
+    def get_header(self, block_hash: Hash) -> Optional[BlockHeader]:
+        c = self._conn.cursor()
+        c.execute(GET_BLOCK_HEADER_SQL, (block_hash.raw_sha256,))
+        res = c.fetchone()
+        if res:
+            return BlockHeader.deserialize(res[0])
+
+        c.execute(GET_PRUNED_HEADER_SQL, (block_hash.raw_sha256,))
+        res = c.fetchone()
+        if res:
+            return BlockHeader.deserialize(res[0])
         else:
             return None
 
@@ -169,12 +614,12 @@ class SqliteBlockChainStorage(BlockChainStorage):
     def get_by_parent_hash(self, parent_hash: Hash) -> List[HashedBlock]:
         c = self._conn.cursor()
         c.execute(GET_BY_PARENT_HASH_SQL, (parent_hash.raw_sha256,))
-        return list(map(lambda r: HashedBlock.deserialize(r[0]), c))
+        return list(map(lambda r: decode_block(r[0]), c))
 
     def get_by_block_num(self, block_num: int) -> List[HashedBlock]:
         c = self._conn.cursor()
         c.execute(GET_BY_NUM_SQL, (block_num,))
-        return list(map(lambda r: HashedBlock.deserialize(r[0]), c))
+        return list(map(lambda r: decode_block(r[0]), c))
 
     def get_range(self, lower: int, upper: int) -> List[HashedBlock]:
         args = {
@@ -183,9 +628,273 @@ class SqliteBlockChainStorage(BlockChainStorage):
         }
         c = self._conn.cursor()
         c.execute(GET_RANGE_SQL, args)
-        return list(map(lambda r: HashedBlock.deserialize(r[0]), c))
+        return list(map(lambda r: decode_block(r[0]), c))
 
     def get_all_non_genesis_in_order(self) -> List[HashedBlock]:
         c = self._conn.cursor()
         c.execute(GET_ALL_NON_GENESIS_IN_ORDER_SQL)
-        return list(map(lambda r: HashedBlock.deserialize(r[0]), c))
+        return list(map(lambda r: decode_block(r[0]), c))
+
+    def import_snapshot(
+            self,
+            headers: List[BlockHeader],
+            tip: HashedBlock,
+            outputs: List[UXTO]) -> None:
+        c = self._conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute(GET_HEIGHT_SQL)
+            if c.fetchone()[0] != 0:
+                raise ValueError("Can only import a snapshot into a new chain")
+
+            c.executemany(ADD_HEADER_SQL, map(header_args, headers))
+            c.executemany(ADD_PRUNED_HEADER_SQL, map(lambda h: {
+                "hash": h.mining_hash().raw_sha256,
+                "block_num": h.block_num(),
+                "serialized": h.serialize(),
+            }, headers[:-1]))
+            c.execute(CLEAR_HEAD_SQL)
+            c.execute(ADD_BLOCK_SQL, block_args(tip, True))
+            c.execute(ADD_BLOCK_HEADER_SQL, block_header_args(tip))
+            c.executemany(
+                sqlite_uxto.ADD_OUTPUT_SQL, map(sqlite_uxto.output_args, outputs))
+            if self._split:
+                set_head_markers(c, tip.mining_hash().raw_sha256)
+        except:
+            self._conn.rollback()
+            raise
+
+        self._conn.commit()
+
+    def prune(self, below_block_num: int, limit: int) -> int:
+        c = self._conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            args = {
+                "lower": self._get_pruned_height(c),
+                "upper": below_block_num,
+                "limit": limit,
+            }
+            c.execute(GET_PRUNABLE_SQL, args)
+            hashes = c.fetchall()
+
+            c.executemany(MOVE_TO_PRUNED_HEADERS_SQL, hashes)
+            c.executemany(REMOVE_BLOCK_HEADER_SQL, hashes)
+            c.executemany(PRUNE_BODY_SQL, hashes)
+            c.executemany(REMOVE_UNDO_SQL, hashes)
+        except:
+            self._conn.rollback()
+            raise
+
+        self._conn.commit()
+        return len(hashes)
+
+    def add_validation_stats(self, stats: ValidationStats) -> None:
+        with self._conn:
+            self._conn.executemany(ADD_VALIDATION_STATS_SQL, map(lambda s: {
+                "stage": s,
+                "checked": stats.stages[s].checked,
+                "rejected": stats.stages[s].rejected,
+                "seconds": stats.stages[s].seconds,
+            }, VALIDATION_STAGES))
+            self._conn.execute(
+                ADD_ASSUME_VALID_STATS_SQL, stats.assume_valid.serializable())
+
+    def get_validation_stats(self) -> ValidationStats:
+        stats = ValidationStats()
+        for stage, checked, rejected, seconds in self._conn.execute(
+                GET_VALIDATION_STATS_SQL):
+            stage_stats = stats.stages[stage]
+            stage_stats.checked = checked
+            stage_stats.rejected = rejected
+            stage_stats.seconds = seconds
+
+        blocks, signatures_skipped, seconds_saved = self._conn.execute(
+            GET_ASSUME_VALID_STATS_SQL).fetchone()
+        stats.assume_valid.blocks = blocks
+        stats.assume_valid.signatures_skipped = signatures_skipped
+        stats.assume_valid.seconds_saved = seconds_saved
+        return stats
+
+    def reencode_blocks(self, limit: int) -> int:
+        c = self._conn.cursor()
+        args = {"after": self._reencoded_rowid, "limit": limit}
+        c.execute(GET_JSON_BODIES_SQL, args)
+        rows = c.fetchall()
+
+        updates = []
+        for rowid, serialized in rows:
+            self._reencoded_rowid = rowid
+            try:
+                updates.append({
+                    "rowid": rowid,
+                    "serialized": encode_block(decode_block(serialized)),
+                })
+            except CodecError:
+                pass # stays JSON
+
+        with self._conn:
+            self._conn.executemany(SET_BODY_SQL, updates)
+        return len(rows)
+
+    def get_pruned_height(self) -> int:
+        return self._get_pruned_height(self._conn.cursor())
+
+    def _get_pruned_height(self, c: sqlite3.Cursor) -> int:
+        c.execute(GET_PRUNED_HEIGHT_SQL)
+        res = c.fetchone()[0]
+        if res is None:
+            return 0
+        else:
+            return res
+
+    def reclaim_space(self, max_pages: int) -> None:
+        # executescript steps the pragma to completion, execute only frees
+        # the first page.
+        self._conn.executescript(
+            "PRAGMA incremental_vacuum({});".format(int(max_pages)))
+
+    def get_headers_since(self, row_id: int) -> List[HeaderEntry]:
+        c = self._conn.cursor()
+        c.execute(GET_HEADERS_SINCE_SQL, (row_id,))
+        return list(map(lambda r: HeaderEntry(*r), c))
+
+    def _catch_up_split_files(self) -> None:
+        """
+        Replays the blocks between each split file's head marker and the
+        head into it. Commits write the chain's file first, so after a
+        crash the others can only be behind. The pool only loses the
+        transactions of connected blocks; ones a reorg would have returned
+        to it come back from peers.
+        """
+        c = self._conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute(GET_HEAD_HASH_SQL)
+            head = c.fetchone()
+            if head is not None:
+                for schema in SPLIT_SCHEMAS:
+                    c.execute(GET_HEAD_MARKER_SQL.format(schema))
+                    marker = c.fetchone()
+                    marker_hash = None if marker is None else marker[0]
+                    if marker_hash != head[0]:
+                        self._catch_up(c, schema, marker_hash, head[0])
+        except:
+            self._conn.rollback()
+            raise
+
+        self._conn.commit()
+
+    def _catch_up(
+            self,
+            c: sqlite3.Cursor,
+            schema: str,
+            old_head: Optional[bytes],
+            new_head: bytes) -> None:
+        disconnect, connect = self._path_between(c, old_head, new_head)
+        self.l.warn(
+            "Catching {} up to the head: disconnecting {} blocks, "
+            "connecting {}".format(schema, len(disconnect), len(connect)))
+
+        for block_hash in disconnect:
+            undo = BlockUndo.for_block(self._body_to_replay(c, block_hash))
+            if schema == UXTO_SCHEMA:
+                c.executemany(sqlite_uxto.REMOVE_OUTPUT_SQL, map(
+                    lambda u: sqlite_uxto.outpoint_args(u.txn_hash, u.output_id),
+                    undo.created))
+                c.executemany(sqlite_uxto.MARK_UNCLAIMED_SQL, map(
+                    lambda o: sqlite_uxto.outpoint_args(o[0], o[1]),
+                    undo.claimed))
+
+        for block_hash in connect:
+            block = self._body_to_replay(c, block_hash)
+            if schema == UXTO_SCHEMA:
+                undo = BlockUndo.for_block(block)
+                c.executemany(
+                    sqlite_uxto.ADD_OUTPUT_SQL,
+                    map(sqlite_uxto.output_args, undo.created))
+                c.executemany(sqlite_uxto.MARK_CLAIMED_SQL, map(
+                    lambda o: sqlite_uxto.outpoint_args(o[0], o[1]),
+                    undo.claimed))
+            else:
+                c.executemany(
+                    sqlite_transaction.REMOVE_TRANSACTION_SQL,
+                    map(lambda t: {"txn_hash": t.txn_hash().raw_sha256},
+                        block.block.transactions))
+
+        c.execute(SET_HEAD_MARKER_SQL.format(schema), (new_head,))
+
+    def _path_between(
+            self,
+            c: sqlite3.Cursor,
+            old_head: Optional[bytes],
+            new_head: bytes) -> Tuple[List[bytes], List[bytes]]:
+        """
+        Hashes of the blocks to disconnect from old_head, newest first, and
+        to connect up to new_head, oldest first. A None old_head is before
+        the genesis block.
+        """
+        def link(block_hash: bytes) -> Tuple[Optional[bytes], int]:
+            c.execute(GET_HEADER_LINK_SQL, (block_hash,))
+            res = c.fetchone()
+            if res is None:
+                raise Exception("No header for block {}".format(block_hash.hex()))
+            return res[0], res[1]
+
+        old_num = -1 if old_head is None else link(old_head)[1]
+        new_num = link(new_head)[1]
+
+        disconnect: List[bytes] = []
+        connect: List[bytes] = []
+        old: Optional[bytes] = old_head
+        new: Optional[bytes] = new_head
+        while old != new:
+            if old is not None and old_num >= new_num:
+                disconnect.append(old)
+                old = link(old)[0]
+                old_num -= 1
+            else:
+                connect.append(new)
+                new = link(new)[0]
+                new_num -= 1
+
+        connect.reverse()
+        return disconnect, connect
+
+    def _body_to_replay(self, c: sqlite3.Cursor, block_hash: bytes) -> HashedBlock:
+        c.execute(GET_BY_HASH_SQL, (block_hash,))
+        res = c.fetchone()
+        if res is None or res[0] is None:
+            raise Exception("Can't replay block {}, its body is pruned".format(
+                block_hash.hex()))
+        return decode_block(res[0])
+
+    def _backfill_block_headers(self) -> None:
+        """Stores the headers of blocks from before block_headers existed."""
+        c = self._conn.cursor()
+        c.execute(GET_BODIES_WITHOUT_HEADER_SQL)
+        blocks = list(map(lambda r: decode_block(r[0]), c))
+        if len(blocks) == 0:
+            return
+
+        self.l.info("Storing headers of {} stored blocks".format(len(blocks)))
+        with self._conn:
+            self._conn.executemany(
+                ADD_BLOCK_HEADER_SQL, map(block_header_args, blocks))
+
+    def _backfill_headers(self) -> None:
+        """Builds the header table for databases from before it existed."""
+        c = self._conn.cursor()
+        c.execute(COUNT_HEADERS_SQL)
+        if c.fetchone()[0] > 0:
+            return
+
+        c.execute(GET_ALL_IN_INSERTION_ORDER_SQL)
+        blocks = list(map(lambda r: decode_block(r[0]), c))
+        if len(blocks) == 0:
+            return
+
+        self.l.info("Indexing headers of {} stored blocks".format(len(blocks)))
+        with self._conn:
+            self._conn.executemany(
+                ADD_HEADER_SQL, map(header_args, blocks))
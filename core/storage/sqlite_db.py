@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import threading
+from typing import Dict
+
+# How long a connection waits on another process's lock before it gives up
+# with "database is locked".
+BUSY_TIMEOUT_MS = 10000
+
+# Page cache per connection, in KiB.
+CACHE_SIZE_KIB = 32 * 1024
+
+# How much of each database file is read through a memory map.
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+
+# Prepared statements each connection keeps around for reuse.
+CACHED_STATEMENTS = 256
+
+class _Connections(threading.local):
+    """
+    The open connections of this thread, by database path. The pid they
+    were opened in is kept so that a forked process doesn't use its
+    parent's.
+    """
+
+    def __init__(self) -> None:
+        self.pid = os.getpid()
+        self.by_path: Dict[str, sqlite3.Connection] = {}
+
+_connections = _Connections()
+
+def tune(conn: sqlite3.Connection, schema: str = "main") -> None:
+    """Sets the pragmas on one of conn's databases."""
+
+    # Lets pruning hand freed pages back a few at a time. It only takes
+    # effect on a new database, so it has to come before WAL mode is set;
+    # older ones reuse freed pages instead.
+    conn.execute("PRAGMA {}.auto_vacuum = INCREMENTAL".format(schema))
+
+    # Readers don't block the writer and the writer doesn't block readers,
+    # so the server, client and miner processes can share a file.
+    conn.execute("PRAGMA {}.journal_mode = WAL".format(schema))
+
+    # In WAL mode a crash can lose the last commits but not corrupt the file.
+    conn.execute("PRAGMA {}.synchronous = NORMAL".format(schema))
+    conn.execute("PRAGMA {}.cache_size = -{}".format(schema, CACHE_SIZE_KIB))
+    conn.execute("PRAGMA {}.mmap_size = {}".format(schema, MMAP_SIZE_BYTES))
+
+def open_db(path: str) -> sqlite3.Connection:
+    """A new connection to the database at path, with the pragmas set."""
+    conn = sqlite3.connect(path, cached_statements=CACHED_STATEMENTS)
+    tune(conn)
+    conn.execute("PRAGMA busy_timeout = {}".format(BUSY_TIMEOUT_MS))
+    return conn
+
+def attach(conn: sqlite3.Connection, path: str, schema: str) -> None:
+    """
+    Attaches the database at path to conn as schema, unless it already is.
+    Tables only it has can then be named without the schema.
+    """
+    attached = map(lambda r: r[1], conn.execute("PRAGMA database_list"))
+    if schema not in attached:
+        conn.execute("ATTACH DATABASE ? AS {}".format(schema), (path,))
+        tune(conn, schema)
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    The connection to the database at path that this process and thread
+    share, opening it the first time it's asked for. Callers shouldn't
+    close it, and should commit before they return so that they don't leave
+    a transaction open for the next one.
+    """
+    if _connections.pid != os.getpid():
+        _connections.pid = os.getpid()
+        _connections.by_path = {}
+
+    key = os.path.abspath(path)
+    conn = _connections.by_path.get(key)
+    if conn is None:
+        conn = open_db(path)
+        _connections.by_path[key] = conn
+    return conn
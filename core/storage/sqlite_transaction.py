@@ -1,10 +1,12 @@
+from core.codec import decode_transaction, stored_transaction
 from core.config import Config
 from core.dblog import DBLogger
 from core.serializable import Hash
+from core.storage import sqlite_db
 from core.storage.transaction_storage import TransactionStorage
 from core.transaction.signed_transaction import SignedTransaction
 import sqlite3
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 CREATE_TABLE_SQL = """
 CREATE TABLE IF NOT EXISTS transactions (
@@ -21,8 +23,14 @@ ADD_TRANSACTION_SQL = """
 INSERT INTO transactions VALUES (:txn_hash, :serialized)
 """
 
+ADD_TRANSACTION_IF_NEW_SQL = """
+INSERT OR IGNORE INTO transactions VALUES (:txn_hash, :serialized)
+"""
+
 GET_ALL_TRANSACTIONS_SQL = "SELECT serialized FROM transactions"
 
+GET_TRANSACTION_HASHES_SQL = "SELECT txn_hash FROM transactions ORDER BY rowid"
+
 GET_TRANSACTION_SQL = """
 SELECT serialized FROM transactions WHERE txn_hash=:txn_hash
 """
@@ -35,24 +43,26 @@ REMOVE_TRANSACTION_SQL = """
 DELETE FROM transactions WHERE txn_hash=:txn_hash
 """
 
+def transaction_args(txn: SignedTransaction) -> Dict[str, Any]:
+    return {
+        "txn_hash": txn.sha256().raw_sha256,
+        "serialized": stored_transaction(txn),
+    }
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(CREATE_TABLE_SQL)
+    conn.execute(CREATE_TXN_HASH_INDEX_SQL)
+
 class SqliteTransactionStorage(TransactionStorage):
     def __init__(self, cfg: Config) -> None:
         self.l = DBLogger(self, cfg)
-        self._conn = sqlite3.connect(cfg.chain_db_path())
-
-        c = self._conn.cursor()
-        c.execute(CREATE_TABLE_SQL)
-        c.execute(CREATE_TXN_HASH_INDEX_SQL)
+        self._conn = sqlite_db.connect(cfg.mempool_db_path())
+        create_tables(self._conn)
         self._conn.commit()
 
     def add_transaction(self, txn: SignedTransaction) -> None:
-        args = {
-            "txn_hash": txn.sha256().raw_sha256,
-            "serialized": txn.serialize(),
-        }
-
         c = self._conn.cursor()
-        c.execute(ADD_TRANSACTION_SQL, args)
+        c.execute(ADD_TRANSACTION_SQL, transaction_args(txn))
         self._conn.commit()
 
     def remove_transaction(self, txn_hash: Hash) -> None:
@@ -72,7 +82,7 @@ class SqliteTransactionStorage(TransactionStorage):
     def get_all_transactions(self) -> List[SignedTransaction]:
         c = self._conn.cursor()
         c.execute(GET_ALL_TRANSACTIONS_SQL)
-        return list(map(lambda s: SignedTransaction.deserialize(s[0]), c))
+        return list(map(lambda s: decode_transaction(s[0]), c))
 
     def get_transaction(self, txn_hash: Hash) -> Optional[SignedTransaction]:
         args = {"txn_hash": txn_hash.raw_sha256}
@@ -82,4 +92,9 @@ class SqliteTransactionStorage(TransactionStorage):
         if res is None:
             return None
         else:
-            return SignedTransaction.deserialize(res[0])
+            return decode_transaction(res[0])
+
+    def get_transaction_hashes(self) -> List[Hash]:
+        c = self._conn.cursor()
+        c.execute(GET_TRANSACTION_HASHES_SQL)
+        return list(map(lambda r: Hash(r[0]), c))
@@ -1,92 +1,168 @@
+from core.amount import Amount
 from core.config import Config
 from core.key_pair import Address
 from core.serializable import Hash
+from core.storage import sqlite_db
 from core.storage.uxto_storage import UXTOStorage, UXTO
 import sqlite3
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
+# Every output of the main chain, keyed by outpoint (txn hash, output id),
+# so resolving an input never has to read the block it points into.
 CREATE_TABLE_SQL = """
-CREATE TABLE IF NOT EXISTS uxto (
+CREATE TABLE IF NOT EXISTS outpoints (
     txn_hash BLOB,
-    claimer_ed25519_pub_key_hex TEXT,
     output_id INTEGER,
+    amount_nanos INTEGER,
+    claimer_ed25519_pub_key_hex TEXT,
+    block_hash BLOB,
     claimed INTEGER
 )"""
 
 CREATE_INDEX_SQL = """
-CREATE UNIQUE INDEX IF NOT EXISTS output_index
-ON uxto(txn_hash, output_id)
+CREATE UNIQUE INDEX IF NOT EXISTS outpoint_index
+ON outpoints(txn_hash, output_id)
+"""
+
+CREATE_CLAIMER_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS outpoint_claimer_index
+ON outpoints(claimer_ed25519_pub_key_hex)
 """
 
 ADD_OUTPUT_SQL = """
-INSERT INTO uxto VALUES (:txn_hash, :claimer_ed25519_pub_key, :output_id, 0)
+INSERT INTO outpoints VALUES (
+    :txn_hash,
+    :output_id,
+    :amount_nanos,
+    :claimer_ed25519_pub_key_hex,
+    :block_hash,
+    0
+)"""
+
+GET_OUTPUT_SQL = """
+SELECT txn_hash, output_id, amount_nanos, claimer_ed25519_pub_key_hex,
+    block_hash, claimed
+FROM outpoints
+WHERE txn_hash=:txn_hash
+AND output_id=:output_id
 """
 
 OUTPUT_IS_CLAIMED_SQL = """
 SELECT claimed
-FROM uxto
-AND txn_hash=:txn_hash
+FROM outpoints
+WHERE txn_hash=:txn_hash
 AND output_id=:output_id
 """
 
 MARK_CLAIMED_SQL = """
-UPDATE uxto
+UPDATE outpoints
 SET claimed=1
-AND txn_hash=:txn_hash
+WHERE txn_hash=:txn_hash
+AND output_id=:output_id
+"""
+
+MARK_UNCLAIMED_SQL = """
+UPDATE outpoints
+SET claimed=0
+WHERE txn_hash=:txn_hash
+AND output_id=:output_id
+"""
+
+REMOVE_OUTPUT_SQL = """
+DELETE FROM outpoints
+WHERE txn_hash=:txn_hash
 AND output_id=:output_id
 """
 
 GET_UNCLAIMED_OUTPUTS_FOR_CLAIMER = """
-SELECT txn_hash, output_id
-FROM uxto
+SELECT txn_hash, output_id, amount_nanos, claimer_ed25519_pub_key_hex,
+    block_hash, claimed
+FROM outpoints
 WHERE claimer_ed25519_pub_key_hex = :claimer_ed25519_pub_key_hex
 AND claimed = 0
 """
 
+GET_ALL_UNCLAIMED_OUTPUTS_SQL = """
+SELECT txn_hash, output_id, amount_nanos, claimer_ed25519_pub_key_hex,
+    block_hash, claimed
+FROM outpoints
+WHERE claimed = 0
+ORDER BY txn_hash, output_id
+"""
+
+def output_args(uxto: UXTO) -> Dict[str, Any]:
+    return {
+        "txn_hash": uxto.txn_hash.raw_sha256,
+        "output_id": uxto.output_id,
+        "amount_nanos": uxto.amount.nanos,
+        "claimer_ed25519_pub_key_hex": uxto.claimer_address.hex(),
+        "block_hash": uxto.block_hash.raw_sha256,
+    }
+
+def outpoint_args(txn_hash: Hash, output_id: int) -> Dict[str, Any]:
+    return {
+        "txn_hash": txn_hash.raw_sha256,
+        "output_id": output_id,
+    }
+
+def output_from_row(row: Tuple[Any, ...]) -> UXTO:
+    return UXTO(
+        Hash(row[0]),
+        Address.from_hex(bytes.fromhex(row[3])),
+        row[1],
+        Amount(row[2]),
+        Hash(row[4]),
+        row[5] != 0)
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(CREATE_TABLE_SQL)
+    conn.execute(CREATE_INDEX_SQL)
+    conn.execute(CREATE_CLAIMER_INDEX_SQL)
+
 class SqliteUXTOStorage(UXTOStorage):
     def __init__(self, cfg: Config) -> None:
-        self._conn = sqlite3.connect(cfg.chain_db_path())
-
-        self._conn.execute(CREATE_TABLE_SQL)
-        self._conn.execute(CREATE_INDEX_SQL)
+        self._conn = sqlite_db.connect(cfg.uxto_db_path())
+        create_tables(self._conn)
         self._conn.commit()
 
-    def add_output(self, txn_hash: Hash, claimer_address: Address, output_id: int) -> None:
-        args = {
-            "txn_hash": txn_hash.raw_sha256,
-            "claimer_ed25519_pub_key_hex": claimer_address.hex(),
-            "output_id": output_id,
-        }
-        self._conn.execute(ADD_OUTPUT_SQL, args)
+    def add_output(self, uxto: UXTO) -> None:
+        self._conn.execute(ADD_OUTPUT_SQL, output_args(uxto))
         self._conn.commit()
 
+    def get_output(self, txn_hash: Hash, output_id: int) -> Optional[UXTO]:
+        c = self._conn.cursor()
+        c.execute(GET_OUTPUT_SQL, outpoint_args(txn_hash, output_id))
+        res = c.fetchone()
+
+        if res is None:
+            return None
+        else:
+            return output_from_row(res)
+
     def output_is_claimed(self, txn_hash: Hash, output_id: int) -> bool:
-        args = {
-            "txn_hash": txn_hash.raw_sha256,
-            "output_id": output_id,
-        }
         c = self._conn.cursor()
-        c.execute(OUTPUT_IS_CLAIMED_SQL, args)
+        c.execute(OUTPUT_IS_CLAIMED_SQL, outpoint_args(txn_hash, output_id))
         res = c.fetchone()
 
         if res is None:
             raise KeyError("Unmatched output", txn_hash, output_id)
 
-        if res == 0:
+        if res[0] == 0:
             return False
         else:
             return True
 
     def mark_claimed(self, txn_hash: Hash, output_id: int) -> None:
-        args = {
-            "txn_hash": txn_hash.raw_sha256,
-            "output_id": output_id,
-        }
-        self._conn.execute(MARK_CLAIMED_SQL, args)
+        self._conn.execute(MARK_CLAIMED_SQL, outpoint_args(txn_hash, output_id))
         self._conn.commit()
 
     def unclaimed_outputs(self, address: Address) -> List[UXTO]:
         args = {"claimer_ed25519_pub_key_hex": address.hex()}
         c = self._conn.cursor()
         c.execute(GET_UNCLAIMED_OUTPUTS_FOR_CLAIMER, args)
-        return list(map(lambda r: UXTO(r[0], address, r[1]), c))
+        return list(map(output_from_row, c))
+
+    def all_unclaimed_outputs(self) -> List[UXTO]:
+        c = self._conn.cursor()
+        c.execute(GET_ALL_UNCLAIMED_OUTPUTS_SQL)
+        return list(map(output_from_row, c))
@@ -20,3 +20,6 @@ class TransactionStorage(object):
 
     def get_transaction(self, txn_hash: Hash) -> Optional[SignedTransaction]:
         raise NotImplementedError()
+
+    def get_transaction_hashes(self) -> List[Hash]:
+        raise NotImplementedError()
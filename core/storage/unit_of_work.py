@@ -0,0 +1,56 @@
+from core.block import HashedBlock
+from core.block_undo import BlockUndo
+from core.serializable import Hash
+from core.transaction.signed_transaction import SignedTransaction
+from typing import List, Optional
+
+class HeadMovedError(Exception):
+    """The head isn't the one a unit of work was computed against."""
+    pass
+
+class UnitOfWork(object):
+    """
+    Changes to the blocks, the outputs and the transaction pool that are
+    collected here and applied by commit() in a single transaction, so a
+    crash never leaves the outputs out of step with the head. With split
+    storage that transaction spans several files, and the storage catches
+    the others up with the chain's when it's next opened.
+    """
+
+    def __init__(self) -> None:
+        self.blocks: List[HashedBlock] = []
+        self.disconnected: List[BlockUndo] = []
+        self.connected: List[BlockUndo] = []
+        self.old_head: Optional[Hash] = None
+        self.new_head: Optional[Hash] = None
+        self.added_transactions: List[SignedTransaction] = []
+        self.removed_transactions: List[Hash] = []
+
+    def add_block(self, block: HashedBlock) -> None:
+        self.blocks.append(block)
+
+    def disconnect(self, undo: BlockUndo) -> None:
+        """Reverts a main chain block's output changes, head first."""
+        self.disconnected.append(undo)
+
+    def connect(self, undo: BlockUndo) -> None:
+        """Applies a block's output changes, oldest first."""
+        self.connected.append(undo)
+
+    def move_head(self, old_head: Hash, new_head: Hash) -> None:
+        self.old_head = old_head
+        self.new_head = new_head
+
+    def add_transactions(self, txns: List[SignedTransaction]) -> None:
+        """Puts transactions in the pool, skipping ones it already has."""
+        self.added_transactions.extend(txns)
+
+    def remove_transactions(self, txn_hashes: List[Hash]) -> None:
+        self.removed_transactions.extend(txn_hashes)
+
+    def commit(self) -> None:
+        """
+        Applies everything or nothing. Raises HeadMovedError if the head
+        isn't old_head anymore.
+        """
+        raise NotImplementedError()
@@ -1,17 +1,43 @@
+from core.amount import Amount
 from core.key_pair import Address
 from core.serializable import Hash
+from typing import List, Optional
 
 class UXTO(object):
-    def __init__(self, txn_hash: Hash, claimer_address: Address, output_id: int) -> None:
+    """
+    An output of a main chain transaction: who can claim it, how much it's
+    worth, the block it's in and whether it's been claimed.
+    """
+
+    __slots__ = (
+        "txn_hash", "claimer_address", "output_id", "amount", "block_hash",
+        "claimed")
+
+    def __init__(
+            self,
+            txn_hash: Hash,
+            claimer_address: Address,
+            output_id: int,
+            amount: Amount,
+            block_hash: Hash,
+            claimed: bool = False) -> None:
+
         self.txn_hash = txn_hash
         self.claimer_address = claimer_address
         self.output_id = output_id
+        self.amount = amount
+        self.block_hash = block_hash
+        self.claimed = claimed
 
 class UXTOStorage(object):
     def __init__(self):
         pass
 
-    def add_output(self, txn_hash: Hash, claimer_address: Address, output_id: int) -> None:
+    def add_output(self, uxto: UXTO) -> None:
+        raise NotImplementedError()
+
+    def get_output(self, txn_hash: Hash, output_id: int) -> Optional[UXTO]:
+        """The output whether or not it's claimed, None if it's unknown."""
         raise NotImplementedError()
 
     def output_is_claimed(self, txn_hash: Hash, output_id: int) -> bool:
@@ -19,3 +45,7 @@ class UXTOStorage(object):
 
     def mark_claimed(self, txn_hash: Hash, output_id: int) -> None:
         raise NotImplementedError()
+
+    def all_unclaimed_outputs(self) -> List[UXTO]:
+        """Every unclaimed output, ordered by outpoint."""
+        raise NotImplementedError()
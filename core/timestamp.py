@@ -1,10 +1,13 @@
 import arrow
-from core.serializable import Serializable, Ser
+from core.serializable import Immutable, Ser
 import time
 
-class Timestamp(Serializable):
+class Timestamp(Immutable):
+    __slots__ = ("unix_millis",)
+
     def __init__(self, unix_millis: int) -> None:
         self.unix_millis = unix_millis
+        self.freeze()
 
     def __str__(self) -> str:
         return "Timestamp<unix_millis={},fmt={}>".format(
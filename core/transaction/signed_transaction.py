@@ -1,12 +1,13 @@
 from core.key_pair import Address, KeyPair
-from core.serializable import Hash, Serializable, Ser
+from core.serializable import Hash, Immutable, Ser
 from core.signature import Signature
 from core.transaction.transaction import Transaction
 
-class SignedTransaction(Serializable):
+class SignedTransaction(Immutable):
     def __init__(self, transaction: Transaction, signature: Signature) -> None:
         self.transaction = transaction
         self.signature = signature
+        self.freeze()
 
     @staticmethod
     def sign(transaction: Transaction, key_pair: KeyPair) -> "SignedTransaction":
@@ -1,12 +1,12 @@
 from core.amount import Amount
 from core.key_pair import Address
-from core.serializable import Serializable, Ser
+from core.serializable import Immutable, Ser
 from core.timestamp import Timestamp
 from core.transaction.transaction_input import TransactionInput
 from core.transaction.transaction_output import TransactionOutput
 from typing import List, Optional
 
-class Transaction(Serializable):
+class Transaction(Immutable):
     def __init__(
             self,
             inputs: List[TransactionInput],
@@ -18,6 +18,7 @@ class Transaction(Serializable):
         self.outputs = outputs
         self.timestamp = timestamp
         self.claimer = claimer
+        self.freeze()
 
     @staticmethod
     def reward(amount: Amount, claimer: Address) -> 'Transaction':
@@ -1,6 +1,9 @@
-from core.serializable import Hash, Serializable, Ser
+from core.serializable import Hash, Immutable, Ser
+
+class TransactionInput(Immutable):
+    __slots__ = (
+        "output_block_hash", "output_transaction_hash", "output_id")
 
-class TransactionInput(Serializable):
     def __init__(
         self,
         output_block_hash: Hash, 
@@ -10,6 +13,7 @@ class TransactionInput(Serializable):
         self.output_block_hash = output_block_hash
         self.output_transaction_hash = output_transaction_hash
         self.output_id = output_id
+        self.freeze()
 
     def serializable(self) -> Ser:
         return {
@@ -20,4 +24,7 @@ class TransactionInput(Serializable):
 
     @staticmethod
     def from_dict(obj: Ser) -> 'TransactionInput':
-        return TransactionInput(obj["output_block_hash"], obj["output_transaction_hash"], obj["output_id"])
+        return TransactionInput(
+            Hash.from_dict(obj["output_block_hash"]),
+            Hash.from_dict(obj["output_transaction_hash"]),
+            obj["output_id"])
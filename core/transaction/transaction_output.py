@@ -1,12 +1,15 @@
 from core.amount import Amount
 from core.key_pair import Address
-from core.serializable import Serializable, Ser
+from core.serializable import Immutable, Ser
+
+class TransactionOutput(Immutable):
+    __slots__ = ("output_id", "amount", "to_addr")
 
-class TransactionOutput(Serializable):
     def __init__(self, output_id: int, amount: Amount, to_addr: Address) -> None:
         self.output_id = output_id
         self.amount = amount
         self.to_addr = to_addr
+        self.freeze()
 
     def serializable(self) -> Ser:
         return {
@@ -0,0 +1,76 @@
+from core.serializable import Ser
+from typing import Dict
+
+# Block validation stages, cheapest first.
+STAGE_HEADER = "header" # parent known, block number follows it
+STAGE_POW = "pow" # expected difficulty, hash meets it
+STAGE_CONTEXT = "context" # not too far behind the head
+STAGE_TRANSACTIONS = "transactions" # parse, commitment, rewards, signatures
+VALIDATION_STAGES = [STAGE_HEADER, STAGE_POW, STAGE_CONTEXT, STAGE_TRANSACTIONS]
+
+class StageStats(object):
+    def __init__(self) -> None:
+        self.checked = 0
+        self.rejected = 0
+        self.seconds = 0.0
+
+    def serializable(self) -> Ser:
+        return {
+            "checked": self.checked,
+            "rejected": self.rejected,
+            "seconds": self.seconds,
+        }
+
+class AssumeValidStats(object):
+    """
+    Blocks whose signatures weren't checked because they're ancestors of
+    the assume valid block, and the time checking them would have taken.
+    """
+
+    def __init__(self) -> None:
+        self.blocks = 0
+        self.signatures_skipped = 0
+        self.seconds_saved = 0.0
+
+    def serializable(self) -> Ser:
+        return {
+            "blocks": self.blocks,
+            "signatures_skipped": self.signatures_skipped,
+            "seconds_saved": self.seconds_saved,
+        }
+
+class ValidationStats(object):
+    """
+    How many blocks each validation stage saw and rejected, and how long it
+    took. A BlockChain counts into one and adds it to its storage's totals,
+    so that every process's validation shows up in them.
+    """
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, StageStats] = {}
+        for stage in VALIDATION_STAGES:
+            self.stages[stage] = StageStats()
+        self.assume_valid = AssumeValidStats()
+
+    def record(self, stage: str, passed: bool, seconds: float) -> None:
+        stats = self.stages[stage]
+        stats.checked += 1
+        stats.seconds += seconds
+        if not passed:
+            stats.rejected += 1
+
+    def record_assumed_valid(
+            self, n_signatures: int, seconds_per_signature: float) -> None:
+        self.assume_valid.blocks += 1
+        self.assume_valid.signatures_skipped += n_signatures
+        self.assume_valid.seconds_saved += n_signatures * seconds_per_signature
+
+    def is_empty(self) -> bool:
+        return (self.assume_valid.blocks == 0
+            and all(map(lambda s: s.checked == 0, self.stages.values())))
+
+    def serializable(self) -> Ser:
+        obj = dict(map(
+            lambda s: (s, self.stages[s].serializable()), VALIDATION_STAGES))
+        obj["assume_valid"] = self.assume_valid.serializable()
+        return obj
@@ -3,6 +3,7 @@ from core.config import Config
 from core.dblog import DBLogger
 from core.key_pair import Address, KeyPair
 from core.serializable import Serializable, Ser
+from core.storage import sqlite_db
 from core.storage.sqlite_chain import SqliteBlockChainStorage
 from core.storage.sqlite_transaction import SqliteTransactionStorage
 from core.storage.sqlite_uxto import SqliteUXTOStorage
@@ -53,7 +54,7 @@ class Wallet(object):
                 self._uxto_storage,
                 cfg)
 
-        self._conn = sqlite3.connect(cfg.wallet_path())
+        self._conn = sqlite_db.connect(cfg.wallet_path())
         self._conn.execute(CREATE_TABLE_SQL)
         self._conn.commit()
 
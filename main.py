@@ -1,38 +1,80 @@
 import argparse
+from core.chain import BlockChain
 from core.config import Config, ConfigBuilder
-from core.miner import BlockMiner
+from core.head_notifier import HeadNotifier
+from core.miner_coordinator import MinerCoordinator
 from core.key_pair import KeyPair
 from core.network.client import ChainClient
 from core.network.peer_list import Peer
 from core.network.server import ChainServer
 from core.network import util
-from concurrent.futures import ProcessPoolExecutor, wait
-from tornado import ioloop, gen
+from core.snapshot import UXTOSnapshot, load_snapshot, snapshot_matches_chain, take_snapshot
+from core.storage.sqlite_chain import SqliteBlockChainStorage, migrate_to_split_storage
+from core.storage.sqlite_transaction import SqliteTransactionStorage
+from core.storage.sqlite_uxto import SqliteUXTOStorage
+from tornado import ioloop
+import multiprocessing
 import os
+import sys
 import traceback
-from typing import Generator
+from typing import Generator, Optional
 
 SERVER_ADDRESS="0.0.0.0"
 SERVER_PORT=8888
 
-def mine(key_pair: KeyPair, cfg: Config) -> None:
-    bm = BlockMiner(cfg)
-    bm.mine_forever()
+def mine(key_pair: KeyPair, cfg: Config, head_notifier: HeadNotifier) -> None:
+    mc = MinerCoordinator(cfg, key_pair, head_notifier)
+    mc.mine_forever()
 
-def run_client_forever(cfg: Config) -> None:
-    c = ChainClient(cfg)
+def run_client_forever(cfg: Config, head_notifier: HeadNotifier) -> None:
+    c = ChainClient(cfg, head_notifier)
     c.poll_forever()
 
-@gen.coroutine
-def start_client(cfg: Config):
-    pool = ProcessPoolExecutor(max_workers=1)
-    yield pool.submit(run_client_forever, cfg)
+# The client and miner get plain processes rather than a process pool so
+# that the shared HeadNotifier can be handed to them.
+def start_client(cfg: Config, head_notifier: HeadNotifier) -> None:
+    p = multiprocessing.Process(
+        target=run_client_forever, args=(cfg, head_notifier))
+    p.start()
 
-@gen.coroutine
-def start_miner(cfg: Config):
-    pool = ProcessPoolExecutor(max_workers=cfg.miner_procs())
+def start_miner(cfg: Config, head_notifier: HeadNotifier) -> None:
     kp = KeyPair.new()
-    yield [pool.submit(mine, kp, cfg) for i in range(cfg.miner_procs())]
+    p = multiprocessing.Process(target=mine, args=(kp, cfg, head_notifier))
+    p.start()
+
+def open_chain(cfg: Config) -> BlockChain:
+    return BlockChain(
+        SqliteBlockChainStorage(cfg),
+        SqliteTransactionStorage(cfg),
+        SqliteUXTOStorage(cfg),
+        cfg)
+
+def export_snapshot(cfg: Config, path: str, height: Optional[int]) -> None:
+    chain = open_chain(cfg)
+    if height is None:
+        height = chain.headers.height()
+    snapshot = take_snapshot(chain, height)
+    snapshot.write(path)
+    print("Wrote", snapshot, "with outputs hash", snapshot.uxto_hash().hex())
+
+def verify_snapshot(cfg: Config, path: str) -> bool:
+    snapshot = UXTOSnapshot.read(path)
+    matches = snapshot_matches_chain(open_chain(cfg), snapshot)
+    if matches:
+        print(snapshot, "matches our chain")
+    else:
+        print(snapshot, "doesn't match our chain")
+    return matches
+
+def import_snapshot(cfg: Config, path: str) -> None:
+    snapshot = UXTOSnapshot.read(path)
+    load_snapshot(open_chain(cfg), snapshot)
+    print("Loaded", snapshot)
+
+def migrate_storage(cfg: Config) -> None:
+    migrate_to_split_storage(cfg)
+    print("Moved outputs to", cfg.uxto_db_path(),
+          "and the transaction pool to", cfg.mempool_db_path())
 
 def main():
     parser = argparse.ArgumentParser("Radcoin does stuff")
@@ -63,6 +105,33 @@ def main():
         help="The address to advertize to the network.",
         default=None)
 
+    parser.add_argument(
+        "--export_snapshot",
+        help="Write a snapshot of the unclaimed outputs to this path and exit.",
+        default=None)
+
+    parser.add_argument(
+        "--snapshot_height",
+        help="Block number to export the snapshot at. Defaults to the head.",
+        type=int,
+        default=None)
+
+    parser.add_argument(
+        "--verify_snapshot",
+        help="Check the snapshot at this path against our chain and exit.",
+        default=None)
+
+    parser.add_argument(
+        "--import_snapshot",
+        help="Load the snapshot at this path into a new chain, then run.",
+        default=None)
+
+    parser.add_argument(
+        "--migrate_storage",
+        help="Move outputs and the transaction pool into the files set in the config, then exit.",
+        default=False,
+        action="store_true")
+
     args = parser.parse_args()
 
     if args.initialize:
@@ -73,15 +142,33 @@ def main():
         args.advertize_addr,
         args.log_level).build()
 
-    print("Running server")
-    serv = ChainServer(cfg)
-    serv.listen()
+    if args.migrate_storage:
+        migrate_storage(cfg)
+        return
+
+    if args.export_snapshot:
+        export_snapshot(cfg, args.export_snapshot, args.snapshot_height)
+        return
 
-    ioloop.IOLoop.current().spawn_callback(start_client, cfg)
+    if args.verify_snapshot:
+        if not verify_snapshot(cfg, args.verify_snapshot):
+            sys.exit(1)
+        return
+
+    if args.import_snapshot:
+        import_snapshot(cfg, args.import_snapshot)
+
+    head_notifier = HeadNotifier()
+
+    start_client(cfg, head_notifier)
 
     if args.run_miner:
         print("Running miner")
-        ioloop.IOLoop.current().spawn_callback(start_miner, cfg)
+        start_miner(cfg, head_notifier)
+
+    print("Running server")
+    serv = ChainServer(cfg, head_notifier)
+    serv.listen()
 
     ioloop.IOLoop.current().start()
 
@@ -0,0 +1,106 @@
+"""Helpers for tests that need a chain on disk and blocks to put in it."""
+from core.block import Block, HashedBlock
+from core.block_config import BlockConfig
+from core.chain import BlockChain, REWARD_AMOUNT
+from core.config import Config, DEFAULTS
+from core.key_pair import KeyPair
+from core.miner import NONCE_PREFIX_BYTES, search_nonces
+from core.peer import generate_peer_id
+from core.storage.sqlite_chain import SqliteBlockChainStorage
+from core.storage.sqlite_transaction import SqliteTransactionStorage
+from core.storage.sqlite_uxto import SqliteUXTOStorage
+from core.timestamp import Timestamp
+from core.transaction.signed_transaction import SignedTransaction
+from core.transaction.transaction import Transaction
+from core.transaction.transaction_input import TransactionInput
+from core.transaction.transaction_output import TransactionOutput
+from contextlib import contextmanager
+from core.network.server import ChainServer
+from core.peer import Peer
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+import asyncio
+import os
+import threading
+from typing import Iterator, List
+
+def make_config(tmp_path, **overrides) -> Config:
+    args = dict(DEFAULTS)
+    args.update({
+        "chain_db_path": str(tmp_path / "chain.sqlite"),
+        "log_db_path": str(tmp_path / "log.sqlite"),
+        "peer_db_path": str(tmp_path / "peers.sqlite"),
+        "wallet_path": str(tmp_path / "radcoin.wallet"),
+        "advertize_addr": "127.0.0.1",
+        "peer_id": generate_peer_id(),
+        "log_level": "ERROR",
+        "verify_procs": 1,
+        "uxto_db_path": str(tmp_path / "uxto.sqlite"),
+        "mempool_db_path": str(tmp_path / "mempool.sqlite"),
+    })
+    args.update(overrides)
+    return Config(args)
+
+def open_chain(cfg: Config) -> BlockChain:
+    return BlockChain(
+        SqliteBlockChainStorage(cfg),
+        SqliteTransactionStorage(cfg),
+        SqliteUXTOStorage(cfg),
+        cfg)
+
+def mine(
+        chain: BlockChain,
+        parent: HashedBlock,
+        kp: KeyPair,
+        txns: List[SignedTransaction] = []) -> HashedBlock:
+    reward = SignedTransaction.sign(
+        Transaction.reward(REWARD_AMOUNT, kp.address()), kp)
+    block = Block(
+        parent.block_num() + 1,
+        parent.mining_hash(),
+        BlockConfig(chain.get_difficulty(parent)),
+        txns + [reward])
+
+    midstate = HashedBlock(block).mining_midstate()
+    entropy = None
+    while entropy is None:
+        entropy, _ = search_nonces(
+            midstate, os.urandom(NONCE_PREFIX_BYTES), 0, 2**20,
+            block.block_config.target)
+    return HashedBlock(block, entropy, Timestamp.now())
+
+def spend(block: HashedBlock, kp: KeyPair, to: KeyPair) -> SignedTransaction:
+    reward = block.block.transactions[-1]
+    txn = Transaction(
+        [TransactionInput(block.mining_hash(), reward.txn_hash(), 0)],
+        [TransactionOutput(0, REWARD_AMOUNT, to.address())],
+        Timestamp.now(),
+        kp.address())
+    return SignedTransaction.sign(txn, kp)
+
+@contextmanager
+def serving(cfg: Config) -> Iterator[Peer]:
+    """Runs a ChainServer for cfg on its own thread, as the peer it serves."""
+    started = threading.Event()
+    running = {}
+
+    def run() -> None:
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        sock, port = bind_unused_port()
+        http = HTTPServer(ChainServer(cfg).app)
+        http.add_sockets([sock])
+        running["port"] = port
+        running["loop"] = IOLoop.current()
+        started.set()
+        running["loop"].start()
+        http.stop()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait()
+    try:
+        yield Peer(cfg.server_peer_id(), "127.0.0.1", running["port"])
+    finally:
+        running["loop"].add_callback(running["loop"].stop)
+        thread.join()
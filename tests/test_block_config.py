@@ -0,0 +1,44 @@
+from core.block_config import (
+    HASH_BITS,
+    digest_meets_target,
+    digests_meet_target,
+    leading_word_candidates,
+    target_for_difficulty,
+)
+import os
+import random
+
+DIFFICULTIES = [0, 1, 63, 64, 65, 255]
+
+def digests_near(difficulty: int, n: int):
+    """Random digests, plus ones with just enough or too few leading zeros."""
+    digests = list(map(lambda i: os.urandom(32), range(n)))
+    for i in range(n):
+        zeros = max(0, difficulty + random.randint(-2, 2))
+        value = random.getrandbits(HASH_BITS) >> zeros
+        digests.append(value.to_bytes(32, "big"))
+
+    target = target_for_difficulty(difficulty)
+    for value in [0, target - 1, target, 2**HASH_BITS - 1]:
+        if 0 <= value < 2**HASH_BITS:
+            digests.append(value.to_bytes(32, "big"))
+    return digests
+
+def test_digests_meet_target_matches_single_check():
+    for difficulty in DIFFICULTIES:
+        target = target_for_difficulty(difficulty)
+        digests = digests_near(difficulty, 200)
+        assert digests_meet_target(digests, target) == list(map(
+            lambda d: digest_meets_target(d, target), digests))
+
+def test_leading_word_candidates():
+    for difficulty in DIFFICULTIES:
+        target = target_for_difficulty(difficulty)
+        for digest in digests_near(difficulty, 200):
+            word = int.from_bytes(digest[:8], "big")
+            candidate = leading_word_candidates(word, target)
+            meets = digest_meets_target(digest, target)
+            if difficulty <= 64:
+                assert candidate == meets
+            else:
+                assert candidate or not meets
@@ -0,0 +1,58 @@
+from chain_util import make_config, mine, open_chain, spend
+from core.key_pair import KeyPair
+
+def test_reorg_unclaims_reconnects_and_returns_transactions(tmp_path):
+    chain = open_chain(make_config(tmp_path))
+    kp = KeyPair.new()
+    other = KeyPair.new()
+
+    b1 = mine(chain, chain.get_head(), kp)
+    chain.add_block(b1)
+    reward_hash = b1.block.transactions[-1].txn_hash()
+
+    # Main chain b1 <- a2 <- a3, with a2 spending b1's reward.
+    txn = spend(b1, kp, other)
+    a2 = mine(chain, b1, kp, [txn])
+    chain.add_block(a2)
+    a3 = mine(chain, a2, kp)
+    chain.add_block(a3)
+    assert chain.get_head() == a3
+    assert chain.uxto_storage.output_is_claimed(reward_hash, 0)
+    assert chain.uxto_storage.get_output(txn.txn_hash(), 0) is not None
+
+    # A longer branch b1 <- c2 <- c3 <- c4 that doesn't spend it.
+    c2 = mine(chain, b1, other)
+    chain.add_block(c2)
+    c3 = mine(chain, c2, other)
+    chain.add_block(c3)
+    assert chain.get_head() == a3
+
+    c4 = mine(chain, c3, other)
+    chain.add_block(c4)
+    assert chain.get_head() == c4
+    assert chain.storage.get_undo(a2.mining_hash()) is None
+    assert chain.storage.get_undo(c2.mining_hash()) is not None
+
+    # a2's spend is undone and goes back in the pool, a2 and a3's outputs
+    # are gone and the new branch's rewards are unclaimed outputs.
+    assert not chain.uxto_storage.output_is_claimed(reward_hash, 0)
+    assert chain.uxto_storage.get_output(txn.txn_hash(), 0) is None
+    assert chain.uxto_storage.get_output(
+        a3.block.transactions[-1].txn_hash(), 0) is None
+    for c in [c2, c3, c4]:
+        out = chain.uxto_storage.get_output(c.block.transactions[-1].txn_hash(), 0)
+        assert out is not None and not out.claimed
+    assert chain.transaction_storage.has_transaction(txn.txn_hash())
+
+    # Growing the old branch past the new one connects it again, and the
+    # spend leaves the pool.
+    a4 = mine(chain, a3, kp)
+    chain.add_block(a4)
+    a5 = mine(chain, a4, kp)
+    chain.add_block(a5)
+    assert chain.get_head() == a5
+    assert chain.uxto_storage.output_is_claimed(reward_hash, 0)
+    assert chain.uxto_storage.get_output(txn.txn_hash(), 0) is not None
+    assert chain.uxto_storage.get_output(
+        c2.block.transactions[-1].txn_hash(), 0) is None
+    assert not chain.transaction_storage.has_transaction(txn.txn_hash())
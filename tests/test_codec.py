@@ -0,0 +1,99 @@
+from core.amount import Amount
+from core.block import Block, HashedBlock, BLOCK_VERSION_JSON, BLOCK_VERSION_MERKLE
+from core.block_config import BlockConfig
+from core.codec import (
+    CodecError,
+    JSON_PREFIX,
+    decode_block,
+    decode_transaction,
+    encode_block,
+    encode_transaction,
+    stored_block,
+    stored_transaction,
+)
+from core.key_pair import KeyPair
+from core.serializable import Hash
+from core.timestamp import Timestamp
+from core.transaction.signed_transaction import SignedTransaction
+from core.transaction.transaction import Transaction
+from core.transaction.transaction_input import TransactionInput
+from core.transaction.transaction_output import TransactionOutput
+import os
+import pytest
+
+def spend(kp: KeyPair, amount: Amount, timestamp: Timestamp) -> SignedTransaction:
+    txn = Transaction(
+        [TransactionInput(Hash(os.urandom(32)), Hash(os.urandom(32)), 1)],
+        [TransactionOutput(0, amount, KeyPair.new().address())],
+        timestamp,
+        kp.address())
+    return SignedTransaction.sign(txn, kp)
+
+def hashed_block(version: int, txns) -> HashedBlock:
+    block = Block(
+        3, Hash(os.urandom(32)), BlockConfig(18), txns, version)
+    return HashedBlock(block, os.urandom(32), Timestamp.now())
+
+def assert_same_block(decoded: HashedBlock, hb: HashedBlock) -> None:
+    assert decoded.mining_hash() == hb.mining_hash()
+    assert decoded.serialize() == hb.serialize()
+
+@pytest.mark.parametrize("version", [BLOCK_VERSION_JSON, BLOCK_VERSION_MERKLE])
+def test_block_round_trip(version):
+    kp = KeyPair.new()
+    txns = [
+        spend(kp, Amount(7), Timestamp.now()),
+        SignedTransaction.sign(Transaction.reward(Amount.units(100), kp.address()), kp),
+    ]
+    hb = hashed_block(version, txns)
+
+    encoded = encode_block(hb)
+    assert not encoded.startswith(JSON_PREFIX)
+    assert_same_block(decode_block(encoded), hb)
+    assert_same_block(decode_block(hb.serialize()), hb)
+
+def test_transaction_round_trip():
+    txn = spend(KeyPair.new(), Amount(7), Timestamp.now())
+    decoded = decode_transaction(encode_transaction(txn))
+    assert decoded.serialize() == txn.serialize()
+    assert decoded.signature_is_valid()
+
+@pytest.mark.parametrize("amount,timestamp", [
+    (Amount(2**70), Timestamp(1)), # out of range for the codec
+    (Amount(7), Timestamp(1.5)), # a float in the JSON
+])
+def test_falls_back_to_json(amount, timestamp):
+    txn = spend(KeyPair.new(), amount, timestamp)
+    with pytest.raises(CodecError):
+        encode_transaction(txn)
+
+    stored = stored_transaction(txn)
+    assert stored.startswith(JSON_PREFIX)
+    assert decode_transaction(stored).serialize() == txn.serialize()
+
+    hb = hashed_block(BLOCK_VERSION_JSON, [txn])
+    with pytest.raises(CodecError):
+        encode_block(hb)
+
+    stored = stored_block(hb)
+    assert stored.startswith(JSON_PREFIX)
+    assert_same_block(decode_block(stored), hb)
+
+def test_non_canonical_transactions_fall_back_to_json():
+    hb = hashed_block(BLOCK_VERSION_JSON, [spend(KeyPair.new(), Amount(7), Timestamp(1))])
+    obj = hb.serializable()
+    obj["block"]["transactions"][0]["memo"] = "not part of a transaction"
+    read = HashedBlock.from_dict(obj)
+    assert read.mining_hash() != hb.mining_hash()
+
+    with pytest.raises(CodecError):
+        encode_block(read)
+
+    stored = stored_block(read)
+    assert stored.startswith(JSON_PREFIX)
+    assert decode_block(stored).mining_hash() == read.mining_hash()
+
+def test_truncated_block():
+    hb = hashed_block(BLOCK_VERSION_MERKLE, [spend(KeyPair.new(), Amount(7), Timestamp(1))])
+    with pytest.raises(CodecError):
+        decode_block(encode_block(hb)[:-20])
@@ -0,0 +1,35 @@
+from chain_util import make_config, mine, open_chain
+from core.block_header import BlockHeader
+from core.key_pair import KeyPair
+from core.network.server import ChainServer
+from tornado.ioloop import IOLoop
+import asyncio
+
+def test_prune_keeps_headers(tmp_path):
+    chain = open_chain(make_config(tmp_path))
+    kp = KeyPair.new()
+    blocks = []
+    for i in range(3):
+        blocks.append(mine(chain, chain.get_head(), kp))
+        chain.add_block(blocks[-1])
+
+    assert chain.storage.prune(3, 64) == 2
+    assert chain.storage.prune(3, 64) == 0
+    assert chain.storage.get_pruned_height() == 2
+    for b in blocks[:2]:
+        assert chain.storage.get_by_hash(b.mining_hash()) is None
+        assert chain.storage.get_undo(b.mining_hash()) is None
+        header = chain.storage.get_header(b.mining_hash())
+        assert header.serialize() == BlockHeader.from_block(b).serialize()
+    assert chain.storage.get_by_hash(blocks[2].mining_hash()) is not None
+
+def test_maintenance_step(tmp_path):
+    server = ChainServer(make_config(tmp_path))
+
+    async def step():
+        server.maintain()
+        await asyncio.wrap_future(server._maintenance_step)
+
+    IOLoop.current().run_sync(step)
+    assert server._maintenance_step.exception() is None
+    assert server._reencoded
@@ -0,0 +1,21 @@
+from chain_util import make_config, mine, open_chain, serving, spend
+from core.key_pair import KeyPair
+import requests
+
+def test_post_transaction(tmp_path):
+    cfg = make_config(tmp_path)
+    chain = open_chain(cfg)
+    kp = KeyPair.new()
+    b1 = mine(chain, chain.get_head(), kp)
+    chain.add_block(b1)
+    txn = spend(b1, kp, KeyPair.new())
+    stolen = spend(b1, KeyPair.new(), kp)
+
+    with serving(cfg) as peer:
+        url = peer.http_url("/outstanding_transactions")
+        assert requests.post(url, data=stolen.serialize()).status_code == 400
+        assert requests.post(url, data=txn.serialize()).status_code == 200
+        assert requests.post(url, data=txn.serialize()).status_code == 200
+
+    assert chain.transaction_storage.has_transaction(txn.txn_hash())
+    assert not chain.transaction_storage.has_transaction(stolen.txn_hash())
@@ -0,0 +1,64 @@
+from chain_util import make_config, mine, open_chain
+from core.key_pair import KeyPair
+from core.storage import sqlite_db
+from core.storage.sqlite_chain import (
+    GET_UNSPLIT_TABLES_SQL,
+    attach_split_files,
+    migrate_to_split_storage,
+)
+import pytest
+
+def unsplit_tables(cfg):
+    conn = sqlite_db.connect(cfg.chain_db_path())
+    return sorted(map(lambda r: r[0], conn.execute(GET_UNSPLIT_TABLES_SQL)))
+
+def test_migrate_and_catch_up(tmp_path):
+    chain = open_chain(make_config(tmp_path))
+    kp = KeyPair.new()
+    blocks = []
+    for i in range(2):
+        blocks.append(mine(chain, chain.get_head(), kp))
+        chain.add_block(blocks[-1])
+
+    cfg = make_config(tmp_path, split_storage=True)
+    migrate_to_split_storage(cfg)
+    assert unsplit_tables(cfg) == []
+    with pytest.raises(ValueError):
+        migrate_to_split_storage(cfg)
+
+    chain = open_chain(cfg)
+    for b in blocks:
+        assert chain.uxto_storage.get_output(
+            b.block.transactions[-1].txn_hash(), 0) is not None
+
+    # Leave the outputs file a block behind, as a crash between the files'
+    # commits would, and reopen.
+    conn = sqlite_db.connect(cfg.chain_db_path())
+    conn.execute("DELETE FROM uxto.outpoints")
+    conn.execute("UPDATE uxto.head_marker SET hash = ?",
+        (blocks[0].mining_hash().raw_sha256,))
+    conn.commit()
+
+    chain = open_chain(cfg)
+    assert chain.uxto_storage.get_output(
+        blocks[1].block.transactions[-1].txn_hash(), 0) is not None
+
+def test_migrate_after_partial_drop(tmp_path):
+    chain = open_chain(make_config(tmp_path))
+    b1 = mine(chain, chain.get_head(), KeyPair.new())
+    chain.add_block(b1)
+    reward_hash = b1.block.transactions[-1].txn_hash()
+
+    # An earlier run that moved the outputs but stopped before the pool.
+    cfg = make_config(tmp_path, split_storage=True)
+    conn = sqlite_db.connect(cfg.chain_db_path())
+    attach_split_files(cfg, conn)
+    conn.execute("INSERT INTO uxto.outpoints SELECT * FROM main.outpoints")
+    conn.execute("DROP TABLE main.outpoints")
+    conn.commit()
+    assert unsplit_tables(cfg) == ["transactions"]
+
+    migrate_to_split_storage(cfg)
+    assert unsplit_tables(cfg) == []
+    chain = open_chain(cfg)
+    assert chain.uxto_storage.get_output(reward_hash, 0) is not None
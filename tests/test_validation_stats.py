@@ -0,0 +1,47 @@
+from chain_util import make_config, mine, open_chain, serving
+from core.block_header import BlockHeader
+from core.key_pair import KeyPair
+from core.network.client import ChainClient
+from core.validation_stats import VALIDATION_STAGES
+import requests
+
+def test_endpoint_counts_blocks_the_client_synced(tmp_path):
+    (tmp_path / "peer").mkdir()
+    (tmp_path / "node").mkdir()
+    peer_cfg = make_config(tmp_path / "peer")
+    peer_chain = open_chain(peer_cfg)
+    kp = KeyPair.new()
+    for i in range(3):
+        peer_chain.add_block(mine(peer_chain, peer_chain.get_head(), kp))
+
+    node_cfg = make_config(tmp_path / "node", advertize_self=False)
+    with serving(peer_cfg) as peer:
+        ChainClient(node_cfg).sync(peer)
+
+    with serving(node_cfg) as node:
+        stats = requests.get(node.http_url("/validation_stats")).json()
+
+    for stage in VALIDATION_STAGES:
+        assert stats[stage]["checked"] == 3
+        assert stats[stage]["rejected"] == 0
+
+def test_assume_valid_savings_are_shared(tmp_path):
+    (tmp_path / "peer").mkdir()
+    (tmp_path / "node").mkdir()
+    peer_chain = open_chain(make_config(tmp_path / "peer"))
+    kp = KeyPair.new()
+    blocks = []
+    for i in range(3):
+        blocks.append(mine(peer_chain, peer_chain.get_head(), kp))
+        peer_chain.add_block(blocks[-1])
+
+    node_cfg = make_config(
+        tmp_path / "node", assume_valid=blocks[1].mining_hash().hex())
+    syncing = open_chain(node_cfg)
+    syncing.add_header_chain(list(map(BlockHeader.from_block, blocks)))
+    syncing.add_blocks(blocks)
+
+    # The chain another process, the server, opens on the same database.
+    saved = open_chain(node_cfg).validation_stats().assume_valid
+    assert saved.blocks == 2
+    assert saved.signatures_skipped == 2